@@ -1,4 +1,4 @@
-
+from regdesc import PARAMS, PRIV_LVL_M, PRIV_LVL_S, RegMap
 
 APLIC_M_BASE    = 0xc000000
 APLIC_S_BASE    = 0xd000000
@@ -10,13 +10,18 @@ MIN_PRIO        = 6
 
 
 
-M_MODE = 0
-S_MODE = 1
+# Privilege levels (imsic_pkg.sv encoding, like the integration bench); the
+# M domain is domain 0 of the wrapper, the S domain domain 1
+M_MODE = PRIV_LVL_M
+S_MODE = PRIV_LVL_S
+DOMAIN_INDEX = {M_MODE: 0, S_MODE: 1}
+
+REGMAP = RegMap([APLIC_M_BASE, APLIC_S_BASE], NR_SRC, NR_HART)
 
 # Sourcecfg base macro
-SOURCECFG_M_BASE        = APLIC_M_BASE + 0x0004
-SOURCECFG_S_BASE        = APLIC_S_BASE + 0x0004
-DELEGATE_SRC            = 0x400
+SOURCECFG_M_BASE        = REGMAP.addr("sourcecfg", 0, 1)
+SOURCECFG_S_BASE        = REGMAP.addr("sourcecfg", 1, 1)
+DELEGATE_SRC            = 1 << PARAMS["SOURCECFG_D_OFF"]
 INACTIVE                = 0
 DETACHED                = 1
 EDGE1                   = 4
@@ -26,67 +31,56 @@ LEVEL0                  = 7
 sourcecfg_SM = [DELEGATE_SRC, INACTIVE, DETACHED, EDGE1, EDGE0, LEVEL1, LEVEL0]
 
 # Target base macros
-TARGET_M_BASE           = APLIC_M_BASE + 0x3004
-TARGET_S_BASE           = APLIC_S_BASE + 0x3004
+TARGET_M_BASE           = REGMAP.addr("target", 0, 1)
+TARGET_S_BASE           = REGMAP.addr("target", 1, 1)
 TARGET_OFF              = 0x0004
 
 # Pending base macros
-SETIPNUM_M_BASE         = APLIC_M_BASE + 0x1CDC
-SETIPNUM_S_BASE         = APLIC_S_BASE + 0x1CDC
-CLRIPNUM_M_BASE         = APLIC_M_BASE + 0x1DDC
-CLRIPNUM_S_BASE         = APLIC_S_BASE + 0x1DDC
-SETIP_M_BASE            = APLIC_M_BASE + 0x1C00
-SETIP_S_BASE            = APLIC_S_BASE + 0x1C00
-INCLRIP_M_BASE          = APLIC_M_BASE + 0x1D00
-INCLRIP_S_BASE          = APLIC_S_BASE + 0x1D00
+SETIPNUM_M_BASE         = REGMAP.addr("setipnum", 0)
+SETIPNUM_S_BASE         = REGMAP.addr("setipnum", 1)
+CLRIPNUM_M_BASE         = REGMAP.addr("clripnum", 0)
+CLRIPNUM_S_BASE         = REGMAP.addr("clripnum", 1)
+SETIP_M_BASE            = REGMAP.addr("setip", 0, 0)
+SETIP_S_BASE            = REGMAP.addr("setip", 1, 0)
+INCLRIP_M_BASE          = REGMAP.addr("in_clrip", 0, 0)
+INCLRIP_S_BASE          = REGMAP.addr("in_clrip", 1, 0)
 
 # Enable base macros
-SETIENUM_M_BASE         = APLIC_M_BASE + 0x1EDC
-SETIENUM_S_BASE         = APLIC_S_BASE + 0x1EDC
-CLRIENUM_M_BASE         = APLIC_M_BASE + 0x1FDC
-CLRIENUM_S_BASE         = APLIC_S_BASE + 0x1FDC
-SETIE_M_BASE            = APLIC_M_BASE + 0x1E00
-SETIE_S_BASE            = APLIC_S_BASE + 0x1E00
-CLRIE_M_BASE            = APLIC_M_BASE + 0x1F00
-CLRIE_S_BASE            = APLIC_S_BASE + 0x1F00
+SETIENUM_M_BASE         = REGMAP.addr("setienum", 0)
+SETIENUM_S_BASE         = REGMAP.addr("setienum", 1)
+CLRIENUM_M_BASE         = REGMAP.addr("clrienum", 0)
+CLRIENUM_S_BASE         = REGMAP.addr("clrienum", 1)
+SETIE_M_BASE            = REGMAP.addr("setie", 0, 0)
+SETIE_S_BASE            = REGMAP.addr("setie", 1, 0)
+CLRIE_M_BASE            = REGMAP.addr("clrie", 0, 0)
+CLRIE_S_BASE            = REGMAP.addr("clrie", 1, 0)
 
 # IDC macros
-IDELIVERY_M_BASE        = APLIC_M_BASE + 0x4000 + 0x00
-IDELIVERY_S_BASE        = APLIC_S_BASE + 0x4000 + 0x00
-IFORCE_M_BASE           = APLIC_M_BASE + 0x4000 + 0x04
-IFORCE_S_BASE           = APLIC_S_BASE + 0x4000 + 0x04
-ITHRESHOLD_M_BASE       = APLIC_M_BASE + 0x4000 + 0x08
-ITHRESHOLD_S_BASE       = APLIC_S_BASE + 0x4000 + 0x08
-CLAIMI_M_BASE           = APLIC_M_BASE + 0x4000 + 0x1C
-CLAIMI_S_BASE           = APLIC_S_BASE + 0x4000 + 0x1C
+IDELIVERY_M_BASE        = REGMAP.addr("idelivery", 0, 0)
+IDELIVERY_S_BASE        = REGMAP.addr("idelivery", 1, 0)
+IFORCE_M_BASE           = REGMAP.addr("iforce", 0, 0)
+IFORCE_S_BASE           = REGMAP.addr("iforce", 1, 0)
+ITHRESHOLD_M_BASE       = REGMAP.addr("ithreshold", 0, 0)
+ITHRESHOLD_S_BASE       = REGMAP.addr("ithreshold", 1, 0)
+CLAIMI_M_BASE           = REGMAP.addr("claimi", 0, 0)
+CLAIMI_S_BASE           = REGMAP.addr("claimi", 1, 0)
 
-IDELIVERY   = 0x00
-IFORCE      = 0x04
-ITHRESHOLD  = 0x08
-CLAIMI      = 0x1c
+IDELIVERY   = PARAMS["IDC_IDELIVERY"]
+IFORCE      = PARAMS["IDC_IFORCE"]
+ITHRESHOLD  = PARAMS["IDC_ITHRESHOLD"]
+CLAIMI      = PARAMS["IDC_CLAIMI"]
+# IDC register offset -> regdesc name
+IDC_REGS = {reg.off: reg.name for reg in REGMAP.registers.values() if reg.idc}
 
 def sourcecfg (intp=0, domain=M_MODE):
     if (intp == 0):
-        ValueError("Interrupt must be greater than 0")
-    
-    if (domain == M_MODE):
-        return SOURCECFG_M_BASE + (0x4*(intp-1))
-    else:
-        return SOURCECFG_S_BASE + (0x4*(intp-1))
+        raise ValueError("Interrupt must be greater than 0")
+    return REGMAP.addr("sourcecfg", DOMAIN_INDEX[domain], intp)
 
 def target (intp=0, domain=M_MODE):
     if (intp == 0):
-        ValueError("Interrupt must be greater than 0")
-    
-    if (domain == M_MODE):
-        return TARGET_M_BASE + (0x4*(intp-1))
-    else:
-        return TARGET_S_BASE + (0x4*(intp-1))
-    
-def idc (hart = 0, reg = IDELIVERY, domain=M_MODE):
-    if (domain == M_MODE):
-        APLIC_BASE = APLIC_M_BASE
-    else:
-        APLIC_BASE = APLIC_S_BASE
+        raise ValueError("Interrupt must be greater than 0")
+    return REGMAP.addr("target", DOMAIN_INDEX[domain], intp)
 
-    return reg + 0x4000 + APLIC_BASE + (hart*0x20)
\ No newline at end of file
+def idc (hart = 0, reg = IDELIVERY, domain=M_MODE):
+    return REGMAP.addr(IDC_REGS[reg], DOMAIN_INDEX[domain], hart)
@@ -16,7 +16,9 @@ module aplic_domain_regctl_wrapper #(
     parameter int                                       NR_SRC_W    = (NR_SRC == 1) ? 1 : $clog2(NR_SRC),
     parameter int                                       NR_REG      = (NR_SRC-1)/32  
 ) (
+    `ifndef TB_CLOCK
     input   logic                                       i_clk                       ,
+    `endif
     input   logic                                       ni_rst                      ,
     /** Register config: AXI interface From/To system bus */
     input   logic [31:0]                                reg_intf_req_a32_d32_addr   ,
@@ -31,6 +33,15 @@ module aplic_domain_regctl_wrapper #(
     input   logic [((NR_REG+1)*NR_BITS_SRC)-1:0]        i_rectified_src             
 );
 
+`ifdef TB_CLOCK
+/** Clock generated inside the simulator (CLOCK=native) */
+logic                                       i_clk;
+
+tb_clock i_tb_clock (
+    .o_clk                  ( i_clk                 )
+);
+`endif
+
 reg_intf::reg_intf_req_a32_d32              i_req;
 reg_intf::reg_intf_resp_d32                 o_resp;
 
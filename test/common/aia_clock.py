@@ -0,0 +1,55 @@
+import functools
+
+import cocotb
+from cocotb.clock import Clock
+from cocotb.triggers import FallingEdge, Timer
+
+ONE_CYCLE = 2
+
+def has_native_clock(dut):
+    """True if the wrapper was built with the tb_clock generator (CLOCK=native)."""
+    return hasattr(dut, "i_tb_clock")
+
+def start_clock(dut, period=ONE_CYCLE):
+    """Start i_clk for the whole test.
+
+    With CLOCK=native the wrapper already toggles i_clk from inside the
+    simulator and nothing is scheduled here. Otherwise fall back to a cocotb
+    Clock, which runs until the test ends instead of a fixed cycle count.
+    """
+    if has_native_clock(dut):
+        return None
+
+    return cocotb.start_soon(Clock(dut.i_clk, period, units="ns").start(start_high=False))
+
+async def pulse_reset(dut, period=ONE_CYCLE):
+    """Pulse ni_rst on a running clock, leaving the DUT right after reset."""
+    # wait for falling edge/"negedge"
+    await FallingEdge(dut.i_clk)
+
+    # Reset the dut
+    dut.ni_rst.value = 0
+    await Timer(period//2, units="ns")
+    dut.ni_rst.value = 1
+    await Timer(period//2, units="ns")
+
+async def reset_dut(dut, period=ONE_CYCLE):
+    """Start the clock and pulse ni_rst, leaving the DUT right after reset."""
+    dut.ni_rst.value = 1
+    start_clock(dut, period)
+    # wait a bit
+    await Timer(period, units="ns")
+    await pulse_reset(dut, period)
+
+def reset_fixture(test):
+    """Test fixture: start the clock and reset the DUT before the test body.
+
+    @cocotb.test()
+    @reset_fixture
+    async def my_test(dut): ...
+    """
+    @functools.wraps(test)
+    async def wrapper(dut, *args, **kwargs):
+        await reset_dut(dut)
+        return await test(dut, *args, **kwargs)
+    return wrapper
@@ -0,0 +1,62 @@
+import array
+import sys
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_ARRAY_TYPECODES = {code: array.array(code).itemsize for code in "BHILQ"}
+
+def clog2(x):
+    """SystemVerilog $clog2: number of bits needed to index x entries."""
+    if x <= 0:
+        raise ValueError("Input must be a positive integer")
+    return (x - 1).bit_length()
+
+def _array_typecode(nbytes):
+    for code, itemsize in _ARRAY_TYPECODES.items():
+        if itemsize == nbytes:
+            return code
+    return None
+
+def unpack_fields(value, width, count):
+    """Split a packed bus into count fields of width bits, field 0 at the LSB.
+
+    value can be a cocotb handle value or an int. Byte-multiple widths are
+    converted with a single bytes-to-array copy (NumPy if installed, array
+    otherwise). Other widths go through numpy.unpackbits when NumPy is
+    available and fall back to shifting out each field.
+    """
+    value = int(value) & ((1 << (width * count)) - 1)
+    nbytes = (width * count + 7) // 8
+    raw = value.to_bytes(nbytes, "little")
+
+    if width % 8 == 0 and width <= 64:
+        if np is not None:
+            return np.frombuffer(raw, dtype=f"<u{width // 8}")
+        code = _array_typecode(width // 8)
+        if code is not None:
+            fields = array.array(code)
+            fields.frombytes(raw)
+            if sys.byteorder == "big":
+                fields.byteswap()
+            return fields
+
+    if np is not None and width <= 64:
+        bits = np.unpackbits(np.frombuffer(raw, dtype=np.uint8), bitorder="little")
+        bits = bits[:width * count].reshape(count, width).astype(np.uint64)
+        return bits @ (np.uint64(1) << np.arange(width, dtype=np.uint64))
+
+    mask = (1 << width) - 1
+    return [(value >> (i * width)) & mask for i in range(count)]
+
+def unpack_grid(value, width, rows, cols):
+    """unpack_fields for a [rows][cols] packed array, result[row][col].
+
+    e.g. xtopei, an [NrHarts][NrInptFiles] array of interrupt ids.
+    """
+    fields = unpack_fields(value, width, rows * cols)
+    if np is not None and isinstance(fields, np.ndarray):
+        return fields.reshape(rows, cols)
+    return [fields[r * cols:(r + 1) * cols] for r in range(rows)]
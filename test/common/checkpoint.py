@@ -0,0 +1,87 @@
+"""
+Checkpoints of the configured state of a design, taken and restored from cocotb.
+
+A Checkpoint holds the value of every flop of the design (the *_q signals of
+the RTL, found by walking the hierarchy) and a copy of the Python models the
+bench keeps next to it. restore() deposits the flop values through VPI and
+puts the models back, so a campaign configures the design once and starts
+every stimulus from that state instead of reprogramming it:
+
+    await configure(...)
+    checkpoint = Checkpoint.capture(dut, aplic_model, imsic_model)
+    for stimulus in stimuli:
+        await pulse_reset(dut)
+        checkpoint.restore()
+        await ClockCycles(dut.i_clk, 1)
+        assert not checkpoint.verify()
+        ...
+
+Only flops are saved, so the capture is taken at a quiescent point: bus and
+CSR port idle, source lines low, no MSI in flight. The state machines that
+do not follow the *_q naming (AXI master, synchronizers) are then in their
+reset state, which is where the reset pulse before restore() leaves them.
+The inputs are not part of the checkpoint, the bench drives them.
+
+Verilator's own --savable save/restore is only reachable from a C++ main, a
+cocotb run cannot call it; the flops are visible through VPI because the
+cocotb Verilator flow builds with --public-flat-rw.
+"""
+import copy
+
+from cocotb.handle import HierarchyObject, HierarchyArrayObject, ModifiableObject, NonHierarchyIndexableObject
+
+def _leaves(handle):
+    if isinstance(handle, NonHierarchyIndexableObject):
+        return [leaf for element in handle for leaf in _leaves(element)]
+    return [handle]
+
+def state_signals(handle, suffix="_q"):
+    """Every signal under handle named *suffix, unpacked arrays element by element."""
+    signals = []
+    for child in handle:
+        if isinstance(child, (HierarchyObject, HierarchyArrayObject)):
+            signals += state_signals(child, suffix)
+        elif isinstance(child, (ModifiableObject, NonHierarchyIndexableObject)) and child._name.endswith(suffix):
+            signals += _leaves(child)
+    return signals
+
+class Checkpoint:
+    def __init__(self, values, models, shared=()):
+        # (handle, BinaryValue) of every flop
+        self.values = values
+        # (model, copy of its attributes)
+        self.models = models
+        # objects the models share with the bench (register maps, domain
+        # tables): restored by reference, never copied
+        self.shared = shared
+
+    @classmethod
+    def capture(cls, dut, *models, shared=(), suffix="_q"):
+        """Save the flops of dut and the state of models, at a quiescent point."""
+        values = [(signal, signal.value) for signal in state_signals(dut, suffix)]
+        checkpoint = cls(values, [], shared)
+        checkpoint.models = [(model, checkpoint._copy(vars(model))) for model in models]
+        return checkpoint
+
+    def _copy(self, state):
+        return copy.deepcopy(state, {id(obj): obj for obj in self.shared})
+
+    def restore(self):
+        """Deposit the saved flop values and put the models back in place.
+
+        The models keep their identity, the scoreboards and listeners that
+        hold them see the restored state.
+        """
+        for signal, value in self.values:
+            signal.setimmediatevalue(value)
+        for model, state in self.models:
+            attrs = vars(model)
+            attrs.clear()
+            attrs.update(self._copy(state))
+
+    def verify(self):
+        """Names of the flops that no longer hold their saved value."""
+        return [signal._path for signal, value in self.values if str(signal.value) != str(value)]
+
+    def __len__(self):
+        return len(self.values)
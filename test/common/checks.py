@@ -0,0 +1,101 @@
+"""
+Per-check result collection for the cocotb benches.
+
+A Checker stores every check of a test as a compact record
+(check id, expected, actual, sim time in ns, passed) instead of printing
+it. finish() logs a one-line summary plus the failures, appends the test to
+the run's artifacts and fails the test if any check failed:
+
+    checks = Checker(dut, "claim_test")
+    checks.check("domaincfg[M]", expected, actual)
+    ...
+    checks.finish()
+
+Artifacts (one entry per test of the run, rewritten after every test):
+    CHECKS_OUT.json   every record, for bulk ingestion
+    CHECKS_OUT.xml    JUnit, one testsuite per test, one testcase per check
+CHECKS_OUT defaults to "checks".
+"""
+import json
+import os
+import xml.etree.ElementTree as ET
+
+# How many failures finish() logs one by one
+MAX_LOGGED_FAILURES = 50
+
+# test name -> records, for every test of this run
+_run = {}
+
+try:
+    from cocotb.utils import get_sim_time
+except ImportError:
+    # checks on the functional model (aia_flow.py), there is no simulation time
+    get_sim_time = None
+
+def _sim_time_ns():
+    return get_sim_time("ns") if get_sim_time is not None else None
+
+def _fmt(value):
+    return hex(value) if isinstance(value, int) and not isinstance(value, bool) else repr(value)
+
+class Checker:
+    def __init__(self, dut, test_name):
+        self.dut = dut
+        self.test_name = test_name
+        # (check_id, expected, actual, sim_time_ns, passed)
+        self.records = []
+        self.nr_failures = 0
+
+    def check(self, check_id, expected, actual):
+        """Record expected == actual, return whether it passed."""
+        if not isinstance(actual, (int, float, str, bool, type(None))):
+            actual = int(actual)
+        passed = expected == actual
+        self.records.append((check_id, expected, actual, _sim_time_ns(), passed))
+        if not passed:
+            self.nr_failures += 1
+        return passed
+
+    def check_all(self, checks):
+        """check() over (check_id, expected, actual) tuples, e.g. verify_burst mismatches."""
+        return all([self.check(*c) for c in checks])
+
+    @property
+    def failures(self):
+        return [r for r in self.records if not r[4]]
+
+    def summary(self):
+        return f"{self.test_name}: {len(self.records) - self.nr_failures}/{len(self.records)} checks passed"
+
+    def keep(self):
+        """Add the checks to the run's artifacts without logging or failing, the next finish() writes them."""
+        _run[self.test_name] = self.records
+
+    def finish(self, out=None):
+        """Log the summary and failures, write the artifacts, fail on failures."""
+        log = self.dut._log
+        log.info(self.summary())
+        for check_id, expected, actual, time_ns, _ in self.failures[:MAX_LOGGED_FAILURES]:
+            log.error(f"{check_id}: expected {_fmt(expected)}, got {_fmt(actual)} at {time_ns} ns")
+        if self.nr_failures > MAX_LOGGED_FAILURES:
+            log.error(f"... and {self.nr_failures - MAX_LOGGED_FAILURES} more failures")
+
+        _run[self.test_name] = self.records
+        write_artifacts(out or os.environ.get("CHECKS_OUT", "checks"))
+        assert self.nr_failures == 0, f"{self.nr_failures} of {len(self.records)} checks failed"
+
+def write_artifacts(prefix, run=None):
+    run = _run if run is None else run
+    with open(prefix + ".json", "w") as f:
+        json.dump({test: [{"id": r[0], "expected": r[1], "actual": r[2], "sim_time_ns": r[3], "passed": r[4]}
+                          for r in records] for test, records in run.items()}, f)
+
+    suites = ET.Element("testsuites")
+    for test, records in run.items():
+        failures = sum(1 for r in records if not r[4])
+        suite = ET.SubElement(suites, "testsuite", name=test, tests=str(len(records)), failures=str(failures))
+        for check_id, expected, actual, time_ns, passed in records:
+            case = ET.SubElement(suite, "testcase", classname=test, name=str(check_id), sim_time_ns=str(time_ns))
+            if not passed:
+                ET.SubElement(case, "failure", message=f"expected {_fmt(expected)}, got {_fmt(actual)}")
+    ET.ElementTree(suites).write(prefix + ".xml", encoding="utf-8", xml_declaration=True)
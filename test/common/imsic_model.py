@@ -0,0 +1,328 @@
+"""
+Reference model of the interrupt files of imsic_top.sv, shared by the benches.
+
+eip and eie are [NrHarts][NrInptFiles*NR_REG] arrays of 32-bit words laid
+out like imsic_bitmap_reg_t: file k of a hart owns the words
+[k*NR_REG, (k+1)*NR_REG). An event (MSI, CSR write, claim) touches a word
+or two; xtopei_grid() then computes the xtopei of every (hart, file) at once
+with a few NumPy operations over the whole array and keeps the result until
+the next event, so checking the xtopei port every cycle is one integer
+compare against packed_xtopei(). Without NumPy the grid is computed file by
+file with plain ints.
+
+The notifier follows the RTL, quirks included:
+
+    - it picks the lowest pending and enabled bit of the highest non-empty
+      word (the loop only breaks out of the inner bit loop)
+    - eithreshold is compared against the bit index inside that word, 0
+      disables it
+    - a 64-bit eip/eie write also writes the word after the addressed one,
+      which is the next file's first word when NR_REG is odd
+    - bit 0 of every file never pends nor enables
+
+Updates take effect immediately, the model is the settled view of the DUT
+(one cycle after the access). Harts are 0-based, as in the RTL.
+
+    model = ImsicModel(nr_harts=4, nr_sources=2047, nr_vs_files=1, xlen=64)
+    model.csr_write(0, IMSIC_EIE0, 1 << 5, PRIV_LVL_M)
+    model.setipnum(hart=0, file=0, source=5)
+    model.xtopei_grid()[0][0]    # 5
+"""
+import functools
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from bus_fields import clog2
+from regdesc import PRIV_LVL_M, PRIV_LVL_S, IMSIC_EIDELIVERY, IMSIC_EITHRESHOLD, IMSIC_EIP0, IMSIC_EIE0, \
+                    IMSIC_M_FILE_ADDR, IMSIC_S_FILE_ADDR, IMSIC_PAGE_SIZE
+
+# EIP63_OFF/EIE63_OFF of imsic_pkg.sv
+EIP_REGS = 0x40
+EIE_REGS = 0x40
+
+def _lowest(bits):
+    return (bits & -bits).bit_length() - 1
+
+@functools.lru_cache(maxsize=None)
+def threshold_words(src_len):
+    """eithreshold -> bits of a word that pass it (0 passes them all), for every eithreshold."""
+    mask = (1 << src_len) - 1
+    return tuple(sum(1 << j for j in range(32) if thr == 0 or (j & mask) < thr) for thr in range(1 << src_len))
+
+class ImsicModel:
+    def __init__(self, nr_harts, nr_sources, nr_vs_files, xlen, use_numpy=True):
+        self.nr_harts = nr_harts
+        self.nr_sources = nr_sources
+        self.nr_vs_files = nr_vs_files
+        self.nr_files = 2 + nr_vs_files
+        self.xlen = xlen
+        self.nr_reg = 1 if nr_sources < 32 else nr_sources // 32
+        self.nr_words = self.nr_files * self.nr_reg
+        # eip/eie words written by one CSR access
+        self.access_words = 2 if xlen == 64 else 1
+        self.src_len = clog2(nr_sources) if nr_sources > 1 else 1
+        self.src_mask = (1 << self.src_len) - 1
+        self.hart_len = clog2(nr_harts) if nr_harts > 1 else 1
+        # ImsicCfg.NrHarts*(NrInptFiles-1) S/VS pages, indexed by register_address[12 +: UserNrSFileGroup]
+        self.s_group_len = nr_harts * (nr_vs_files + 1) - 1
+        self.thr_words = threshold_words(self.src_len)
+        self.numpy = use_numpy and np is not None
+        if self.numpy:
+            self._thr_table = np.array(self.thr_words, dtype=np.uint32)
+        self.reset()
+
+    def _zeros(self, cols, dtype=None):
+        if self.numpy:
+            return np.zeros((self.nr_harts, cols), dtype=dtype or np.uint32)
+        return [[0] * cols for _ in range(self.nr_harts)]
+
+    def reset(self):
+        self.eip = self._zeros(self.nr_words)
+        self.eie = self._zeros(self.nr_words)
+        self.eidelivery = self._zeros(self.nr_files, np.uint8 if self.numpy else None)
+        self.eithreshold = self._zeros(self.nr_files, np.intp if self.numpy else None)
+        # accesses that raised imsic_exception
+        self.exceptions = 0
+        self._changed()
+
+    def _changed(self):
+        """Drop the cached notifier outputs, called by every event."""
+        self._grid = None
+        self._pending = None
+        self._packed = None
+
+    def file_index(self, priv_lvl, vgein=0):
+        """Interrupt file selected by a CSR access: 0 M, 1 S, 1+vgein VS."""
+        if priv_lvl == PRIV_LVL_M:
+            return 0
+        if priv_lvl == PRIV_LVL_S:
+            return 1 + vgein
+        return 0
+
+    # ---------------------------------------------------------------
+    # Notifier
+    # ---------------------------------------------------------------
+    def _file_top(self, hart, file):
+        """(xtopei, pending) of one file, the per-file loop of the notifier."""
+        thr = self.thr_words[self.eithreshold[hart][file]]
+        base = file * self.nr_reg
+        for i in reversed(range(self.nr_reg)):
+            word = self.eip[hart][base + i] & self.eie[hart][base + i] & thr
+            if word:
+                return (32 * i + _lowest(int(word))) & self.src_mask, True
+        return 0, False
+
+    def _notify(self):
+        if self.numpy:
+            shape = (self.nr_harts, self.nr_files, self.nr_reg)
+            words = (self.eip & self.eie).reshape(shape) & self._thr_table[self.eithreshold][..., None]
+            nonzero = words != 0
+            pending = nonzero.any(axis=-1)
+            # highest non-empty word, then its lowest set bit
+            top = self.nr_reg - 1 - nonzero[..., ::-1].argmax(axis=-1)
+            word = np.take_along_axis(words, top[..., None], axis=-1)[..., 0]
+            bit = np.log2(np.where(pending, word & (~word + np.uint32(1)), 1)).astype(np.intp)
+            self._grid = np.where(pending, (32 * top + bit) & self.src_mask, 0)
+            self._pending = pending
+        else:
+            tops = [[self._file_top(hart, file) for file in range(self.nr_files)] for hart in range(self.nr_harts)]
+            self._grid = [[top for top, _ in row] for row in tops]
+            self._pending = [[pending for _, pending in row] for row in tops]
+
+    def xtopei_grid(self):
+        """[hart][file] xtopei, the layout unpack_grid gives for the xtopei port."""
+        if self._grid is None:
+            self._notify()
+        return self._grid
+
+    def xtopei(self, hart, file):
+        # one file does not need the whole grid (claims between two events)
+        if self._grid is None:
+            return self._file_top(hart, file)[0]
+        return int(self._grid[hart][file])
+
+    def xeip(self, hart, file):
+        """Xeip_targets: a candidate exists and the file delivers."""
+        self.xtopei_grid()
+        return int(bool(self._pending[hart][file] and self.eidelivery[hart][file]))
+
+    def packed_xtopei(self):
+        """The expected xtopei port value, [hart][file] fields of src_len bits."""
+        if self._packed is None and self.numpy:
+            fields = self.xtopei_grid().ravel()
+            bits = (fields[:, None] >> np.arange(self.src_len)) & 1
+            self._packed = int.from_bytes(np.packbits(bits.astype(np.uint8), bitorder="little").tobytes(), "little")
+        elif self._packed is None:
+            packed = 0
+            for hart, row in enumerate(self.xtopei_grid()):
+                for file, top in enumerate(row):
+                    packed |= int(top) << (self.src_len * (hart * self.nr_files + file))
+            self._packed = packed
+        return self._packed
+
+    # ---------------------------------------------------------------
+    # Interrupt delivery
+    # ---------------------------------------------------------------
+    def _set_bit(self, bits, hart, word, bit, value):
+        """Write one eip/eie bit, words past the last file and bit 0 of a file are dropped."""
+        if word >= self.nr_words or (bit == 0 and word % self.nr_reg == 0):
+            return
+        current = int(bits[hart][word])
+        bits[hart][word] = (current | (1 << bit)) if value else (current & ~(1 << bit))
+        self._changed()
+
+    def setipnum(self, hart, file, source):
+        """An MSI (or an APLIC channel write) pends source in a file."""
+        source &= self.src_mask
+        if 0 <= hart < self.nr_harts and file < self.nr_files and source <= self.nr_sources:
+            self._set_bit(self.eip, hart, file * self.nr_reg + source // 32, source % 32, 1)
+
+    def setipnum_many(self, harts, files, sources):
+        """setipnum() of every (hart, file, source) of three arrays at once."""
+        if not self.numpy:
+            for hart, file, source in zip(harts, files, sources):
+                self.setipnum(int(hart), int(file), int(source))
+            return
+        harts, files = np.asarray(harts, dtype=np.intp), np.asarray(files, dtype=np.intp)
+        sources = np.asarray(sources, dtype=np.intp) & self.src_mask
+        word, bit = files * self.nr_reg + sources // 32, sources % 32
+        ok = ((harts >= 0) & (harts < self.nr_harts) & (files < self.nr_files) & (sources <= self.nr_sources) &
+              (word < self.nr_words) & ~((bit == 0) & (word % self.nr_reg == 0)))
+        np.bitwise_or.at(self.eip, (harts[ok], word[ok]), np.left_shift(np.uint32(1), bit[ok].astype(np.uint32)))
+        self._changed()
+
+    def msi_write(self, addr, data):
+        """AXI write to the interrupt file pages (imsic_regmap.sv), True if it hit a file."""
+        m_end = IMSIC_M_FILE_ADDR + (self.nr_harts - 1) * IMSIC_PAGE_SIZE
+        s_end = IMSIC_S_FILE_ADDR + self.nr_harts * (self.nr_files - 1) * IMSIC_PAGE_SIZE - 4
+        if IMSIC_M_FILE_ADDR <= addr <= m_end:
+            hart, file = (addr >> 12) & ((1 << self.hart_len) - 1), 0
+        elif IMSIC_S_FILE_ADDR <= addr <= s_end:
+            page = (addr >> 12) & ((1 << self.s_group_len) - 1)
+            hart, file = divmod(page, self.nr_files - 1)
+            file += 1
+        else:
+            return False
+        self.setipnum(hart, file, data)
+        return True
+
+    # ---------------------------------------------------------------
+    # CSR channel
+    # ---------------------------------------------------------------
+    def _word(self, addr, base, file):
+        """Flat word index of an eip/eie access, None past NR_REG."""
+        idx = addr - base
+        return file * self.nr_reg + idx if idx <= self.nr_reg - 1 else None
+
+    def _write_words(self, bits, hart, word, data):
+        for n in range(self.access_words):
+            if word + n >= self.nr_words:
+                break
+            value = (data >> (32 * n)) & 0xFFFFFFFF
+            if (word + n) % self.nr_reg == 0:
+                value &= ~1
+            bits[hart][word + n] = value
+        self._changed()
+
+    def _read_words(self, bits, hart, word):
+        value = 0
+        for n in range(self.access_words):
+            if word + n < self.nr_words:
+                value |= int(bits[hart][word + n]) << (32 * n)
+        return value
+
+    def csr_write(self, hart, addr, data, priv_lvl=PRIV_LVL_M, vgein=0):
+        file = self.file_index(priv_lvl, vgein)
+        if addr == IMSIC_EIDELIVERY:
+            self.eidelivery[hart][file] = data & 1
+            self._changed()
+        elif addr == IMSIC_EITHRESHOLD:
+            self.eithreshold[hart][file] = data & self.src_mask
+            self._changed()
+        elif IMSIC_EIP0 <= addr < IMSIC_EIP0 + EIP_REGS:
+            word = self._word(addr, IMSIC_EIP0, file)
+            if word is not None:
+                self._write_words(self.eip, hart, word, data)
+        elif IMSIC_EIE0 <= addr < IMSIC_EIE0 + EIE_REGS:
+            word = self._word(addr, IMSIC_EIE0, file)
+            if word is not None:
+                self._write_words(self.eie, hart, word, data)
+        else:
+            self.exceptions += 1
+
+    def csr_read(self, hart, addr, priv_lvl=PRIV_LVL_M, vgein=0):
+        file = self.file_index(priv_lvl, vgein)
+        if addr == IMSIC_EIDELIVERY:
+            return int(self.eidelivery[hart][file])
+        if addr == IMSIC_EITHRESHOLD:
+            return int(self.eithreshold[hart][file])
+        if IMSIC_EIP0 <= addr < IMSIC_EIP0 + EIP_REGS:
+            word = self._word(addr, IMSIC_EIP0, file)
+            return 0 if word is None else self._read_words(self.eip, hart, word)
+        if IMSIC_EIE0 <= addr < IMSIC_EIE0 + EIE_REGS:
+            word = self._word(addr, IMSIC_EIE0, file)
+            return 0 if word is None else self._read_words(self.eie, hart, word)
+        self.exceptions += 1
+        return 0
+
+    def claim(self, hart, priv_lvl=PRIV_LVL_M, vgein=0):
+        """Claim the top interrupt of the selected file, return its id (0 if none)."""
+        file = self.file_index(priv_lvl, vgein)
+        top = self.xtopei(hart, file)
+        self._set_bit(self.eip, hart, file * self.nr_reg + top // 32, top % 32, 0)
+        return top
+
+    def drain(self, hart, file):
+        """Claim until xtopei of the file is 0, return the claimed ids in claim order.
+
+        The notifier takes the words from the highest down and the bits of a
+        word from the lowest up, so the whole sequence is read off the
+        pending and enabled bits at once instead of claim by claim.
+        """
+        if not self.numpy:
+            ids = []
+            while self.xtopei(hart, file):
+                ids.append(self.claim(hart, PRIV_LVL_M if file == 0 else PRIV_LVL_S, max(0, file - 1)))
+            return ids
+        base = file * self.nr_reg
+        eip = self.eip[hart, base:base + self.nr_reg]
+        words = eip & self.eie[hart, base:base + self.nr_reg] & np.uint32(self.thr_words[self.eithreshold[hart][file]])
+        if not words.any():
+            return np.zeros(0, dtype=np.intp)
+        # one row per word, highest first, bits lowest first
+        bits = np.unpackbits(words[::-1].astype("<u4").view(np.uint8).reshape(-1, 4), axis=1, bitorder="little")
+        rows, cols = np.nonzero(bits)
+        eip &= ~words
+        self._changed()
+        return (32 * (self.nr_reg - 1 - rows) + cols) & self.src_mask
+
+    def drain_all(self):
+        """drain() of every file: (hart, file, id) arrays, file by file in claim order."""
+        if not self.numpy:
+            claims = [(hart, file, top) for hart in range(self.nr_harts) for file in range(self.nr_files)
+                      for top in self.drain(hart, file)]
+            return tuple(list(column) for column in zip(*claims)) if claims else ([], [], [])
+        shape = (self.nr_harts, self.nr_files, self.nr_reg)
+        words = (self.eip & self.eie).reshape(shape) & self._thr_table[self.eithreshold][..., None]
+        self.eip &= ~words.reshape(self.eip.shape)
+        self._changed()
+        bits = np.unpackbits(words[..., ::-1].astype("<u4").view(np.uint8).reshape(shape + (4,)), axis=-1,
+                             bitorder="little")
+        hart, file, row, col = np.nonzero(bits.reshape(shape + (32,)))
+        return hart, file, (32 * (self.nr_reg - 1 - row) + col) & self.src_mask
+
+    def csr_cycle(self, hart, addr, data, we, claim, priv_lvl=PRIV_LVL_M, vgein=0):
+        """One clock edge of a hart's CSR channel, as sampled on the port.
+
+        A claim clears the xtopei the file had before the edge, after the
+        write of the same cycle (claim and we are not exclusive in the RTL).
+        """
+        file = self.file_index(priv_lvl, vgein)
+        top = self.xtopei(hart, file) if claim else 0
+        if we:
+            self.csr_write(hart, addr, data, priv_lvl, vgein)
+        if claim:
+            self._set_bit(self.eip, hart, file * self.nr_reg + top // 32, top % 32, 0)
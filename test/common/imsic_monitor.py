@@ -0,0 +1,249 @@
+"""
+Cycle-by-cycle check of the xtopei port against an ImsicModel.
+
+XtopeiMonitor follows the IMSIC CSR channel edge by edge. In the ReadOnly
+phase of every cycle it compares the xtopei port with the model, then
+samples the channel inputs the next edge registers and applies them to the
+model right after that edge. The model only recomputes its notifier after
+an event and keeps the packed port value, so a quiet cycle costs a few
+signal reads and one integer compare; the grid is unpacked only to name the
+files of a mismatch.
+
+MSIs reach the interrupt files through the AXI or APLIC path, whose latency
+is not visible on the ports. The bench announces them with expect() (or
+hands over the forwarded list of an AplicModel) and the monitor lands them
+in order: on the first cycle the port only matches with them applied, at
+the latest max_latency cycles after they were announced.
+
+    monitor = XtopeiMonitor(dut, model, checks)
+    monitor.start()
+    ...
+    monitor.expect(hart=0, file=1, source=5)
+    ...
+    monitor.stop()
+
+Landing on the port's cue follows the RTL but cannot see an MSI that never
+arrives. With expected=ImsicModel(...) the monitor also keeps a reference
+model: same CSR accesses, but every announced MSI lands in it right away,
+so checking the port against monitor.expected once the MSIs had time to
+arrive catches a dropped one. stop() does that check too.
+
+The first cycle of every mismatch is recorded in the Checker file by file
+as xtopei[hart][file]@cycle, and every callback in on_mismatch is called
+as callback(cycle, expected, actual) (e.g. WaveWindow.trigger). stop()
+lands the MSIs still in flight if the port matches with them and records
+as checks the mismatching cycles and the MSIs left pending. Each event (an
+announced MSI, a new CSR access) opens one window of grace cycles where a
+mismatch is tolerated; the window is not extended while the access is
+held, a mismatch anywhere else counts from its first cycle. stop() logs
+how many cycles the windows absorbed. A reset (ni_rst low) resets the
+models.
+"""
+import cocotb
+from cocotb.triggers import FallingEdge, ReadOnly, RisingEdge
+
+from bus_fields import clog2, unpack_grid
+
+# Cycles an announced MSI may take to reach its interrupt file
+MSI_MAX_LATENCY = 64
+
+class XtopeiMonitor:
+    def __init__(self, dut, model, checker=None, xtopei="xtopei", hart_ports=False, forwarded=None,
+                 max_latency=MSI_MAX_LATENCY, grace=0, expected=None):
+        self.dut = dut
+        self.model = model
+        # reference model: CSR accesses replayed, MSIs landed by the bench
+        self.expected = expected
+        self.checker = checker
+        self.xtopei = getattr(dut, xtopei)
+        self.hart_ports = hart_ports
+        # AplicModel.forwarded: (source, hart, file, eiid), drained every cycle
+        self.forwarded = forwarded
+        # select_file is NrInptFilesW bits wide on the APLIC channel
+        self.file_mask = (1 << clog2(model.nr_files)) - 1
+        self.max_latency = max_latency
+        # cycles a mismatch is tolerated after an MSI is announced or a CSR
+        # access is driven: MSIs announced late, inputs driven on the edge
+        # instead of between two edges
+        self.grace = grace
+        # last cycle of the current grace window
+        self._grace_end = -1
+        self.grace_windows = 0
+        self.tolerated = 0
+        # called as callback(cycle, expected, actual) on the first cycle of a mismatch
+        self.on_mismatch = []
+        # (cycle announced, hart, file, source), oldest first
+        self.pending = []
+        self.cycle = 0
+        self.mismatches = 0
+        self._unexplained = 0
+        self._sampled = []
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [cocotb.start_soon(self._run()), cocotb.start_soon(self._watch_reset())]
+        return self
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+        value = self.xtopei.value
+        if self.pending and value.is_resolvable:
+            # the MSIs of the last max_latency cycles: accounted for if the
+            # port matches with every one of them landed
+            pending, self.pending = self.pending, []
+            for msi in pending:
+                self._land(msi)
+            if int(value) != self.model.packed_xtopei():
+                self.pending = pending
+        if self.checker is not None:
+            self.checker.check("xtopei monitor mismatching cycles", 0, self.mismatches)
+            self.checker.check("xtopei monitor MSIs never landed", 0, len(self.pending))
+            if self.expected is not None and value.is_resolvable:
+                self.checker.check("xtopei at stop (expected model)", self.expected.packed_xtopei(), int(value))
+        if self.grace:
+            self.dut._log.info(f"xtopei monitor: {self.tolerated} cycles tolerated in {self.grace_windows} "
+                               f"grace windows of {self.grace} cycles")
+
+    def expect(self, hart, file, source):
+        """An MSI to (hart, file) is on its way, harts 0-based."""
+        self.pending.append((self.cycle, hart, file, source))
+        if self.expected is not None:
+            self.expected.setipnum(hart, file, source)
+        self._open_grace()
+
+    def expect_write(self, addr, data):
+        """An MSI written to an interrupt file page, see ImsicModel.msi_write."""
+        self.pending.append((self.cycle, None, addr, data))
+        if self.expected is not None:
+            self.expected.msi_write(addr, data)
+        self._open_grace()
+
+    def _open_grace(self):
+        """Tolerate a mismatch on the next grace cycles, one window per event."""
+        if self.grace:
+            self._grace_end = self.cycle + self.grace
+            self.grace_windows += 1
+
+    # ---------------------------------------------------------------
+    # Model side
+    # ---------------------------------------------------------------
+    def _land(self, msi):
+        _, hart, file, source = msi
+        if hart is None:
+            self.model.msi_write(file, source)
+        else:
+            self.model.setipnum(hart, file, source)
+
+    def _drain_forwarded(self):
+        if self.forwarded:
+            for _, hart, file, eiid in self.forwarded:
+                self.expect(hart, file & self.file_mask, eiid)
+            del self.forwarded[:]
+
+    def _compare(self, actual):
+        """Land the MSIs that explain actual, return whether the model matches it."""
+        while self.pending and self.pending[0][0] + self.max_latency <= self.cycle:
+            self._land(self.pending.pop(0))
+        if actual == self.model.packed_xtopei():
+            return True
+        # the in-flight MSIs arrive in order, land them until the port matches
+        landed = 0
+        for msi in self.pending:
+            self._land(msi)
+            landed += 1
+            if actual == self.model.packed_xtopei():
+                del self.pending[:landed]
+                return True
+        del self.pending[:landed]
+        return False
+
+    def _report(self, value):
+        if self.checker is None:
+            return
+        model = self.model
+        expected = model.xtopei_grid()
+        actual = unpack_grid(value, model.src_len, model.nr_harts, model.nr_files)
+        for hart in range(model.nr_harts):
+            for file in range(model.nr_files):
+                if int(expected[hart][file]) != int(actual[hart][file]):
+                    self.checker.check(f"xtopei[{hart}][{file}]@{self.cycle}", int(expected[hart][file]),
+                                       int(actual[hart][file]))
+
+    def _mismatch(self, value):
+        self._report(value)
+        for callback in self.on_mismatch:
+            callback(self.cycle, self.model.packed_xtopei(), int(value))
+
+    # ---------------------------------------------------------------
+    # DUT side
+    # ---------------------------------------------------------------
+    def _sample(self):
+        """(hart, addr, data, we, claim, priv_lvl, vgein) of every active CSR access."""
+        dut = self.dut
+        accesses = []
+        selected = 0
+        we, claim = int(dut.i_imsic_we.value), int(dut.i_imsic_claim.value)
+        if we or claim:
+            selected = int(dut.i_select_imsic.value)
+            access = (int(dut.i_imsic_addr.value), int(dut.i_imsic_data.value), we, claim,
+                      int(dut.i_priv_lvl.value), int(dut.i_vgein.value))
+            accesses += [(hart,) + access for hart in range(self.model.nr_harts) if (selected >> hart) & 1]
+        if self.hart_ports:
+            for hart in range(self.model.nr_harts):
+                if (selected >> hart) & 1 or not int(dut.i_hart_csr_en[hart].value):
+                    continue
+                we, claim = int(dut.i_hart_imsic_we[hart].value), int(dut.i_hart_imsic_claim[hart].value)
+                if we or claim:
+                    accesses.append((hart, int(dut.i_hart_imsic_addr[hart].value), int(dut.i_hart_imsic_data[hart].value),
+                                     we, claim, int(dut.i_hart_priv_lvl[hart].value), int(dut.i_hart_vgein[hart].value)))
+        return accesses
+
+    def _reset(self):
+        self.model.reset()
+        if self.expected is not None:
+            self.expected.reset()
+        self.pending = []
+        self._sampled = []
+        self._unexplained = 0
+
+    async def _watch_reset(self):
+        # pulse_reset releases ni_rst on the rising edge, ReadOnly may not see it low
+        while True:
+            await FallingEdge(self.dut.ni_rst)
+            self._reset()
+
+    async def _run(self):
+        dut = self.dut
+        while True:
+            await RisingEdge(dut.i_clk)
+            self.cycle += 1
+            for access in self._sampled:
+                self.model.csr_cycle(*access)
+                if self.expected is not None:
+                    self.expected.csr_cycle(*access)
+            await ReadOnly()
+
+            rst = dut.ni_rst.value
+            if not rst.is_resolvable or not int(rst):
+                self._reset()
+                continue
+
+            self._drain_forwarded()
+            value = self.xtopei.value
+            if value.is_resolvable:
+                if self._compare(int(value)):
+                    self._unexplained = 0
+                elif self.cycle <= self._grace_end:
+                    self.tolerated += 1
+                else:
+                    self._unexplained += 1
+                    self.mismatches += 1
+                    if self._unexplained == 1:
+                        self._mismatch(value)
+            sampled = self._sample()
+            if sampled and sampled != self._sampled:
+                # applied on the next edge, the window starts there
+                self._open_grace()
+            self._sampled = sampled
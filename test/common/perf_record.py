@@ -0,0 +1,122 @@
+"""
+Simulation-speed records and baseline comparison.
+
+Decorate a cocotb test with @perf_recorded (below @cocotb.test()) to record,
+per test, the wall time, simulated time, simulated cycles per wall-second and
+the number of Python callbacks the simulator made (trigger wake-ups, null
+when this cocotb cannot be hooked for them). The records go to PERF_OUT (default perf.json, next to results.xml).
+
+If a baseline file exists (PERF_BASELINE, default perf_baseline.json) the
+test fails when its cycles/s dropped by more than PERF_THRESHOLD (default
+0.2, i.e. 20%) against the baseline.
+
+CLI:
+    python3 perf_record.py compare perf.json perf_baseline.json [--threshold 0.2]
+    python3 perf_record.py update perf.json perf_baseline.json
+"""
+import argparse
+import functools
+import json
+import os
+import shutil
+import sys
+import time
+
+_records = {}
+_callbacks = [0]
+
+def _install_callback_counter(log):
+    """Count every trigger the simulator fires back into Python.
+
+    The count hooks the scheduler's private _react (cocotb 1.x). Returns
+    False, with a warning, when that hook does not exist in this cocotb.
+    """
+    import cocotb
+    scheduler = getattr(cocotb, "scheduler", None)
+    if scheduler is not None and getattr(scheduler, "_perf_counted", False):
+        return True
+    if scheduler is None or not hasattr(scheduler, "_react"):
+        log.warning("perf: cannot hook the cocotb scheduler, python_callbacks is not recorded")
+        return False
+    react = scheduler._react
+
+    def counted_react(trigger):
+        _callbacks[0] += 1
+        return react(trigger)
+
+    scheduler._react = counted_react
+    scheduler._perf_counted = True
+    return True
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)["tests"]
+
+def write(path, records):
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({"tests": records}, f, indent=2)
+    os.replace(tmp, path)
+
+def compare(records, baseline, threshold):
+    """Return [(test, baseline cycles/s, cycles/s)] for the slowed-down tests."""
+    regressions = []
+    for test, base in baseline.items():
+        current = records.get(test)
+        if current is None or not base.get("cycles_per_s") or current.get("cycles_per_s") is None:
+            continue
+        if current["cycles_per_s"] < base["cycles_per_s"] * (1 - threshold):
+            regressions.append((test, base["cycles_per_s"], current["cycles_per_s"]))
+    return regressions
+
+def perf_recorded(test):
+    @functools.wraps(test)
+    async def wrapper(dut, *args, **kwargs):
+        from cocotb.utils import get_sim_time
+        from aia_clock import ONE_CYCLE
+        counted = _install_callback_counter(dut._log)
+        callbacks = _callbacks[0]
+        sim_start = get_sim_time("ns")
+        wall_start = time.perf_counter()
+
+        await test(dut, *args, **kwargs)
+
+        wall = time.perf_counter() - wall_start
+        sim_ns = get_sim_time("ns") - sim_start
+        cycles = sim_ns / ONE_CYCLE
+        record = {"wall_s": round(wall, 4), "sim_time_ns": sim_ns, "cycles": int(cycles),
+                  "cycles_per_s": round(cycles / wall, 1) if wall > 0 else None,
+                  "python_callbacks": _callbacks[0] - callbacks if counted else None}
+        _records[test.__name__] = record
+        write(os.environ.get("PERF_OUT", "perf.json"), _records)
+        dut._log.info(f"perf: {record}")
+
+        baseline_path = os.environ.get("PERF_BASELINE", "perf_baseline.json")
+        if os.path.exists(baseline_path):
+            threshold = float(os.environ.get("PERF_THRESHOLD", "0.2"))
+            for name, base, current in compare({test.__name__: record}, load(baseline_path), threshold):
+                raise AssertionError(f"{name} slowed down to {current:.0f} cycles/s from a baseline of "
+                                     f"{base:.0f} cycles/s (threshold {threshold:.0%})")
+    return wrapper
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["compare", "update"])
+    parser.add_argument("records", help="perf.json of a run")
+    parser.add_argument("baseline", help="baseline file")
+    parser.add_argument("--threshold", type=float, default=float(os.environ.get("PERF_THRESHOLD", "0.2")))
+    args = parser.parse_args()
+
+    if args.command == "update":
+        shutil.copyfile(args.records, args.baseline)
+        print(f"baseline {args.baseline} updated from {args.records}")
+        return
+
+    regressions = compare(load(args.records), load(args.baseline), args.threshold)
+    for name, base, current in regressions:
+        print(f"{name}: {current:.0f} cycles/s, baseline {base:.0f} cycles/s")
+    print(f"{len(regressions)} tests slower than the baseline by more than {args.threshold:.0%}")
+    sys.exit(1 if regressions else 0)
+
+if __name__ == "__main__":
+    main()
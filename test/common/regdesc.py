@@ -0,0 +1,204 @@
+"""
+Register descriptor table of the APLIC and the IMSIC, built from the RTL.
+
+Offsets and field positions are read from aplic_pkg.sv and imsic_pkg.sv
+(via sv_params.py) when the module is imported, so the benches never carry
+their own copy of the register map. A RegMap instantiates the APLIC table
+for one configuration (domain bases, sources, harts) and precomputes
+
+    addr -> RegRef(reg, domain, index)       O(1) decode
+    (reg name, domain, index) -> addr        O(1) encode
+
+so bulk accesses are plain dict lookups, and every register knows its
+fields for encode/decode and pretty-printing:
+
+    regmap = RegMap([0xc000000, 0xd000000], nr_sources=32, nr_harts=2)
+    regmap.addr("sourcecfg", domain=1, index=3)
+    regmap.encode("target", hi=1, iprio=2)
+    regmap.format(addr, value)    # 'target[3]@d1 = 0x40002 {hi=0x1, ..., iprio=0x2}'
+
+Privilege levels are the imsic_pkg.sv encoding (PRIV_LVL_M = 3, PRIV_LVL_S
+= 1) everywhere; APLIC domains are addressed by domain index.
+"""
+import os
+from collections import namedtuple
+
+from sv_params import RTL_PACKAGE, parse_package_files
+
+PARAMS = parse_package_files(*[os.path.join(RTL_PACKAGE, pkg) for pkg in
+                               ("aplic_domain_pkg.sv", "aia_pkg.sv", "aplic_pkg.sv", "imsic_pkg.sv")])
+
+PRIV_LVL_M = PARAMS["PRIV_LVL_M"]
+PRIV_LVL_S = PARAMS["PRIV_LVL_S"]
+
+# aplic_regmap.sv decodes the IDCs at 'h4000, one 'h20 block per hart
+IDC_OFF = 0x4000
+IDC_SIZE = 0x20
+
+SOURCE_MODES = {0: "INACTIVE", 1: "DETACHED", 4: "EDGE1", 5: "EDGE0", 6: "LEVEL1", 7: "LEVEL0"}
+
+class Field:
+    def __init__(self, name, off, width, names=None):
+        self.name = name
+        self.off = off
+        self.width = width
+        self.mask = ((1 << width) - 1) << off
+        # value -> name, for pretty-printing enums
+        self.names = names or {}
+
+    def encode(self, value):
+        return (value << self.off) & self.mask
+
+    def decode(self, word):
+        return (word & self.mask) >> self.off
+
+    def format(self, value):
+        return self.names.get(value, hex(value))
+
+class Register:
+    """One register, or an array of count registers stride bytes apart.
+
+    index is the array index (first_index for the register at off): the
+    source number for sourcecfg/target, the word for setip/setie, the hart
+    for the IDC registers.
+    """
+
+    def __init__(self, name, off, fields=(), count=None, first_index=0, stride=4, idc=False):
+        self.name = name
+        self.off = off
+        self.fields = list(fields)
+        self.count = count
+        self.first_index = first_index
+        self.stride = stride
+        self.idc = idc
+
+    def offsets(self, nr_harts):
+        """[(offset inside the domain, index)] of every instance."""
+        if self.idc:
+            return [(IDC_OFF + IDC_SIZE * hart + self.off, hart) for hart in range(nr_harts)]
+        if self.count is None:
+            return [(self.off, None)]
+        return [(self.off + self.stride * i, self.first_index + i) for i in range(self.count)]
+
+    def encode(self, **fields):
+        by_name = {f.name: f for f in self.fields}
+        word = 0
+        for name, value in fields.items():
+            word |= by_name[name].encode(value)
+        return word
+
+    def decode(self, word):
+        return {f.name: f.decode(word) for f in self.fields}
+
+    def format(self, word):
+        if not self.fields:
+            return hex(word)
+        return hex(word) + " {" + ", ".join(f"{f.name}={f.format(f.decode(word))}" for f in self.fields) + "}"
+
+def _f(name, field, names=None):
+    """Field from the <FIELD>_OFF/<FIELD>_LEN pair of the package (LEN 1 if missing)."""
+    return Field(name, PARAMS[f"{field}_OFF"], PARAMS.get(f"{field}_LEN", 1), names)
+
+def aplic_registers(nr_sources):
+    """Register table of one APLIC domain with nr_sources sources (source 0 included)."""
+    words = (nr_sources - 1) // 32 + 1
+    # aplic_regmap.sv decodes ci from wdata[9:0], SOURCECFG_CI_OFF/LEN do not describe it
+    ci = Field("ci", 0, 10)
+    return [
+        Register("domaincfg", PARAMS["DOMAINCFG_OFF"], [_f("ro80", "DOMAINCFG_RO80"), _f("ie", "DOMAINCFG_IE"),
+                                                        _f("dm", "DOMAINCFG_DM"), _f("be", "DOMAINCFG_BE")]),
+        Register("sourcecfg", PARAMS["SOURCECFG_OFF"], [_f("d", "SOURCECFG_D"), ci, _f("sm", "SOURCECFG_SM", SOURCE_MODES)],
+                 count=nr_sources - 1, first_index=1),
+        Register("mmsiaddrcfg", PARAMS["MMSIADDRCFG_OFF"]),
+        Register("mmsiaddrcfgh", PARAMS["MMSIADDRCFGH_OFF"]),
+        Register("smsiaddrcfg", PARAMS["SMSIADDRCFG_OFF"]),
+        Register("smsiaddrcfgh", PARAMS["SMSIADDRCFGH_OFF"]),
+        Register("setip", PARAMS["SETIP_OFF"], count=words),
+        Register("setipnum", PARAMS["SETIPNUM_OFF"]),
+        Register("in_clrip", PARAMS["INCLRIP_OFF"], count=words),
+        Register("clripnum", PARAMS["CLRIPNUM_OFF"]),
+        Register("setie", PARAMS["SETIe_OFF"], count=words),
+        Register("setienum", PARAMS["SETIENUM_OFF"]),
+        Register("clrie", PARAMS["CLRIE_OFF"], count=words),
+        Register("clrienum", PARAMS["CLRIENUM_OFF"]),
+        Register("setipnum_le", PARAMS["SETIPNUM_LE_OFF"]),
+        Register("setipnum_be", PARAMS["SETIPNUM_BE_OFF"]),
+        Register("genmsi", PARAMS["GENMSI_OFF"], [_f("hi", "GENMSI_HI"), _f("busy", "GENMSI_BUSY"), _f("eiid", "GENMSI_EIID")]),
+        # iprio (DIRECT) and gi/eiid (MSI) share the low bits
+        Register("target", PARAMS["TARGET_OFF"], [_f("hi", "TARGET_HI"), _f("gi", "TARGET_GI"), _f("eiid", "TARGET_EIID"),
+                                                  _f("iprio", "TARGET_IPRIO")], count=nr_sources - 1, first_index=1),
+        Register("idelivery", PARAMS["IDC_IDELIVERY"], idc=True),
+        Register("iforce", PARAMS["IDC_IFORCE"], idc=True),
+        Register("ithreshold", PARAMS["IDC_ITHRESHOLD"], idc=True),
+        Register("topi", PARAMS["IDC_TOPI"], [_f("iid", "CLAIMI_IID"), _f("prio", "CLAIMI_PRIO")], idc=True),
+        Register("claimi", PARAMS["IDC_CLAIMI"], [_f("iid", "CLAIMI_IID"), _f("prio", "CLAIMI_PRIO")], idc=True),
+    ]
+
+RegRef = namedtuple("RegRef", "reg domain index")
+
+class RegMap:
+    def __init__(self, domain_bases, nr_sources, nr_harts):
+        self.domain_bases = list(domain_bases)
+        self.nr_sources = nr_sources
+        self.nr_harts = nr_harts
+        self.registers = {reg.name: reg for reg in aplic_registers(nr_sources)}
+        self._decode = {}
+        self._encode = {}
+        for domain, base in enumerate(self.domain_bases):
+            for reg in self.registers.values():
+                for off, index in reg.offsets(nr_harts):
+                    ref = RegRef(reg, domain, index)
+                    self._decode[base + off] = ref
+                    self._encode[(reg.name, domain, index)] = base + off
+
+    def decode(self, addr):
+        """RegRef of addr, None if no register is mapped there."""
+        return self._decode.get(addr)
+
+    def addr(self, name, domain=0, index=None):
+        return self._encode[(name, domain, index)]
+
+    def addrs(self, name, domain=0, indexes=None):
+        """Addresses of every instance (or of indexes) of an array register."""
+        if indexes is None:
+            indexes = [index for _, index in self.registers[name].offsets(self.nr_harts)]
+        return [self._encode[(name, domain, index)] for index in indexes]
+
+    def encode(self, name, **fields):
+        return self.registers[name].encode(**fields)
+
+    def fields(self, addr, value):
+        return self.decode(addr).reg.decode(value)
+
+    def name(self, addr):
+        ref = self.decode(addr)
+        if ref is None:
+            return hex(addr)
+        index = "" if ref.index is None else f"[{ref.index}]"
+        return f"{ref.reg.name}{index}@d{ref.domain}"
+
+    def format(self, addr, value):
+        ref = self.decode(addr)
+        if ref is None:
+            return f"{hex(addr)} = {hex(value)}"
+        return f"{self.name(addr)} = {ref.reg.format(value)}"
+
+# IMSIC interrupt file registers, accessed through the CSR channel (imsic_addr)
+IMSIC_EIDELIVERY = PARAMS["EIDELIVERY_OFF"]
+IMSIC_EITHRESHOLD = PARAMS["EITHRESHOLD_OFF"]
+IMSIC_EIP0 = PARAMS["EIP0_OFF"]
+IMSIC_EIE0 = PARAMS["EIE0_OFF"]
+# MSI pages of the interrupt files
+IMSIC_M_FILE_ADDR = PARAMS["DefaultImsicCfg"]["InptFilesMAddr"]
+IMSIC_S_FILE_ADDR = PARAMS["DefaultImsicCfg"]["InptFilesSAddr"]
+IMSIC_PAGE_SIZE = 0x1000
+
+def imsic_eie(source, xlen):
+    """(imsic_addr, bit) of the eie bit of source; only even registers exist on RV64."""
+    return IMSIC_EIE0 + (source // xlen) * (xlen // 32), 1 << (source % xlen)
+
+def imsic_file_addr(hart, priv_lvl, guest, nr_vs_files):
+    """MSI page of the interrupt file of a 1-based hart (guest 0 is the S file)."""
+    if priv_lvl == PRIV_LVL_M:
+        return IMSIC_M_FILE_ADDR + IMSIC_PAGE_SIZE * (hart - 1)
+    return IMSIC_S_FILE_ADDR + IMSIC_PAGE_SIZE * ((hart - 1) * (nr_vs_files + 1) + guest)
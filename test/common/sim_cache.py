@@ -0,0 +1,91 @@
+"""
+Content-addressed cache of Verilator builds.
+
+The key is a sha256 over everything that changes the simulator binary: the
+contents of every VERILOG_SOURCES file (which covers the aia_define_*.svh
+selection and the aia_pkg.sv parameters), the toplevel, the Verilator flags,
+and the Verilator and cocotb versions. The build directory for a key is
+<cache-dir>/<key>, so a configuration that was built before, by this bench or
+by another regression run, reuses its binary instead of being recompiled.
+
+The cocotb makefiles rebuild when a source is newer than the binary. On a hit
+the cached outputs are touched so a source file that was only rewritten (e.g.
+a regenerated aia_pkg.sv) does not trigger a rebuild of identical content.
+
+Usage (from a makefile, prints the build directory):
+    SIM_BUILD := $(shell python3 sim_cache.py --cache-dir DIR --toplevel TOP --flags="$(EXTRA_ARGS)" $(VERILOG_SOURCES))
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+# Verilator outputs in the order make checks them (Vtop depends on Vtop.mk)
+OUTPUTS = ["Vtop.mk", "Vtop"]
+MANIFEST = "sim_cache.json"
+
+def tool_version(cmd):
+    if shutil.which(cmd[0]) is None:
+        return None
+    try:
+        return subprocess.run(cmd, capture_output=True, text=True, check=False).stdout.strip()
+    except OSError:
+        return None
+
+def cache_key(sources, toplevel, flags, versions=None):
+    """Return (key, manifest) for a build of sources with flags."""
+    if versions is None:
+        versions = {"verilator": tool_version(["verilator", "--version"]),
+                    "cocotb": tool_version(["cocotb-config", "--version"])}
+
+    digest = hashlib.sha256()
+    files = {}
+    for src in sources:
+        with open(src, "rb") as f:
+            file_digest = hashlib.sha256(f.read()).hexdigest()
+        files[src] = file_digest
+        # the position of a source matters (package compile order), its path does not
+        digest.update(os.path.basename(src).encode() + b"\0" + file_digest.encode() + b"\0")
+
+    manifest = {"toplevel": toplevel, "flags": flags.split(), "versions": versions}
+    digest.update(json.dumps(manifest, sort_keys=True).encode())
+    manifest["sources"] = files
+    return digest.hexdigest(), manifest
+
+def is_built(build_dir):
+    return all(os.path.exists(os.path.join(build_dir, out)) for out in OUTPUTS)
+
+def lookup(cache_dir, sources, toplevel, flags):
+    """Return (build_dir, hit) for the build of sources with flags."""
+    key, manifest = cache_key(sources, toplevel, flags)
+    build_dir = os.path.join(os.path.abspath(cache_dir), key[:16])
+    hit = is_built(build_dir)
+
+    if hit:
+        # Identical content, keep make from rebuilding because of newer mtimes
+        for out in OUTPUTS:
+            os.utime(os.path.join(build_dir, out))
+    else:
+        os.makedirs(build_dir, exist_ok=True)
+        with open(os.path.join(build_dir, MANIFEST), "w") as f:
+            json.dump(dict(manifest, key=key), f, indent=2)
+
+    return build_dir, hit
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cache-dir", required=True, help="directory holding one build per key")
+    parser.add_argument("--toplevel", required=True)
+    parser.add_argument("--flags", default="", help="Verilator flags (EXTRA_ARGS)")
+    parser.add_argument("sources", nargs="+")
+    args = parser.parse_args()
+
+    build_dir, hit = lookup(args.cache_dir, args.sources, args.toplevel, args.flags)
+    print(f"sim_cache: {'hit' if hit else 'miss'} {build_dir}", file=sys.stderr)
+    print(build_dir)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Run the cocotb tests of a bench as separate simulations, in parallel.
+
+Every @cocotb.test() of the bench module is one make invocation with
+TESTCASE=<test>, so each test starts from a fresh simulator. The first test
+runs alone (it builds the simulator), the others run in up to --jobs worker
+processes on the built model. Each test writes its own artifacts:
+
+    split/<test>.xml           cocotb results (COCOTB_RESULTS_FILE)
+    split/<test>.perf.json     perf_record.py records (PERF_OUT)
+    split/<test>.checks.*      checks.py records (CHECKS_OUT)
+    split/<test>.log           make output
+
+and the results of every test are merged into results.xml.
+
+Usage (from the bench folder):
+    python3 ../common/split_run.py --module aplic_domain_regctl_tb.py -j 4
+    python3 ../common/split_run.py --module aia_tb.py -- make -f run.mk runme
+    python3 ../common/split_run.py --module imsic_top_tb.py --tests claim_test
+"""
+import argparse
+import ast
+import os
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+def list_tests(module_path):
+    """Names of the @cocotb.test() coroutines of a bench module, in file order."""
+    with open(module_path) as f:
+        tree = ast.parse(f.read(), module_path)
+    tests = []
+    for node in tree.body:
+        if not isinstance(node, ast.AsyncFunctionDef):
+            continue
+        for deco in node.decorator_list:
+            func = deco.func if isinstance(deco, ast.Call) else deco
+            if isinstance(func, ast.Attribute) and func.attr == "test":
+                tests.append(node.name)
+                break
+    return tests
+
+def run_test(test, command, out_dir):
+    prefix = os.path.join(out_dir, test)
+    env = dict(os.environ, TESTCASE=test, COCOTB_RESULTS_FILE=prefix + ".xml",
+               PERF_OUT=prefix + ".perf.json", CHECKS_OUT=prefix + ".checks")
+    with open(prefix + ".log", "w") as log:
+        proc = subprocess.run(command, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return test, proc.returncode
+
+def merge_results(tests, out_dir, results_xml):
+    """Merge the per-test results into one results.xml, return the failed tests."""
+    merged = ET.Element("testsuites", name="results")
+    failed = []
+    for test in tests:
+        path = os.path.join(out_dir, test + ".xml")
+        if not os.path.exists(path):
+            failed.append(test)
+            continue
+        for suite in ET.parse(path).getroot().iter("testsuite"):
+            merged.append(suite)
+            for case in suite.iter("testcase"):
+                if case.find("failure") is not None or case.find("error") is not None:
+                    failed.append(case.get("name"))
+    ET.ElementTree(merged).write(results_xml, encoding="UTF-8", xml_declaration=True)
+    return failed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", required=True, help="the bench's cocotb module (MODULE + .py)")
+    parser.add_argument("--tests", nargs="+", help="only these tests (default: every test of the module)")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("--out", default="split", help="directory for the per-test artifacts")
+    parser.add_argument("command", nargs="*", default=["make"], help="command that runs the bench (default: make)")
+    args = parser.parse_args()
+
+    tests = args.tests or list_tests(args.module)
+    if not tests:
+        sys.exit(f"no cocotb tests in {args.module}")
+    os.makedirs(args.out, exist_ok=True)
+
+    # the first run builds the simulator, the others only run it
+    results = [run_test(tests[0], args.command, args.out)]
+    print(f"{'pass' if results[0][1] == 0 else 'fail':<5} {tests[0]}", flush=True)
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        for test, rc in pool.map(lambda t: run_test(t, args.command, args.out), tests[1:]):
+            print(f"{'pass' if rc == 0 else 'fail':<5} {test}", flush=True)
+            results.append((test, rc))
+
+    failed = merge_results(tests, args.out, "results.xml")
+    failed += [test for test, rc in results if rc != 0 and test not in failed]
+    print(f"{len(tests) - len(failed)}/{len(tests)} tests passed, results in results.xml and {args.out}/")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+"""
+SystemVerilog package parameters as Python values.
+
+parse_package() evaluates every localparam/parameter of a package in file
+order with a small constant-expression evaluator: sized literals
+(32'hd000000), casts (shortint'(1)), arithmetic, bitwise, shift, comparison
+and ternary operators, $clog2, and assignment patterns ('{a: 1, b: 2} is a
+dict, '{x, y} a list). Packages are chained by passing the parameters of the
+imported ones:
+
+    params = parse_package(aia_pkg_text, parse_package(aplic_domain_pkg_text))
+
+Used by generate_aia_define.py and regdesc.py.
+"""
+import os
+import re
+
+# rtl/package, relative to test/common
+RTL_PACKAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "rtl", "package")
+
+TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<sized>(?:\d[\d_]*)?\s*'[sS]?[hH][0-9a-fA-F_xXzZ?]+|(?:\d[\d_]*)?\s*'[sS]?[dD][\d_]+
+            |(?:\d[\d_]*)?\s*'[sS]?[bB][01_xXzZ?]+|(?:\d[\d_]*)?\s*'[sS]?[oO][0-7_xXzZ?]+)
+  | (?P<pattern>'\{)
+  | (?P<cast>'\()
+  | (?P<fill>'[01xXzZ])
+  | (?P<number>\d[\d_]*)
+  | (?P<name>\$?[A-Za-z_]\w*(?:::\w+)?)
+  | (?P<op><<<|>>>|<<|>>|==|!=|<=|>=|&&|\|\||\*\*|[-+*/%&|^~!<>?:(),{}\[\]])
+""", re.VERBOSE)
+
+RADIX = {"h": 16, "d": 10, "b": 2, "o": 8}
+
+# binary operators: precedence (higher binds tighter) and evaluation
+BINARY = {
+    "**": (12, lambda a, b: a ** b),
+    "*": (11, lambda a, b: a * b), "/": (11, lambda a, b: a // b), "%": (11, lambda a, b: a % b),
+    "+": (10, lambda a, b: a + b), "-": (10, lambda a, b: a - b),
+    "<<": (9, lambda a, b: a << b), ">>": (9, lambda a, b: a >> b),
+    "<<<": (9, lambda a, b: a << b), ">>>": (9, lambda a, b: a >> b),
+    "<": (8, lambda a, b: int(a < b)), "<=": (8, lambda a, b: int(a <= b)),
+    ">": (8, lambda a, b: int(a > b)), ">=": (8, lambda a, b: int(a >= b)),
+    "==": (7, lambda a, b: int(a == b)), "!=": (7, lambda a, b: int(a != b)),
+    "&": (6, lambda a, b: a & b), "^": (5, lambda a, b: a ^ b), "|": (4, lambda a, b: a | b),
+    "&&": (3, lambda a, b: int(bool(a) and bool(b))), "||": (2, lambda a, b: int(bool(a) or bool(b))),
+}
+TERNARY_PREC = 1
+
+def clog2(value):
+    return max(0, (value - 1).bit_length())
+
+FUNCTIONS = {"$clog2": clog2}
+
+def tokenize(text):
+    tokens = []
+    pos = 0
+    while pos < len(text):
+        match = TOKEN.match(text, pos)
+        if match is None:
+            raise ValueError(f"unexpected {text[pos:pos+10]!r} in {text!r}")
+        pos = match.end()
+        if match.lastgroup != "space":
+            tokens.append((match.lastgroup, match.group().replace(" ", "")))
+    return tokens
+
+class ConstExpr:
+    """Recursive-descent evaluator of one SystemVerilog constant expression."""
+
+    def __init__(self, text, params):
+        self.tokens = tokenize(text)
+        self.pos = 0
+        self.params = params
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, value=None):
+        kind, text = self.peek()
+        if value is not None and text != value:
+            raise ValueError(f"expected {value!r}, got {text!r}")
+        self.pos += 1
+        return kind, text
+
+    def evaluate(self):
+        value = self.expr(0)
+        if self.pos != len(self.tokens):
+            raise ValueError(f"trailing {self.peek()[1]!r}")
+        return value
+
+    def expr(self, min_prec):
+        value = self.unary()
+        while True:
+            kind, op = self.peek()
+            if kind != "op":
+                return value
+            if op == "?" and min_prec <= TERNARY_PREC:
+                self.take()
+                then = self.expr(0)
+                self.take(":")
+                other = self.expr(TERNARY_PREC)
+                value = then if value else other
+                continue
+            if op not in BINARY or BINARY[op][0] < min_prec:
+                return value
+            prec, apply = BINARY[op]
+            self.take()
+            # ** is right associative, the others left associative
+            value = apply(value, self.expr(prec if op == "**" else prec + 1))
+
+    def unary(self):
+        kind, text = self.peek()
+        if text in ("-", "+", "~", "!"):
+            self.take()
+            value = self.unary()
+            return {"-": -value, "+": value, "~": ~value, "!": int(not value)}[text]
+        return self.primary()
+
+    def primary(self):
+        kind, text = self.take()
+        if kind == "number":
+            return int(text.replace("_", ""))
+        if kind == "sized":
+            digits = text.split("'")[1].lstrip("sS")
+            return int(re.sub(r"[xXzZ?]", "0", digits[1:].replace("_", "")), RADIX[digits[0].lower()])
+        if kind == "fill":
+            return 1 if text[1] == "1" else 0
+        if kind == "pattern":
+            return self.assignment_pattern()
+        if text == "(":
+            value = self.expr(0)
+            self.take(")")
+            return value
+        if kind == "name":
+            if self.peek()[0] == "cast":
+                # type'(expr): the value is kept as is
+                self.take()
+                value = self.expr(0)
+                self.take(")")
+                return value
+            if text in FUNCTIONS:
+                self.take("(")
+                value = FUNCTIONS[text](self.expr(0))
+                self.take(")")
+                return value
+            name = text.split("::")[-1]
+            if name not in self.params:
+                raise KeyError(name)
+            return self.params[name]
+        raise ValueError(f"unexpected {text!r}")
+
+    def assignment_pattern(self):
+        """'{key: value, ...} -> dict, '{value, ...} -> list."""
+        items = []
+        keyed = {}
+        while self.peek()[1] != "}":
+            kind, text = self.peek()
+            if kind == "name" and self.pos + 1 < len(self.tokens) and self.tokens[self.pos + 1][1] == ":":
+                self.take()
+                self.take(":")
+                keyed[text] = self.expr(0)
+            else:
+                items.append(self.expr(0))
+            if self.peek()[1] == ",":
+                self.take()
+        self.take("}")
+        return keyed if keyed else items
+
+def strip_comments(text):
+    text = re.sub(r"/\*.*?\*/", " ", text, flags=re.DOTALL)
+    return re.sub(r"//[^\n]*", "", text)
+
+def split_statements(text):
+    """Split on ; outside of braces, parentheses and brackets."""
+    statements, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c in "{([":
+            depth += 1
+        elif c in "})]":
+            depth -= 1
+        elif c == ";" and depth == 0:
+            statements.append(text[start:i].strip())
+            start = i + 1
+    return statements
+
+# a statement can start with the end of the function/block before it
+PARAM = re.compile(r"^(?:(?:end\w*|begin)\s+)*(?:localparam|parameter)\b(?P<lhs>[^=]*?)(?P<name>\w+)\s*(?:\[[^\]]*\]\s*)*=(?P<expr>.*)$", re.DOTALL)
+
+def parse_package(text, params=None):
+    """Evaluate every localparam/parameter of a package, in file order.
+
+    Parameters that reference something outside the package (another
+    package's parameter, an unsupported construct) are left out.
+    """
+    params = dict(params or {})
+    for statement in split_statements(strip_comments(text)):
+        match = PARAM.match(statement)
+        if match is None:
+            continue
+        try:
+            params[match.group("name")] = ConstExpr(match.group("expr"), params).evaluate()
+        except (KeyError, ValueError, ZeroDivisionError):
+            continue
+    return params
+
+def parse_package_files(*paths):
+    """parse_package() over paths, in import order."""
+    params = {}
+    for path in paths:
+        with open(path) as f:
+            params = parse_package(f.read(), params)
+    return params
@@ -0,0 +1,21 @@
+/**
+* Copyright 2024 Francisco Marques & Zero-Day Labs, Lda
+* SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+*
+* Testbench clock generator. Only compiled when the bench is built with
+* CLOCK=native (Verilator --timing), so the clock toggles inside the
+* simulator and never wakes up Python.
+*/
+
+module tb_clock #(
+    parameter realtime                      HalfPeriod  = 1ns
+) (
+    output logic                            o_clk
+);
+
+initial begin
+    o_clk = 1'b0;
+    forever #(HalfPeriod) o_clk = ~o_clk;
+end
+
+endmodule
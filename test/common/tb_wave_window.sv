@@ -0,0 +1,56 @@
+/**
+* Copyright 2024 Francisco Marques & Zero-Day Labs, Lda
+* SPDX-License-Identifier: Apache-2.0 WITH SHL-2.1
+*
+* Testbench wave window. Only compiled when the bench is built with
+* AIA_WAVES=trigger: the simulator dumps the whole design to the trace file,
+* but only between the $dumpon and $dumpoff issued here. The test arms a
+* window or fires the trigger by writing the control variables once
+* (common/wave_window.py), nothing is sampled from Python.
+*/
+
+module tb_wave_window (
+    input  logic                            i_clk
+);
+
+/** Written from cocotb, cleared here once served */
+logic                                       trigger         = 1'b0;
+logic                                       window_en       = 1'b0;
+logic [31:0]                                window_first    = '0;
+logic [31:0]                                window_last     = '0;
+logic [31:0]                                post_cycles     = 32'd100;
+
+/** Cycles since time 0 and the cycle the current dump stops at */
+logic [31:0]                                cycle           = '0;
+logic [31:0]                                stop_cycle      = '0;
+logic                                       dumping         = 1'b0;
+string                                      file;
+
+initial begin
+    if (!$value$plusargs("aia_waves_file=%s", file))
+        file = "window.fst";
+    $dumpfile(file);
+    $dumpvars;
+    $dumpoff;
+end
+
+always @(posedge i_clk) begin
+    cycle <= cycle + 1;
+    if (!dumping && trigger) begin
+        $dumpon;
+        dumping     <= 1'b1;
+        stop_cycle  <= cycle + post_cycles;
+        trigger     <= 1'b0;
+    end else if (!dumping && window_en && (cycle == window_first)) begin
+        $dumpon;
+        dumping     <= 1'b1;
+        stop_cycle  <= window_last;
+        window_en   <= 1'b0;
+    end else if (dumping && (cycle >= stop_cycle)) begin
+        $dumpoff;
+        $dumpflush;
+        dumping     <= 1'b0;
+    end
+end
+
+endmodule
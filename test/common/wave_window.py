@@ -0,0 +1,100 @@
+"""
+Triggered/windowed waveform recording, dumped by the simulator.
+
+With AIA_WAVES=trigger the bench is built with --trace-fst and the
+tb_wave_window module (tb_wave_window.sv) inside the wrapper. It keeps the
+trace off ($dumpoff) and counts cycles itself; the test only writes its
+control variables: start() arms a fixed [first, last] cycle window (from
+AIA_WAVES_WINDOW or record()), trigger() (e.g. on the first scoreboard or
+xtopei mismatch) dumps the whole design, internal signals included, for
+post_cycles cycles. Nothing runs in Python per cycle.
+
+A dump cannot reach back in time, so the first trigger of the run also
+writes AIA_WAVES_FILE.replay: the test, its AIA_SEED and the window from
+pre_cycles before the trigger to post_cycles after it. `make run` reruns
+that test with them when the file shows up (integration Makefile), the
+same stimulus then dumps the cycles before the mismatch into the same
+file. In a replay (AIA_WAVES_WINDOW set) trigger() only logs.
+
+Environment:
+    AIA_WAVES=trigger       enable (WaveWindow.from_env returns None otherwise)
+    AIA_WAVES_PRE=N         cycles dumped before the trigger, by the replay (default 1000)
+    AIA_WAVES_POST=N        cycles dumped after the trigger (default 100)
+    AIA_WAVES_WINDOW=A:B    dump cycles A to B, counted from start(), instead of waiting for a trigger
+    AIA_WAVES_FILE=path     output file, passed to the simulator as +aia_waves_file (default window.fst)
+"""
+import os
+
+class WaveWindow:
+    def __init__(self, dut, test=None, path="window.fst", pre_cycles=1000, post_cycles=100, window=None):
+        self.dut = dut
+        # TESTCASE of the replay
+        self.test = test
+        self.ctl = dut.i_tb_wave_window
+        self.path = path
+        self.pre_cycles = pre_cycles
+        self.post_cycles = post_cycles
+        self.window = window
+        # tb_wave_window cycle at start(), the windows are relative to it
+        self.base = 0
+        self.trigger_cycle = None
+        self.reason = None
+
+    @classmethod
+    def from_env(cls, dut, test=None):
+        if os.environ.get("AIA_WAVES", "0") != "trigger":
+            return None
+        if not hasattr(dut, "i_tb_wave_window"):
+            dut._log.warning("AIA_WAVES=trigger but the wrapper has no i_tb_wave_window, rebuild with AIA_WAVES=trigger")
+            return None
+        window = None
+        if os.environ.get("AIA_WAVES_WINDOW"):
+            first, last = os.environ["AIA_WAVES_WINDOW"].split(":")
+            window = (int(first), int(last))
+        return cls(dut, test,
+                   path=os.environ.get("AIA_WAVES_FILE", "window.fst"),
+                   pre_cycles=int(os.environ.get("AIA_WAVES_PRE", "1000")),
+                   post_cycles=int(os.environ.get("AIA_WAVES_POST", "100")),
+                   window=window)
+
+    def start(self):
+        self.base = int(self.ctl.cycle.value)
+        self.ctl.post_cycles.value = self.post_cycles
+        if self.window is not None:
+            self.record(*self.window)
+        return self
+
+    def record(self, first, last):
+        """Dump cycles first to last, counted from start()."""
+        self.window = (first, last)
+        self.ctl.window_first.value = self.base + first
+        self.ctl.window_last.value = self.base + last
+        self.ctl.window_en.value = 1
+
+    def trigger(self, reason=""):
+        """Dump the next post_cycles cycles and write the replay, once per test."""
+        if self.trigger_cycle is not None:
+            return
+        self.trigger_cycle = int(self.ctl.cycle.value) - self.base
+        self.reason = reason
+        if self.window is not None:
+            # a replay, the armed window already covers it
+            self.dut._log.info(f"waves: mismatch at cycle {self.trigger_cycle} ({reason}), inside the window {self.window}")
+            return
+        self.ctl.trigger.value = 1
+        first = max(0, self.trigger_cycle - self.pre_cycles)
+        replay = {"AIA_WAVES_WINDOW": f"{first}:{self.trigger_cycle + self.post_cycles}"}
+        if self.test is not None:
+            replay["TESTCASE"] = self.test
+        if os.environ.get("AIA_SEED") is not None:
+            replay["AIA_SEED"] = os.environ["AIA_SEED"]
+        # the first mismatch of the run is the one replayed
+        if not os.path.exists(self.path + ".replay"):
+            with open(self.path + ".replay", "w") as f:
+                f.write(" ".join(f"{name}={value}" for name, value in replay.items()) + "\n")
+        self.dut._log.info(f"waves: triggered at cycle {self.trigger_cycle} ({reason}), dumping {self.post_cycles} "
+                           f"cycles to {self.path}; {self.path}.replay reruns it from cycle {first}")
+
+    def close(self):
+        """Disarm a window the test did not reach, a dump in progress stops on its own."""
+        self.ctl.window_en.value = 0
@@ -5,36 +5,32 @@
 
 from os import setpgid
 from readline import set_pre_input_hook
+import functools
 import cocotb
 from cocotb.triggers import RisingEdge, FallingEdge, Timer
 from random import seed
 from random import randint
-import math
+from aia_clock import reset_fixture
+from bus_fields import clog2, unpack_grid
+from perf_record import perf_recorded
+from checks import Checker
+from imsic_model import ImsicModel
+from imsic_monitor import XtopeiMonitor
+from regdesc import PRIV_LVL_M, PRIV_LVL_S, IMSIC_EIDELIVERY, IMSIC_EITHRESHOLD, imsic_eie, imsic_file_addr
 
 ONE_CYCLE       = 2
 
-M_MODE          = 3 
-S_MODE          = 1
-
-M_FILE_BASE_ADDR     = 0x24000000
-S_FILE_BASE_ADDR     = 0x28000000
-PAGE_SIZE            = 0x1000
+M_MODE          = PRIV_LVL_M
+S_MODE          = PRIV_LVL_S
 
 SETIPNUM_OFF    = 0x0
 
-EDELIVERY       = 0X70
-EITHRESHOLD     = 0X72
-EIE0            = 0xC0
+EDELIVERY       = IMSIC_EIDELIVERY
+EITHRESHOLD     = IMSIC_EITHRESHOLD
 
 ENABLE_INTP_FILE        = 1
 DISABLE_INTP_FILE       = 0
 
-RED = "\033[31m"
-GREEN = "\033[32m"
-YELLOW = "\033[33m"
-BLUE = "\033[34m"
-RESET = "\033[0m"
-
 class CInputs:
     ready_i                     = 0
     addr_i                      = 0
@@ -103,9 +99,12 @@ def imsic_write_reg(dut, imsic=1, addr=0, data=0, priv_lvl=M_MODE, vgein=0):
     dut.i_imsic_we.value = input.i_imsic_we
 
 def imsic_stop_write(dut):
+    """End a write or a claim, a held claim would keep claiming every cycle."""
     input.i_imsic_we = 0
+    input.i_imsic_claim = 0
 
     dut.i_imsic_we.value = input.i_imsic_we
+    dut.i_imsic_claim.value = input.i_imsic_claim
 
 def imsic_write_xtopei(dut, imsic = 1, priv_lvl=M_MODE, vgein=0):
     input.i_select_imsic = (1 << (imsic-1))
@@ -141,45 +140,54 @@ def imsic_read_reg(dut, imsic = 1, addr=0, priv_lvl=M_MODE, vgein=0):
     dut.i_imsic_claim.value = input.i_imsic_claim
     dut.i_imsic_we.value = input.i_imsic_we
 
-def organize_xtopei(array, nr_imsics = 0, nr_intp_files = 0, length=5):
-    index = 0
-    organized_data = []
-    final_result = []
-
-    if (nr_imsics == 0 or nr_intp_files == 0):
-        raise("NR_IMSIC or NR_INTP_FILES lower than 1")
-    
-    for i in range(nr_imsics):
-        for j in range(nr_intp_files):
-            subrange = array[index:index + length]
-            index = index + length + 1
-            organized_data.append(subrange)
-        organized_data.reverse()
-        final_result.append(organized_data)
-        organized_data = []
-
-    final_result.reverse()
-    return final_result
-
-def clog2(x):
-    if x <= 0:
-        raise ValueError("Input must be a positive integer")
-    return math.floor(math.log2(x))
-
-async def generic_test(dut):
-    TARGET_INTP = [63, 20, 1]
-    TARGET_HART = [1, 2, 4] # this value depends on how many IMSIC were instantiated in wrap.sv
-    NR_VS_INTP_FILES = 1 # this value depends on how many VS files were instantiated in wrap.sv
-    TARGET_GUEST = [0, 1, 0]
-    TARGET_LEVEL = [M_MODE, S_MODE, M_MODE]
-    
-    XLEN = 64
-    NR_IMSICS = 4
-    IMSIC_MAX_SRC = 64
-    NR_VS_FILES_IMSIC = NR_VS_INTP_FILES
-    NR_FILES_IMSIC = 2 + NR_VS_FILES_IMSIC
-    NR_TESTS_INTP = len(TARGET_INTP)
-    EIE_OFF = []
+def xtopei_name(hart, level, guest):
+    if (level == M_MODE):
+        return f"xtopei[{hart-1}][M]"
+    if (guest == 0):
+        return f"xtopei[{hart-1}][S]"
+    return f"xtopei[{hart-1}][VS][{guest-1}]"
+
+TARGET_INTP = [63, 20, 1]
+TARGET_HART = [1, 2, 4] # this value depends on how many IMSIC were instantiated in wrap.sv
+NR_VS_INTP_FILES = 1 # this value depends on how many VS files were instantiated in wrap.sv
+TARGET_GUEST = [0, 1, 0]
+TARGET_LEVEL = [M_MODE, S_MODE, M_MODE]
+
+XLEN = 64
+NR_IMSICS = 4
+IMSIC_MAX_SRC = 64
+NR_VS_FILES_IMSIC = NR_VS_INTP_FILES
+NR_FILES_IMSIC = 2 + NR_VS_FILES_IMSIC
+NR_TESTS_INTP = len(TARGET_INTP)
+
+def xtopei_file_name(hart, file):
+    return xtopei_name(hart, M_MODE if file == 0 else S_MODE, max(file-1, 0))
+
+def check_xtopei(dut, checks, model, suffix=""):
+    """Check the xtopei of every interrupt file against the reference model (monitor.expected)."""
+    xtopei_array = unpack_grid(dut.o_xtopei.value, clog2(IMSIC_MAX_SRC), NR_IMSICS, NR_FILES_IMSIC)
+    expected = model.xtopei_grid()
+
+    for hart in range(NR_IMSICS):
+        for file in range(NR_FILES_IMSIC):
+            checks.check(xtopei_file_name(hart+1, file) + suffix, int(expected[hart][file]), xtopei_array[hart][file])
+
+async def msi_write(dut, monitor, addr, data):
+    """Simulate a dummy device write to an interrupt file page.
+
+    expect_write() lands the MSI in monitor.expected right away, whether or
+    not the port ever shows it, so check_xtopei() catches an MSI the IMSIC
+    dropped.
+    """
+    monitor.expect_write(addr, data)
+    axi_write_reg(dut, addr, data)
+    await Timer(ONE_CYCLE, units="ns")
+    axi_disable_write(dut)
+    await Timer(ONE_CYCLE*4, units="ns")
+
+async def delivery_phase(dut, checks, monitor):
+    """Enable the target files, send the MSIs and check they reach xtopei."""
+    TARGET_EIE = []
     TARGET_IMSIC_ADDR = []
 
     for i in range(NR_TESTS_INTP):
@@ -188,17 +196,10 @@ async def generic_test(dut):
         if (TARGET_GUEST[i] > NR_VS_INTP_FILES):
             raise ValueError('Wrong value for TARGET_GUEST[{}]. Max is {}'.format(i, NR_VS_INTP_FILES))
     
-    # Calculate the target imsic address fro each target interrupt and populate the TARGET_IMSIC_ADDR array
+    # Calculate the eie register and the target imsic address of each target interrupt
     for i in range(NR_TESTS_INTP):
-        eie_off_subrange = (TARGET_INTP[i]//XLEN)*2 
-
-        if (TARGET_LEVEL[i] == M_MODE):
-            target_imsic_subrange = M_FILE_BASE_ADDR + (PAGE_SIZE * (TARGET_HART[i] - 1)) 
-        else:
-            target_imsic_subrange = S_FILE_BASE_ADDR + (PAGE_SIZE * (TARGET_HART[i] - 1) * (NR_VS_INTP_FILES+1)) + (PAGE_SIZE * TARGET_GUEST[i])
-
-        EIE_OFF.append(eie_off_subrange)
-        TARGET_IMSIC_ADDR.append(target_imsic_subrange)
+        TARGET_EIE.append(imsic_eie(TARGET_INTP[i], XLEN))
+        TARGET_IMSIC_ADDR.append(imsic_file_addr(TARGET_HART[i], TARGET_LEVEL[i], TARGET_GUEST[i], NR_VS_INTP_FILES))
 
     # Enable interrupt delivering in IMSICs
     for i in range(NR_TESTS_INTP):
@@ -207,85 +208,100 @@ async def generic_test(dut):
 
     # Enable target interrupts in IMSICs interrupt files 
     for i in range(NR_TESTS_INTP):
-        imsic_write_reg(dut, TARGET_HART[i], EIE0+EIE_OFF[i], 1<<(TARGET_INTP[i]%XLEN), TARGET_LEVEL[i], TARGET_GUEST[i])
+        eie_addr, eie_bit = TARGET_EIE[i]
+        imsic_write_reg(dut, TARGET_HART[i], eie_addr, eie_bit, TARGET_LEVEL[i], TARGET_GUEST[i])
         await Timer(ONE_CYCLE, units="ns")
 
     # Simulate a dummy device write to IMSICs
     for i in range(NR_TESTS_INTP):
-        axi_write_reg(dut, TARGET_IMSIC_ADDR[i], TARGET_INTP[i])
-        await Timer(ONE_CYCLE, units="ns")
-        axi_disable_write(dut)
-        await Timer(ONE_CYCLE*4, units="ns")
+        await msi_write(dut, monitor, TARGET_IMSIC_ADDR[i], TARGET_INTP[i])
 
-    xtopei_array = organize_xtopei(dut.o_xtopei.value, NR_IMSICS, NR_FILES_IMSIC, clog2(IMSIC_MAX_SRC-1))
+    check_xtopei(dut, checks, monitor.expected)
 
-    for i in range(NR_TESTS_INTP):
-        try:
-            if (TARGET_LEVEL[i] == M_MODE):
-                assert xtopei_array[TARGET_HART[i]-1][0] == TARGET_INTP[i], "Read xtopei does not match the expected value"
-                print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][M] = {TARGET_INTP[i]}{RESET}")
-            else:
-                assert xtopei_array[TARGET_HART[i]-1][TARGET_GUEST[i]+1] == TARGET_INTP[i]
-                if (TARGET_GUEST[i] == 0):
-                    print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][S] = {TARGET_INTP[i]}{RESET}")
-                else:
-                    print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][VS][{TARGET_GUEST[i]-1}] = {TARGET_INTP[i]}{RESET}")
-
-        except AssertionError as e:
-            print(f"{RED}AssertionError: {e}{RESET}")
-    
-    print(f"{YELLOW}Strat claiming interrupts...")
-    
-    # Clear the pending interrupt
+async def claim_phase(dut, checks, monitor):
+    """Claim every delivered interrupt and check its file is empty again."""
     for i in range(NR_TESTS_INTP):
         imsic_write_xtopei(dut, TARGET_HART[i], TARGET_LEVEL[i], TARGET_GUEST[i])
         await Timer(ONE_CYCLE*3, units="ns")
     
-    xtopei_array = organize_xtopei(dut.o_xtopei.value, NR_IMSICS, NR_FILES_IMSIC, clog2(IMSIC_MAX_SRC-1))
+    check_xtopei(dut, checks, monitor.expected, " claimed")
+
+# Several interrupts pending in one file, on both eip words of RV64
+THRESHOLD_HART = 1
+THRESHOLD_INTP = [3, 9, 17, 40, 63]
+# 5 passes no bit of the top word (40 is bit 8) and falls back to 3
+THRESHOLDS = [5, 9, 1, 0]
+
+async def threshold_phase(dut, checks, monitor):
+    """Pend several interrupts in one file and walk eithreshold and claims through them."""
+    imsic_write_reg(dut, THRESHOLD_HART, EDELIVERY, ENABLE_INTP_FILE, M_MODE)
+    await Timer(ONE_CYCLE, units="ns")
+    eie = {}
+    for intp in THRESHOLD_INTP:
+        eie_addr, eie_bit = imsic_eie(intp, XLEN)
+        eie[eie_addr] = eie.get(eie_addr, 0) | eie_bit
+    for eie_addr, eie_bits in eie.items():
+        imsic_write_reg(dut, THRESHOLD_HART, eie_addr, eie_bits, M_MODE)
+        await Timer(ONE_CYCLE, units="ns")
+    imsic_stop_write(dut)
 
-    for i in range(NR_TESTS_INTP):
-        try:
-            if (TARGET_LEVEL[i] == M_MODE):
-                assert xtopei_array[TARGET_HART[i]-1][0] == 0, "Read xtopei does not match the expected value"
-                print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][M] = 0{RESET}")
-            else:
-                assert xtopei_array[TARGET_HART[i]-1][TARGET_GUEST[i]+1] == 0
-                if (TARGET_GUEST[i] == 0):
-                    print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][S] = 0{RESET}")
-                else:
-                    print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][VS][{TARGET_GUEST[i]-1}] = 0{RESET}")
-
-        except AssertionError as e:
-            print(f"{RED}AssertionError: {e}{RESET}")
-
-async def generate_clock(dut):
-    """Generate clock pulses."""
-
-    for cycle in range(500):
-        dut.i_clk.value = 0
-        await Timer(1, units="ns")
-        dut.i_clk.value = 1
-        await Timer(1, units="ns")
+    for intp in THRESHOLD_INTP:
+        await msi_write(dut, monitor, imsic_file_addr(THRESHOLD_HART, M_MODE, 0, NR_VS_INTP_FILES), intp)
+    check_xtopei(dut, checks, monitor.expected, " pending")
+
+    # eithreshold compares against the bit index inside the top word
+    for threshold in THRESHOLDS:
+        imsic_write_reg(dut, THRESHOLD_HART, EITHRESHOLD, threshold, M_MODE)
+        await Timer(ONE_CYCLE, units="ns")
+        imsic_stop_write(dut)
+        await Timer(ONE_CYCLE, units="ns")
+        check_xtopei(dut, checks, monitor.expected, f" eithreshold {threshold}")
+
+    # one claim per cycle, highest word first
+    for n in range(len(THRESHOLD_INTP)):
+        imsic_write_xtopei(dut, THRESHOLD_HART, M_MODE)
+        await Timer(ONE_CYCLE, units="ns")
+        imsic_stop_write(dut)
+        await Timer(ONE_CYCLE, units="ns")
+        check_xtopei(dut, checks, monitor.expected, f" claim {n}")
+
+def imsic_phase(test):
+    """Fixture: clock and reset, then run the phase with its own Checker.
+
+    xtopei is checked every cycle against the interrupt file model
+    (common/imsic_monitor.py), the phase checks it at its own points too,
+    against the reference model the monitor keeps next to it.
+    """
+    @functools.wraps(test)
+    @reset_fixture
+    async def wrapper(dut):
+        checks = Checker(dut, test.__name__)
+        model = ImsicModel(NR_IMSICS, IMSIC_MAX_SRC, NR_VS_INTP_FILES, XLEN)
+        expected = ImsicModel(NR_IMSICS, IMSIC_MAX_SRC, NR_VS_INTP_FILES, XLEN)
+        monitor = XtopeiMonitor(dut, model, checks, xtopei="o_xtopei", expected=expected).start()
+        await test(dut, checks, monitor)
+        monitor.stop()
+        checks.finish()
+    return wrapper
 
 @cocotb.test()
-async def regctl_unit_test(dut):
-    """Try accessing the design."""
-
-    dut.ni_rst.value = 1
-    # run the clock "in the background"
-    await cocotb.start(generate_clock(dut))  
-    # wait a bit
-    await Timer(2, units="ns")  
-    # wait for falling edge/"negedge"
-    await FallingEdge(dut.i_clk)
-
-    # Reset the dut
-    dut.ni_rst.value = 0
-    await Timer(1, units="ns")
-    dut.ni_rst.value = 1
-    await Timer(1, units="ns")
-
-    await cocotb.start(generic_test(dut))
-    
-    await Timer(500, units="ns")
-    
\ No newline at end of file
+@perf_recorded
+@imsic_phase
+async def delivery_test(dut, checks, monitor):
+    """MSIs written to the interrupt files show up in xtopei."""
+    await delivery_phase(dut, checks, monitor)
+
+@cocotb.test()
+@perf_recorded
+@imsic_phase
+async def claim_test(dut, checks, monitor):
+    """Claiming xtopei clears the delivered interrupts."""
+    await delivery_phase(dut, checks, monitor)
+    await claim_phase(dut, checks, monitor)
+
+@cocotb.test()
+@perf_recorded
+@imsic_phase
+async def threshold_test(dut, checks, monitor):
+    """xtopei follows eithreshold and the notifier order with several interrupts pending."""
+    await threshold_phase(dut, checks, monitor)
@@ -18,7 +18,9 @@ module imsic_top_wrapper #(
     parameter int                           VS_INTP_FILE_LEN = $clog2(NR_VS_FILES_PER_IMSIC),
     parameter int                           NR_SRC_LEN       = $clog2(NR_SRC)
 ) (
+    `ifndef TB_CLOCK
     input  logic                            i_clk,
+    `endif
     input  logic                            ni_rst,
     /** Register config: AXI interface From/To system bus */
     input logic                             ready_i,
@@ -37,6 +39,15 @@ module imsic_top_wrapper #(
     output logic                            o_imsic_exception
 );
 
+`ifdef TB_CLOCK
+/** Clock generated inside the simulator (CLOCK=native) */
+logic                                       i_clk;
+
+tb_clock i_tb_clock (
+    .o_clk              ( i_clk             )
+);
+`endif
+
 ariane_axi::req_t                           req;
 ariane_axi::resp_t                          resp;
 
@@ -0,0 +1,140 @@
+"""
+Backends the bench scenarios run against.
+
+A scenario coroutine (aia_flow.py) only talks to a backend, so the same code
+drives either the RTL under cocotb or the functional model:
+
+    DutBackend(dut)      ieaia_wrapper: RegIntfMaster on the APLIC port, the
+                         shared IMSIC CSR port, i_sources, with the bench's
+                         waits between accesses
+    ModelBackend(model)  AiaModel, every access settles immediately and the
+                         waits are no-ops
+
+Accesses and waits are coroutines with the same signature on both backends,
+eintp_cpu() and xtopei_grid() sample the outputs; harts are 1-based like in
+user_define.py. The model backend never suspends, so
+run_sync() runs a scenario on it without cocotb. Both have a _log and stand
+in for the dut handle of a Checker.
+"""
+import logging
+
+from aia_define import *
+from aia_model import AiaModel
+from aia_regmap import APLIC_NR_SYS_DOMAINS, M_MODE, REGMAP
+from bus_fields import clog2, unpack_grid
+from imsic_csr_channel import imsic_write_reg, imsic_write_xtopei, imsic_stop_write
+
+try:
+    from cocotb.triggers import Timer, ClockCycles, FallingEdge
+    from aplic_axi import RegIntfMaster
+except ImportError:
+    # only DutBackend needs cocotb
+    Timer = ClockCycles = FallingEdge = RegIntfMaster = None
+
+ONE_CYCLE = 2
+NR_FILES_IMSIC = 2 + IMSIC_NR_VS_FILES
+
+def run_sync(coro):
+    """Run a coroutine that never suspends (a scenario on a ModelBackend)."""
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("the coroutine waited on a trigger, run it under cocotb")
+
+class DutBackend:
+    def __init__(self, dut, regmap=REGMAP):
+        self.dut = dut
+        self._log = dut._log
+        self.bus = RegIntfMaster(dut, regmap=regmap)
+        # Called as listener(value) for every new i_sources value
+        self.source_listeners = []
+
+    # APLIC bus
+    async def write(self, addr, data):
+        await self.bus.write(addr, data)
+
+    async def read(self, addr):
+        return await self.bus.read(addr)
+
+    async def write_burst(self, regs):
+        await self.bus.write_burst(regs)
+
+    async def read_burst(self, addrs):
+        return await self.bus.read_burst(addrs)
+
+    async def drive_sources(self, value):
+        self.dut.i_sources.value = value
+        for listener in self.source_listeners:
+            listener(value)
+
+    def eintp_cpu(self, domain, hart):
+        # o_eintp_cpu[NrDomains-1:0] covers every domain of the table, the root included
+        return self.dut.o_eintp_cpu.value[APLIC_NR_SYS_DOMAINS-domain-1][APLIC_NR_HARTS-hart-1]
+
+    # IMSIC CSR channel
+    async def imsic_write(self, hart, addr, data, priv_lvl=M_MODE, vgein=0):
+        imsic_write_reg(self.dut, hart, addr, data, priv_lvl, vgein)
+        await Timer(ONE_CYCLE, units="ns")
+
+    async def imsic_claim(self, hart, priv_lvl=M_MODE, vgein=0):
+        # driven between two edges and held for exactly one: one claim, one interrupt
+        await FallingEdge(self.dut.i_clk)
+        imsic_write_xtopei(self.dut, hart, priv_lvl, vgein)
+        await FallingEdge(self.dut.i_clk)
+        imsic_stop_write(self.dut)
+        # xtopei settles on the next edge
+        await ClockCycles(self.dut.i_clk, 1)
+
+    def xtopei_grid(self):
+        return unpack_grid(self.dut.xtopei.value, clog2(IMSIC_NR_SRC), IMSIC_NR_HARTS, NR_FILES_IMSIC)
+
+    # Time
+    async def wait_ns(self, ns):
+        await Timer(ns, units="ns")
+
+    async def wait_cycles(self, cycles):
+        await ClockCycles(self.dut.i_clk, cycles)
+
+class ModelBackend:
+    def __init__(self, model=None, log=None):
+        self.model = AiaModel() if model is None else model
+        self._log = log or logging.getLogger("aia_model")
+
+    # APLIC bus
+    async def write(self, addr, data):
+        self.model.write(addr, data)
+
+    async def read(self, addr):
+        return self.model.read(addr)
+
+    async def write_burst(self, regs):
+        for addr, data in (regs.items() if isinstance(regs, dict) else regs):
+            self.model.write(addr, data)
+
+    async def read_burst(self, addrs):
+        return [self.model.read(addr) for addr in addrs]
+
+    async def drive_sources(self, value):
+        self.model.drive_sources(value)
+
+    def eintp_cpu(self, domain, hart):
+        return self.model.eintp_cpu(domain, hart)
+
+    # IMSIC CSR channel
+    async def imsic_write(self, hart, addr, data, priv_lvl=M_MODE, vgein=0):
+        self.model.csr_write(hart - 1, addr, data, priv_lvl, vgein)
+
+    async def imsic_claim(self, hart, priv_lvl=M_MODE, vgein=0):
+        self.model.claim(hart - 1, priv_lvl, vgein)
+
+    def xtopei_grid(self):
+        return self.model.imsic.xtopei_grid()
+
+    # Time
+    async def wait_ns(self, ns):
+        pass
+
+    async def wait_cycles(self, cycles):
+        pass
@@ -0,0 +1,237 @@
+"""
+Register driver that programs the AIA with as few transactions as possible.
+
+AiaDriver sits between a bench flow and a backend (aia_backend.py) and keeps
+a shadow of everything it programmed: an AplicModel for the APLIC domains
+and an ImsicModel for the interrupt files, both reset with the DUT. Requests
+are queued and turned into transactions by flush():
+
+    - a write that leaves the shadow unchanged (domaincfg, sourcecfg,
+      target, IDC registers, eidelivery, eithreshold, eie) is dropped;
+      set/clear, *num and genmsi writes passed to write() always go out
+    - enables and pends are gathered per 32-bit word and written with
+      setie/clrie/setip/in_clrip when a word collects more than one source,
+      with the *num registers otherwise
+    - eie bits are merged with the bits already set in the same register
+      instead of overwriting them
+    - the APLIC writes go out as one write_burst
+
+Enables and pends are merged until the next register write they may depend
+on: an enable queued after configure_source() still reaches the bus after
+it, so a flow programs phase by phase (sources, targets, enables, pends) to
+get the most merging.
+
+    driver = AiaDriver(backend)
+    driver.configure_domain(0)
+    driver.configure_source(S_DOMAIN, 5, EDGE1)      # delegated from the root
+    driver.route_to_hart(S_DOMAIN, 5, hart=1, eiid=5)
+    driver.enable(S_DOMAIN, [5, 6, 7])               # one setie write
+    driver.imsic_enable(1, [5, 6, 7], S_MODE)
+    await driver.flush()
+
+Harts are 1-based, like user_define.py and the backends. Pends are events,
+not state: they are merged but never dropped.
+"""
+from aia_define import *
+from aia_regmap import DOMAIN_IN_MSI_MODE, DELEGATE_SRC, INACTIVE, M_MODE
+from aplic_model import AplicModel, delegation_path
+from imsic_model import ImsicModel
+from regdesc import IMSIC_EIDELIVERY, IMSIC_EITHRESHOLD, imsic_eie
+
+# word register -> its per-number register, and the order they are flushed in
+NUM_REGS = {"clrie": "clrienum", "in_clrip": "clripnum", "setie": "setienum", "setip": "setipnum"}
+# a request for one cancels a queued request for the other
+OPPOSITE = {"setie": "clrie", "clrie": "setie", "setip": "in_clrip", "in_clrip": "setip"}
+# registers that hold state: a write of the value they already hold is
+# dropped. Every other register (set/clear, *num, genmsi) acts on the write
+# itself and is always issued
+STATE_REGS = {"domaincfg", "sourcecfg", "target", "mmsiaddrcfg", "mmsiaddrcfgh", "smsiaddrcfg", "smsiaddrcfgh",
+              "idelivery", "iforce", "ithreshold"}
+
+def _lowest(bits):
+    return (bits & -bits).bit_length() - 1
+
+class AiaDriver:
+    def __init__(self, backend, delivery_mode=AIA_MODE):
+        self.backend = backend
+        self.delivery_mode = delivery_mode
+        self.aplic = AplicModel(delivery_mode=delivery_mode)
+        self.imsic = ImsicModel(IMSIC_NR_HARTS, IMSIC_NR_SRC, IMSIC_NR_VS_FILES, RISCV_XLEN)
+        self.regmap = self.aplic.regmap
+        self.nr_words = self.regmap.registers["setie"].count
+        # transactions issued and requests dropped, over the driver's life
+        self.writes = 0
+        self.csr_writes = 0
+        self.dropped = 0
+        self.reset()
+
+    def reset(self):
+        """Forget the shadow and the queue, call it together with the DUT reset."""
+        self.aplic.reset()
+        self.imsic.reset()
+        # (addr, data) in bus order
+        self._queue = []
+        # (word register, domain) -> source bitset
+        self._bits = {}
+        # (hart, addr, priv_lvl, guest) -> (value, or_bits)
+        self._csrs = {}
+        # last value of the registers the APLIC model does not read back
+        self._written = {}
+
+    # ---------------------------------------------------------------
+    # APLIC
+    # ---------------------------------------------------------------
+    def configure_domain(self, domain, ie=1):
+        """domaincfg: interrupt enable, delivery mode of the build."""
+        dm = int(self.delivery_mode == DOMAIN_IN_MSI_MODE)
+        self.write(self.regmap.addr("domaincfg", domain), self.regmap.encode("domaincfg", ie=ie, dm=dm))
+
+    def configure_source(self, domain, source, sm):
+        """Source mode of source in domain, delegating it there from the root first."""
+        domains = self.aplic.domains
+        path = delegation_path(domains, domain)
+        owner = self.aplic.owner[source]
+        if owner not in [parent for parent, _ in path] + [domain]:
+            # the parents take the source back, deepest first
+            for parent, _ in reversed(delegation_path(domains, owner)):
+                self.write(domains[parent].sourcecfg(source), INACTIVE)
+        for parent, ci in path:
+            self.write(domains[parent].sourcecfg(source), DELEGATE_SRC | ci)
+        self.write(domains[domain].sourcecfg(source), sm)
+
+    def route_to_hart(self, domain, source, hart, eiid=None, guest=0, prio=1):
+        """target of source: hart and guest/eiid (MSI) or priority (DIRECT)."""
+        if self.delivery_mode == DOMAIN_IN_MSI_MODE:
+            value = self.regmap.encode("target", hi=hart-1, gi=guest, eiid=source if eiid is None else eiid)
+        else:
+            value = self.regmap.encode("target", hi=hart-1, iprio=prio)
+        self.write(self.aplic.domains[domain].target(source), value)
+
+    def enable_idc(self, domain, hart, ithreshold=None):
+        """idelivery (and ithreshold) of a hart's IDC, DIRECT mode."""
+        self.write(self.regmap.addr("idelivery", domain, hart-1), 1)
+        if ithreshold is not None:
+            self.write(self.regmap.addr("ithreshold", domain, hart-1), ithreshold)
+
+    def enable(self, domain, sources):
+        self._request("setie", domain, sources)
+
+    def disable(self, domain, sources):
+        self._request("clrie", domain, sources)
+
+    def pend(self, domain, sources):
+        self._request("setip", domain, sources)
+
+    def unpend(self, domain, sources):
+        self._request("in_clrip", domain, sources)
+
+    def write(self, addr, data):
+        """Queue a register write, dropped if it is a state register the shadow already holds."""
+        self._emit_bits()
+        ref = self.aplic.decode(addr)
+        if ref is None or ref.reg.name not in STATE_REGS:
+            self._apply(addr, data)
+            self._queue.append((addr, data))
+            return
+        before = self.aplic.peek(addr)
+        self._apply(addr, data)
+        after = self.aplic.peek(addr)
+        if after is None:
+            redundant = self._written.get(addr) == data
+            self._written[addr] = data
+        else:
+            redundant = before == after
+        if redundant:
+            self.dropped += 1
+        else:
+            self._queue.append((addr, data))
+
+    def _apply(self, addr, data):
+        self.aplic.write(addr, data)
+        # the shadow only tracks registers, forwarded MSIs are the DUT's business
+        del self.aplic.forwarded[:]
+
+    def _request(self, reg, domain, sources):
+        bits = 0
+        for source in sources:
+            bits |= 1 << source
+        key = (reg, domain)
+        self._bits[key] = self._bits.get(key, 0) | bits
+        opposite = (OPPOSITE[reg], domain)
+        if opposite in self._bits:
+            self._bits[opposite] &= ~bits
+
+    def _useful(self, reg, domain, bits):
+        """The bits of a request the DUT would act on, as far as the shadow knows."""
+        aplic = self.aplic
+        bits &= aplic.owned[domain]
+        if reg == "setie":
+            return bits & aplic.active & ~aplic.enabled
+        if reg == "clrie":
+            return bits & aplic.enabled
+        if reg == "setip":
+            return bits & aplic.active
+        return bits
+
+    def _emit_bits(self):
+        """Turn the queued enables and pends into word or per-number writes."""
+        for reg, num_reg in NUM_REGS.items():
+            for (kind, domain), requested in self._bits.items():
+                if kind != reg:
+                    continue
+                bits = self._useful(reg, domain, requested)
+                self.dropped += bin(requested ^ bits).count("1")
+                for word in range(self.nr_words):
+                    word_bits = (bits >> (32 * word)) & 0xFFFFFFFF
+                    if word_bits == 0:
+                        continue
+                    if word_bits & (word_bits - 1):
+                        addr, data = self.regmap.addr(reg, domain, word), word_bits
+                    else:
+                        addr, data = self.regmap.addr(num_reg, domain), 32 * word + _lowest(word_bits)
+                    self._apply(addr, data)
+                    self._queue.append((addr, data))
+        self._bits = {}
+
+    # ---------------------------------------------------------------
+    # IMSIC interrupt files
+    # ---------------------------------------------------------------
+    def imsic_delivery(self, hart, priv_lvl=M_MODE, guest=0, enable=1):
+        self._csrs[(hart, IMSIC_EIDELIVERY, priv_lvl, guest)] = (enable, 0)
+
+    def imsic_threshold(self, hart, threshold, priv_lvl=M_MODE, guest=0):
+        self._csrs[(hart, IMSIC_EITHRESHOLD, priv_lvl, guest)] = (threshold, 0)
+
+    def imsic_enable(self, hart, sources, priv_lvl=M_MODE, guest=0):
+        """Set the eie bits of sources, keeping the bits already set."""
+        for source in sources:
+            addr, bit = imsic_eie(source, RISCV_XLEN)
+            _, bits = self._csrs.get((hart, addr, priv_lvl, guest), (None, 0))
+            self._csrs[(hart, addr, priv_lvl, guest)] = (None, bits | bit)
+
+    # ---------------------------------------------------------------
+    # Transactions
+    # ---------------------------------------------------------------
+    async def flush(self):
+        """Issue the queued requests: the interrupt file CSRs, then one APLIC burst."""
+        for (hart, addr, priv_lvl, guest), (value, bits) in self._csrs.items():
+            current = self.imsic.csr_read(hart-1, addr, priv_lvl, guest)
+            if value is None:
+                value = current | bits
+            if value == current:
+                self.dropped += 1
+                continue
+            self.imsic.csr_write(hart-1, addr, value, priv_lvl, guest)
+            await self.backend.imsic_write(hart, addr, value, priv_lvl, guest)
+            self.csr_writes += 1
+        self._csrs = {}
+
+        self._emit_bits()
+        if self._queue:
+            await self.backend.write_burst(self._queue)
+            self.writes += len(self._queue)
+            self._queue = []
+
+    @property
+    def transactions(self):
+        return self.writes + self.csr_writes
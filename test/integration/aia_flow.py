@@ -0,0 +1,434 @@
+"""
+The integration scenario flow, independent of what it runs on.
+
+aia_integration() configures the interrupts of a Scenario (user_define.py or
+scenario_gen.py) through a backend (aia_backend.py), with the register
+driver of aia_driver.py, and checks their delivery and claim. aia_tb.py runs it on the RTL; run as a script it runs
+on the functional model (aia_model.py), as a fast pre-filter for scenarios
+before simulating them. Its two halves, configure_interrupts() and
+fire_and_check(), are also run apart: the checkpoint campaign of aia_tb.py
+configures once and fires many subsets of the interrupts from the saved state.
+They chain the phases aia_tb.py runs one test each: imsic_idc_phase,
+domaincfg_phase, source_target_phase, then delivery_phase and claim_phase.
+
+Usage: PYTHONPATH=../common python3 aia_flow.py [--seed S] [--count N] [--max-intp M] [--scenarios FILE]
+       PYTHONPATH=../common python3 aia_flow.py --batched N [--seed S]
+
+Every scenario runs on a reset model with its own Checker; the failing ones
+are printed with their seed (rebuild them with ScenarioGenerator.replay) and
+the run reports how many interrupts per second went through the model.
+--batched configures every source and fires N random subsets of them
+through AiaModel.fire()/drain() instead, to measure the batched event path.
+"""
+import argparse
+import sys
+import time
+import warnings
+
+from aia_define import *
+from aia_regmap import *
+from aia_backend import ModelBackend, run_sync
+from aia_driver import AiaDriver
+from checks import Checker
+from priority_index import PriorityIndex
+from scenario_gen import ScenarioGenerator
+from session import SessionEntry, check_expected, load_session
+
+RED = "\033[31m"
+YELLOW = "\033[33m"
+BLUE = "\033[34m"
+RESET = "\033[0m"
+# Cycles between a claimi read and topi reflecting the next interrupt
+TOPI_UPDATE_CYCLES = 2
+
+def set_or_reg(reg, hexa, reg_width, reg_num):
+    reg     = reg | (hexa << reg_width*reg_num)
+    return reg
+
+def check_user_test(scenario):
+    TARGET_INTP, TARGET_HART, TARGET_LEVEL = scenario.intp, scenario.hart, scenario.level
+    TARGET_PRIO, TARGET_GUEST = scenario.prio, scenario.guest
+    NR_TESTS_INTP = len(scenario)
+    
+    for i in range(NR_TESTS_INTP):
+        if (TARGET_INTP[i] < 0 or TARGET_INTP[i] >= APLIC_NR_SRC):
+            raise ValueError(f'{RED}Wrong value for TARGET_INTP[{i}]: {TARGET_INTP[i]}. It must be in the range [0, UserNrSources-1]. The later is the number of sources implemented by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
+        if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+            if (TARGET_HART[i] < 0 or TARGET_HART[i] > IMSIC_NR_HARTS):
+                raise ValueError(f'{RED}Wrong value for TARGET_HART[{i}]: {TARGET_HART[i]}. It must be in the range [0, UserNrHartsImsic-1]. The later is the number of IMSICs implemented by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
+        elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+            if (TARGET_HART[i] < 0 or TARGET_HART[i] > APLIC_NR_HARTS):
+                raise ValueError(f'{RED}Wrong value for TARGET_HART[{i}]: {TARGET_HART[i]}. It must be in the range [0, UserNrSources-1]. The later is the number of IDCs implemented by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
+        if ((TARGET_LEVEL[i] != M_MODE) and (TARGET_LEVEL[i] != S_MODE)):
+            raise ValueError(f'{RED}Wrong value for TARGET_LEVEL[{i}]: {TARGET_LEVEL[i]}. It must be M_MODE or S_MODE.{RESET}')
+        if (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+            if (TARGET_PRIO[i] < 0 or TARGET_PRIO[i] > APLIC_MIN_PRIO):
+                raise ValueError(f'{RED}Wrong value for TARGET_PRIO[{i}]: {TARGET_PRIO[i]}. It must be in the range [0, UserMinPrio-1]. The later is the min. priority that an interrupt can have (in aia spec. means the max. number), and can be configured in aia_pkg.sv.{RESET}')
+            elif (TARGET_PRIO[i] == 0):
+                TARGET_PRIO[i] = 1
+                warnings.warn( f'{YELLOW}TARGET_PRIO[{i}] was configured as 0. Hardware will force it to 1. Changing TARGET_PRIO[{i}] expected value from 0 to 1...{RESET}', UserWarning )
+        else:
+            warnings.warn( f'{YELLOW}Ignoring TARGET_PRIO because AIA is functioning in MSI Mode{RESET}', UserWarning )
+        if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+            if (TARGET_GUEST[i] < 0 or TARGET_GUEST[i] > IMSIC_NR_VS_FILES):
+                raise ValueError(f'{RED}Wrong value for TARGET_GUEST[{i}]: {TARGET_GUEST[i]}. It must be in the range [0, UserNrVSIntpFiles-1]. The later is the number of VS files implemented per hart by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
+            if ((TARGET_GUEST[i] == 1) and (TARGET_LEVEL[i] != S_MODE)):
+                raise ValueError(f'{RED}Wrong value for TARGET_GUEST[{i}]. It only make sense to set the guest to 1 if the TARFET_LEVEL is S_MODE{RESET}')
+        else:
+            warnings.warn( f'{YELLOW}Ignoring TARGET_GUEST because AIA is functioning in DIRECT Mode{RESET}', UserWarning )
+
+def xtopei_name(hart, level, guest):
+    return xtopei_file_name(hart, 0 if level == M_MODE else guest+1)
+
+def xtopei_file_name(hart, file):
+    if (file == 0):
+        return f"xtopei[{hart-1}][M]"
+    if (file == 1):
+        return f"xtopei[{hart-1}][S]"
+    return f"xtopei[{hart-1}][VS][{file-2}]"
+
+def check_xtopei(checks, expected, actual, suffix=""):
+    """Check the xtopei of every interrupt file against the reference model."""
+    grid = expected.xtopei_grid()
+    for hart in range(IMSIC_NR_HARTS):
+        for file in range(expected.nr_files):
+            checks.check(xtopei_file_name(hart+1, file) + suffix, int(grid[hart][file]), actual[hart][file])
+
+def target_domains(scenario):
+    return [0 if (level == M_MODE) else S_DOMAIN for level in scenario.level]
+
+async def aia_integration(backend, scenario, checks):
+    """Configure the scenario's interrupts, trigger them and check their delivery and claim."""
+    # Every register is programmed through the driver, which merges and drops
+    # redundant accesses; its interrupt file shadow is also the expected xtopei
+    driver = AiaDriver(backend)
+    await configure_interrupts(driver, scenario, checks)
+    await fire_and_check(driver, scenario, checks)
+
+# The phases of aia_integration, in order; each one expects the ones before
+# it to have run on the same driver (aia_tb.py runs one test per phase)
+async def configure_interrupts(driver, scenario, checks):
+    """Program the domains, sources, targets and enables of the scenario's interrupts.
+
+    Nothing is pending when it returns, so it is also the setup a checkpoint
+    (checkpoint.py) is taken after.
+    """
+    # Check if the variables set by user are inside the ranges defined in aia_pkg
+    check_user_test(scenario)
+    await imsic_idc_phase(driver, scenario, checks)
+    await domaincfg_phase(driver, scenario, checks)
+    await source_target_phase(driver, scenario, checks)
+
+async def fire_and_check(driver, scenario, checks):
+    """Trigger the scenario's interrupts, configured before, and check their delivery and claim."""
+    await delivery_phase(driver, scenario, checks)
+    await claim_phase(driver, scenario, checks)
+
+async def imsic_idc_phase(driver, scenario, checks):
+    """Enable the interrupt files (MSI mode) or the IDCs (DIRECT mode) the scenario targets."""
+    backend = driver.backend
+    TARGET_INTP, TARGET_HART, TARGET_LEVEL = scenario.intp, scenario.hart, scenario.level
+    TARGET_GUEST = scenario.guest
+    NR_TESTS_INTP = len(scenario)
+    TARGET_DOMAIN = target_domains(scenario)
+
+    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+        backend._log.debug("Starting IMSICs configurations...")
+        # Enable interrupt delivering and the target interrupts in IMSICs
+        for i in range(NR_TESTS_INTP):
+            driver.imsic_delivery(TARGET_HART[i], TARGET_LEVEL[i], TARGET_GUEST[i])
+            driver.imsic_enable(TARGET_HART[i], [TARGET_INTP[i]], TARGET_LEVEL[i], TARGET_GUEST[i])
+        await driver.flush()
+        # nothing is pending yet, every file stays quiet
+        check_xtopei(checks, driver.imsic, backend.xtopei_grid(), " enabled")
+    elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+        backend._log.debug("Starting IDCs configurations...")
+        # Enable IDCs
+        for i in range(NR_TESTS_INTP):
+            driver.enable_idc(TARGET_DOMAIN[i], TARGET_HART[i])
+        await driver.flush()
+        idcs = sorted(set(zip(TARGET_DOMAIN, TARGET_HART)))
+        idelivery_actual = await backend.read_burst([REGMAP.addr("idelivery", d, hart-1) for d, hart in idcs])
+        for (d, hart), actual in zip(idcs, idelivery_actual):
+            checks.check(f"idelivery[{d}][{hart-1}]", 1, actual)
+
+async def domaincfg_phase(driver, scenario, checks):
+    """Enable the M and S domains and check domaincfg."""
+    backend = driver.backend
+    backend._log.debug("Starting APLIC domains configurations...")
+
+    backend._log.debug("domaincfg sanity...")
+    domaincfg_expected_val = (0x80 << 24) | (1 << 8)
+    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+        domaincfg_expected_val |= (1 << 2)
+    
+    # Enable M and S domains
+    driver.configure_domain(0)
+    driver.configure_domain(S_DOMAIN)
+    await driver.flush()
+    domaincfg_actual = await backend.read_burst([DOMAINCFG_M_BASE, DOMAINCFG_S_BASE])
+
+    checks.check("domaincfg[M]", domaincfg_expected_val, domaincfg_actual[0])
+    checks.check("domaincfg[S]", domaincfg_expected_val, domaincfg_actual[1])
+
+async def source_target_phase(driver, scenario, checks):
+    """Configure, route and enable the scenario's sources, check sourcecfg."""
+    backend = driver.backend
+    TARGET_INTP, TARGET_HART, TARGET_LEVEL = scenario.intp, scenario.hart, scenario.level
+    TARGET_PRIO, TARGET_GUEST = scenario.prio, scenario.guest
+    NR_TESTS_INTP = len(scenario)
+    TARGET_DOMAIN = target_domains(scenario)
+
+    backend._log.debug("sourcecfg sanity...")
+    # configure the sourcecfg registers in APLIC for the target interrupts, S
+    # level ones are delegated from the M domain
+    for i in range(NR_TESTS_INTP):
+        driver.configure_source(TARGET_DOMAIN[i], TARGET_INTP[i], EDGE1)
+    await driver.flush()
+
+    # Read the sourcecfg to validate the logic of rebuilding sourcecfg register
+    sourcecfg_expected = []
+    for i in range(NR_TESTS_INTP):
+        m_expected, s_expected = (EDGE1, 0) if (TARGET_LEVEL[i] == M_MODE) else ((DELEGATE_SRC | 0x0), EDGE1)
+        sourcecfg_expected.append((REGMAP.addr("sourcecfg", 0, TARGET_INTP[i]), m_expected))
+        sourcecfg_expected.append((REGMAP.addr("sourcecfg", S_DOMAIN, TARGET_INTP[i]), s_expected))
+    sourcecfg_actual = await backend.read_burst([addr for addr, _ in sourcecfg_expected])
+    checks.check_all((REGMAP.name(addr), expected, actual)
+                     for (addr, expected), actual in zip(sourcecfg_expected, sourcecfg_actual))
+
+    # configure the target registers in APLIC for the target interrupts
+    for i in range(NR_TESTS_INTP):
+        driver.route_to_hart(TARGET_DOMAIN[i], TARGET_INTP[i], TARGET_HART[i], guest=TARGET_GUEST[i], prio=TARGET_PRIO[i])
+    # are missing target asserts
+
+    # enable target interrupts in their respective domain
+    for i in range(NR_TESTS_INTP):
+        driver.enable(TARGET_DOMAIN[i], [TARGET_INTP[i]])
+    await driver.flush()
+
+def expected_topi(scenario):
+    """Expected topi per (hart, level), every interrupt of the scenario enabled and triggered."""
+    topi_index = PriorityIndex()
+    for intp, hart, level, prio in zip(scenario.intp, scenario.hart, scenario.level, scenario.prio):
+        topi_index.add((hart, level), intp, prio, pending=1, enabled=1)
+    return topi_index
+
+async def delivery_phase(driver, scenario, checks):
+    """Trigger the scenario's interrupts and check they reach xtopei, or topi and the CPU lines."""
+    backend = driver.backend
+    TARGET_INTP, TARGET_HART, TARGET_LEVEL = scenario.intp, scenario.hart, scenario.level
+    TARGET_GUEST = scenario.guest
+    NR_TESTS_INTP = len(scenario)
+    TARGET_DOMAIN = target_domains(scenario)
+    xtopei_index = driver.imsic
+
+    # We now start triggering the interrupts
+    driver.pend(TARGET_DOMAIN[0], [TARGET_INTP[0]])
+    await driver.flush()
+    
+    for i in range(1, NR_TESTS_INTP):
+        source                = 0
+        source                = set_or_reg(source, 1, 1, TARGET_INTP[i])
+        await backend.drive_sources(source)
+        await backend.wait_ns(4)
+        # reset source lines
+        source                = 0
+        await backend.drive_sources(source)
+        await backend.wait_ns(10)
+
+    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+        backend._log.debug("xtopei sanity...")
+        for i in range(NR_TESTS_INTP):
+            xtopei_index.setipnum(TARGET_HART[i]-1, xtopei_index.file_index(TARGET_LEVEL[i], TARGET_GUEST[i]), TARGET_INTP[i])
+        check_xtopei(checks, xtopei_index, backend.xtopei_grid())
+
+    elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+        backend._log.debug("topi and CPU line sanity...")
+        # topi does not claim, every hart and level shows its top interrupt
+        topi_index = expected_topi(scenario)
+        for i in range(APLIC_NR_HARTS):
+            for j in (0, S_DOMAIN):
+                TOPI_BASE, MODE = (TOPI_M_BASE, M_MODE) if (j == 0) else (TOPI_S_BASE, S_MODE)
+                cpu_line = backend.eintp_cpu(j, i)
+                cur_axi_read_val = await backend.read(TOPI_BASE + (0x20 * i))
+                expected_topi_val = topi_index.topi((i+1, MODE))
+
+                checks.check(f"cpu_line[{j}][{i}]", int(expected_topi_val != 0), cpu_line)
+                checks.check(f"topi[{j}][{i}]", expected_topi_val, cur_axi_read_val)
+
+async def claim_phase(driver, scenario, checks):
+    """Claim the delivered interrupts and check every file or hart is left empty."""
+    backend = driver.backend
+    TARGET_HART, TARGET_LEVEL, TARGET_GUEST = scenario.hart, scenario.level, scenario.guest
+    NR_TESTS_INTP = len(scenario)
+    xtopei_index = driver.imsic
+    number_of_necessary_claims = 0
+    topi_index = expected_topi(scenario)
+
+    # Iterate over the hart and level to find matching pairs
+    if (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+        for i in range(len(TARGET_HART)):
+            for j in range(i + 1, len(TARGET_HART)):
+                if TARGET_HART[i] == TARGET_HART[j] and TARGET_LEVEL[i] == TARGET_LEVEL[j]:
+                    number_of_necessary_claims += 1
+
+    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+        backend._log.debug("Start interrupts claiming...")
+        backend._log.debug("xtopei sanity...")
+        # Clear the pending interrupt
+        for i in range(NR_TESTS_INTP):
+            await backend.imsic_claim(TARGET_HART[i], TARGET_LEVEL[i], TARGET_GUEST[i])
+            xtopei_index.claim(TARGET_HART[i]-1, TARGET_LEVEL[i], TARGET_GUEST[i])
+
+        check_xtopei(checks, xtopei_index, backend.xtopei_grid(), " claimed")
+
+    # are missing assertations for cpu line
+    elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+        backend._log.debug("topi and CPU line sanity...")
+
+        # this part is trying to evaluate the cpu line and the topi value
+        # Since an interrupt can be configured for the same hart and same domain level
+        # we repeat this test "number_of_necessary_claims" times (for all harts and domains, for sanity porpuses)
+        # What "number_of_necessary_claims" means? 
+        # At the function start we search for how many matching pairs (TARGET_HART and TARGET_LEVEL) across the various
+        # interrupt indexes. This is, if determine how many interrupts have the same target hart and same level.
+        # Why not just clami that interrupt specifically and evaluate only that hart and level?
+        # We could, but we dont... Sanity check porpuse.
+        w = 0
+        while w <= number_of_necessary_claims:
+            
+            backend._log.debug(f"starting round {w} of {number_of_necessary_claims}...")
+
+            for i in range(APLIC_NR_HARTS):
+                for j in (0, S_DOMAIN):
+                    if (j == 0):
+                        TOPI_BASE = CLAIMI_M_BASE
+                        MODE = M_MODE
+                    else:
+                        TOPI_BASE = CLAIMI_S_BASE
+                        MODE = S_MODE
+
+                    cpu_line = backend.eintp_cpu(j, i)
+                    cur_axi_read_val = await backend.read(TOPI_BASE + (0x20 * i))
+                    expected_topi_val = topi_index.topi((i+1, MODE))
+                    if (expected_topi_val != 0):
+                        expected_cpu_line_val = 1
+                    else:
+                        expected_cpu_line_val = 0
+                    topi_index.claim((i+1, MODE))
+                    # let topi/claimi settle on the next pending interrupt
+                    await backend.wait_cycles(TOPI_UPDATE_CYCLES)
+
+                    checks.check(f"round {w} cpu_line[{j}][{i}]", expected_cpu_line_val, cpu_line)
+                    checks.check(f"round {w} topi[{j}][{i}]", expected_topi_val, cur_axi_read_val)
+                    
+            w += 1
+
+        backend._log.debug("topi and CPU line sanity after claiming every interrupt...")
+        # for each hart in each domain, check if all interrupts were claimed
+        for i in range(APLIC_NR_HARTS):
+            for j in (0, S_DOMAIN):
+                if (j == 0):
+                    TOPI_BASE = TOPI_M_BASE
+                    MODE = M_MODE
+                else:
+                    TOPI_BASE = TOPI_S_BASE
+                    MODE = S_MODE
+
+                cur_axi_read_val = await backend.read(TOPI_BASE + (0x20 * i))
+                expected_topi_val = topi_index.topi((i+1, MODE))
+
+                checks.check(f"topi[{j}][{i}] after claims", expected_topi_val, cur_axi_read_val)
+
+def run_on_model(scenario, backend=None):
+    """Run a scenario on a reset AiaModel, return its Checker."""
+    backend = ModelBackend() if backend is None else backend
+    backend.model.reset()
+    checks = Checker(backend, f"scenario {scenario.seed}")
+    with warnings.catch_warnings():
+        # check_user_test warns about the fields the mode ignores
+        warnings.simplefilter("ignore")
+        run_sync(aia_integration(backend, scenario, checks))
+    return checks
+
+def run_batched(scenario, batches, rng, backend=None):
+    """Configure every interrupt of scenario, then fire random subsets of them in batches.
+
+    Each batch pulses its sources and claims everything back through
+    AiaModel.fire()/drain(); return the number of interrupts that went
+    through and the Checker of the run.
+    """
+    backend = ModelBackend() if backend is None else backend
+    model = backend.model
+    model.reset()
+    checks = Checker(backend, f"batched {scenario.seed}")
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        run_sync(configure_interrupts(AiaDriver(backend), scenario, checks))
+    sources = 0
+    for intp in scenario.intp:
+        sources |= 1 << intp
+    fired = claimed = 0
+    for _ in range(batches):
+        fired += model.fire(rng.getrandbits(len(scenario.intp) + 1) & sources)
+        claimed += model.drain()
+    checks.check("batched claims", fired, claimed)
+    return fired, checks
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=lambda x: int(x, 0), default=None, help="run seed (default: AIA_SEED or random)")
+    parser.add_argument("--count", type=int, default=1000, help="number of scenarios")
+    parser.add_argument("--max-intp", type=int, default=8, help="max interrupts per scenario")
+    parser.add_argument("--scenarios", help="run the scenarios of a scenario_gen.py or session file instead")
+    parser.add_argument("--batched", type=int, metavar="N",
+                        help="measure the batched event path instead: every source configured, N batches")
+    args = parser.parse_args()
+
+    if args.batched is not None:
+        gen = ScenarioGenerator(seed=args.seed)
+        scenario = gen.every_source()
+        start = time.perf_counter()
+        fired, checks = run_batched(scenario, args.batched, gen.rng)
+        elapsed = time.perf_counter() - start
+        for check_id, expected, actual, _, _ in checks.failures:
+            print(f"fail {check_id}: expected {expected}, got {actual}")
+        print(f"{fired} interrupts in {args.batched} batches on {len(scenario)} sources (seed {gen.seed}), "
+              f"{fired / max(elapsed, 1e-9):.0f} interrupts/s")
+        sys.exit(1 if checks.nr_failures else 0)
+
+    if args.scenarios:
+        # the session scenarios of the other delivery mode are skipped, like on the bench
+        entries = [entry for entry in load_session(args.scenarios) if entry.runs_on(AIA_MODE)]
+        seed = None
+    else:
+        gen = ScenarioGenerator(seed=args.seed, max_intp=args.max_intp)
+        entries = [SessionEntry(scenario, f"scenario {scenario.seed}") for scenario in gen.scenarios(args.count)]
+        seed = gen.seed
+    scenarios = [entry.scenario for entry in entries]
+
+    # one model for the run, reset between scenarios like ni_rst between bench scenarios
+    backend = ModelBackend()
+    failed = []
+    nr_intp = 0
+    start = time.perf_counter()
+    for entry in entries:
+        scenario = entry.scenario
+        checks = run_on_model(scenario, backend)
+        check_expected(checks, entry.expected)
+        nr_intp += len(scenario)
+        if checks.nr_failures:
+            failed.append((entry, checks))
+    elapsed = time.perf_counter() - start
+
+    for entry, checks in failed:
+        print(f"fail {entry.name}: {entry.scenario}")
+        for check_id, expected, actual, _, _ in checks.failures:
+            print(f"     {check_id}: expected {expected}, got {actual}")
+    print(f"{len(scenarios) - len(failed)}/{len(scenarios)} scenarios passed on the model"
+          + (f" (seed {seed})" if seed is not None else "")
+          + f", {nr_intp / max(elapsed, 1e-9):.0f} interrupts/s")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
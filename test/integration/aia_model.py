@@ -0,0 +1,123 @@
+"""
+Functional model of the whole AIA (ieaia_wrapper) that runs without a simulator.
+
+AiaModel puts the APLIC reference model (aplic_model.py: register file,
+gateway, notifier) in front of the IMSIC model (common/imsic_model.py) and
+forwards the MSIs of the APLIC into the interrupt files, so it answers the
+same bus, wire and CSR accesses the bench drives into the RTL:
+
+    model = AiaModel()
+    model.write(REGMAP.addr("domaincfg", 0), REGMAP.encode("domaincfg", ie=1, dm=1))
+    ...
+    model.drive_sources(1 << 5)
+    model.imsic.xtopei(hart=0, file=0)
+
+All state is packed integers and word arrays, no per-interrupt objects.
+aia_backend.py runs the bench scenarios against it (python3 aia_flow.py).
+
+Throughput depends on the path (256 sources, 5 harts): the bench
+scenarios (aia_flow.py, shared with aia_tb.py) run about 4-7k interrupts/s
+in either mode, bound by the register accesses each scenario programs;
+the per-event path (drive_sources, claim) about 50k/s. fire() and drain()
+pulse a whole bitset of sources and claim everything at once: in MSI mode
+on arrays (about 1.6M/s, 200k/s without numpy), in DIRECT mode with one
+walk over the priority bitsets per IDC (AplicModel.claim_all, about
+1.1-1.3M/s). Measure them with python3 aia_flow.py --batched N. Millions
+per second are only reached on the batched path, not by the scenario
+pre-filter.
+"""
+from aia_define import AIA_MODE, IMSIC_NR_HARTS, IMSIC_NR_SRC, IMSIC_NR_VS_FILES, RISCV_XLEN
+from aia_regmap import DOMAIN_IN_MSI_MODE, M_MODE
+from aplic_model import AplicModel
+from bus_fields import clog2
+from imsic_model import ImsicModel
+
+class AiaModel:
+    def __init__(self, delivery_mode=AIA_MODE, aplic=None, imsic=None):
+        self.delivery_mode = delivery_mode
+        self.aplic = AplicModel(delivery_mode=delivery_mode) if aplic is None else aplic
+        self.imsic = ImsicModel(IMSIC_NR_HARTS, IMSIC_NR_SRC, IMSIC_NR_VS_FILES, RISCV_XLEN) if imsic is None else imsic
+        # select_file is NrInptFilesW bits wide on the APLIC channel
+        self.file_mask = (1 << clog2(self.imsic.nr_files)) - 1
+        self.msis = 0
+
+    def reset(self):
+        self.aplic.reset()
+        self.imsic.reset()
+        self.msis = 0
+
+    def _deliver(self):
+        """Move the MSIs the APLIC forwarded into the interrupt files."""
+        forwarded = self.aplic.forwarded
+        if not forwarded:
+            return
+        for _, hart, file, eiid in forwarded:
+            self.imsic.setipnum(hart, file & self.file_mask, eiid)
+        self.msis += len(forwarded)
+        del forwarded[:]
+
+    # ---------------------------------------------------------------
+    # APLIC bus and wires
+    # ---------------------------------------------------------------
+    def write(self, addr, data):
+        """Bus write: APLIC registers, or an MSI to an interrupt file page."""
+        if self.aplic.decode(addr) is not None:
+            self.aplic.write(addr, data)
+            self._deliver()
+        else:
+            self.imsic.msi_write(addr, data)
+
+    def read(self, addr):
+        """APLIC read data (claimi side effect included), None if not modelled."""
+        return self.aplic.read(addr)
+
+    def drive_sources(self, value):
+        self.aplic.drive_sources(value)
+        self._deliver()
+
+    def fire(self, sources):
+        """Pulse the sources bitset and deliver its interrupts in one batch, return how many.
+
+        drive_sources(sources) then drive_sources(0). In MSI mode the
+        forwarding and the interrupt file writes are done on arrays
+        (AplicModel.take_msis, ImsicModel.setipnum_many) instead of MSI by
+        MSI; in DIRECT mode the count is the sources that became pending.
+        """
+        if not self.is_msi():
+            pending = self.aplic.pending
+            self.aplic.pulse_sources(sources)
+            return bin(self.aplic.pending & ~pending).count("1")
+        self.aplic.pulse_sources(sources)
+        _, hart, file, eiid = self.aplic.take_msis()
+        if isinstance(file, list):
+            file = [f & self.file_mask for f in file]
+        else:
+            file = file & self.file_mask
+        self.imsic.setipnum_many(hart, file, eiid)
+        self.msis += len(hart)
+        return len(hart)
+
+    def drain(self):
+        """Claim every interrupt of every interrupt file (MSI) or IDC (DIRECT), return how many."""
+        if not self.is_msi():
+            aplic = self.aplic
+            return sum(len(aplic.claim_all(d, h)) for d in range(len(aplic.domains)) for h in range(aplic.nr_harts))
+        return len(self.imsic.drain_all()[0])
+
+    def eintp_cpu(self, domain, hart):
+        return self.aplic.eintp_cpu(domain, hart)
+
+    # ---------------------------------------------------------------
+    # IMSIC CSR channel, harts 0-based
+    # ---------------------------------------------------------------
+    def csr_write(self, hart, addr, data, priv_lvl=M_MODE, vgein=0):
+        self.imsic.csr_write(hart, addr, data, priv_lvl, vgein)
+
+    def csr_read(self, hart, addr, priv_lvl=M_MODE, vgein=0):
+        return self.imsic.csr_read(hart, addr, priv_lvl, vgein)
+
+    def claim(self, hart, priv_lvl=M_MODE, vgein=0):
+        return self.imsic.claim(hart, priv_lvl, vgein)
+
+    def is_msi(self):
+        return self.delivery_mode == DOMAIN_IN_MSI_MODE
@@ -1,14 +1,34 @@
-APLIC_M_BASE            = 0xc000000
-APLIC_S_BASE            = 0xd000000
+from aia_define import APLIC_DOMAINS_CFG, APLIC_NR_SRC, APLIC_NR_HARTS
+from regdesc import PARAMS, PRIV_LVL_M, PRIV_LVL_S, IMSIC_EIDELIVERY, IMSIC_EITHRESHOLD, IMSIC_EIE0, RegMap
 
-DOMAINCFG_M_BASE        = APLIC_M_BASE + 0x0000
-DOMAINCFG_S_BASE        = APLIC_S_BASE + 0x0000
+# Register base of every domain, indexed by domain index (root first)
+APLIC_DOMAIN_BASES      = [cfg["Addr"] for cfg in APLIC_DOMAINS_CFG]
+APLIC_M_BASE            = APLIC_DOMAIN_BASES[0]
+# The root's first child, the S domain of the two-domain configuration
+APLIC_S_BASE            = APLIC_DOMAIN_BASES[APLIC_DOMAINS_CFG[0]["ChildsIdx"][0]] if APLIC_DOMAINS_CFG[0]["NrChilds"] else 0xd000000
+
+# Domains of the APLIC, the root included: o_eintp_cpu is [NrDomains-1:0]
+# with NrDomains = SysNrDomains = UserNrDomains+1 (APLIC_NR_DOMAINS)
+APLIC_NR_SYS_DOMAINS    = len(APLIC_DOMAINS_CFG)
+
+# Register descriptor table of every domain (regdesc.py), for O(1) decode
+# and pretty-printing; the macros below are taken from it
+REGMAP                  = RegMap(APLIC_DOMAIN_BASES, APLIC_NR_SRC, APLIC_NR_HARTS)
+S_DOMAIN                = APLIC_DOMAIN_BASES.index(APLIC_S_BASE) if APLIC_S_BASE in APLIC_DOMAIN_BASES else None
+
+def _reg(name, index=None):
+    """(M, S) address of a register, S computed from APLIC_S_BASE if no domain maps it."""
+    m_addr = REGMAP.addr(name, 0, index)
+    if S_DOMAIN is None:
+        return m_addr, m_addr - APLIC_M_BASE + APLIC_S_BASE
+    return m_addr, REGMAP.addr(name, S_DOMAIN, index)
+
+DOMAINCFG_M_BASE, DOMAINCFG_S_BASE          = _reg("domaincfg")
 
 # Sourcecfg base macro
-SOURCECFG_M_BASE        = APLIC_M_BASE + 0x0004
-SOURCECFG_S_BASE        = APLIC_S_BASE + 0x0004
+SOURCECFG_M_BASE, SOURCECFG_S_BASE          = _reg("sourcecfg", 1)
 SOURCECFG_OFF           = 0x0004
-DELEGATE_SRC            = 0x400
+DELEGATE_SRC            = 1 << PARAMS["SOURCECFG_D_OFF"]
 INACTIVE                = 0
 DETACHED                = 1
 EDGE1                   = 4
@@ -17,52 +37,43 @@ LEVEL1                  = 6
 LEVEL0                  = 7
 
 # Target base macros
-TARGET_M_BASE           = APLIC_M_BASE + 0x3004
-TARGET_S_BASE           = APLIC_S_BASE + 0x3004
+TARGET_M_BASE, TARGET_S_BASE                = _reg("target", 1)
 TARGET_OFF              = 0x0004
 
 # Pending operations macros
-SETIPNUM_M_BASE         = APLIC_M_BASE + 0x1CDC
-SETIPNUM_S_BASE         = APLIC_S_BASE + 0x1CDC
-CLRIPNUM_M_BASE         = APLIC_M_BASE + 0x1DDC
-CLRIPNUM_S_BASE         = APLIC_S_BASE + 0x1DDC
-SETIP_M_BASE            = APLIC_M_BASE + 0x1C00
-SETIP_S_BASE            = APLIC_S_BASE + 0x1C00
-INCLRIP_M_BASE          = APLIC_M_BASE + 0x1D00
-INCLRIP_S_BASE          = APLIC_S_BASE + 0x1D00
+SETIPNUM_M_BASE, SETIPNUM_S_BASE            = _reg("setipnum")
+CLRIPNUM_M_BASE, CLRIPNUM_S_BASE            = _reg("clripnum")
+SETIP_M_BASE, SETIP_S_BASE                  = _reg("setip", 0)
+INCLRIP_M_BASE, INCLRIP_S_BASE              = _reg("in_clrip", 0)
 
 # Enable operations macros
-SETIENUM_M_BASE         = APLIC_M_BASE + 0x1EDC
-SETIENUM_S_BASE         = APLIC_S_BASE + 0x1EDC
-CLRIENUM_M_BASE         = APLIC_M_BASE + 0x1FDC
-CLRIENUM_S_BASE         = APLIC_S_BASE + 0x1FDC
+SETIENUM_M_BASE, SETIENUM_S_BASE            = _reg("setienum")
+CLRIENUM_M_BASE, CLRIENUM_S_BASE            = _reg("clrienum")
 
 # Genmsi macros
-GENMSI_M_BASE           = APLIC_M_BASE + 0x3000
-GENMSI_S_BASE           = APLIC_S_BASE + 0x3000
+GENMSI_M_BASE, GENMSI_S_BASE                = _reg("genmsi")
 
 # IDC macros
-IDELIVERY_M_BASE        = APLIC_M_BASE + 0x4000 + 0x00
-IDELIVERY_S_BASE        = APLIC_S_BASE + 0x4000 + 0x00
-IFORCE_M_BASE           = APLIC_M_BASE + 0x4000 + 0x04
-IFORCE_S_BASE           = APLIC_S_BASE + 0x4000 + 0x04
-ITHRESHOLD_M_BASE       = APLIC_M_BASE + 0x4000 + 0x08
-ITHRESHOLD_S_BASE       = APLIC_S_BASE + 0x4000 + 0x08
-TOPI_M_BASE             = APLIC_M_BASE + 0x4000 + 0x18
-TOPI_S_BASE             = APLIC_S_BASE + 0x4000 + 0x18
-CLAIMI_M_BASE           = APLIC_M_BASE + 0x4000 + 0x1C
-CLAIMI_S_BASE           = APLIC_S_BASE + 0x4000 + 0x1C
+IDELIVERY_M_BASE, IDELIVERY_S_BASE          = _reg("idelivery", 0)
+IFORCE_M_BASE, IFORCE_S_BASE                = _reg("iforce", 0)
+ITHRESHOLD_M_BASE, ITHRESHOLD_S_BASE        = _reg("ithreshold", 0)
+TOPI_M_BASE, TOPI_S_BASE                    = _reg("topi", 0)
+CLAIMI_M_BASE, CLAIMI_S_BASE                = _reg("claimi", 0)
 
 # IMSIC macros
-EDELIVERY               = 0X70
-EITHRESHOLD             = 0X72
-EIE0                    = 0xC0
+EDELIVERY               = IMSIC_EIDELIVERY
+EITHRESHOLD             = IMSIC_EITHRESHOLD
+EIE0                    = IMSIC_EIE0
 
-M_MODE                  = 3 
-S_MODE                  = 1
+# Privilege levels, imsic_pkg.sv encoding
+M_MODE                  = PRIV_LVL_M
+S_MODE                  = PRIV_LVL_S
 
 ENABLE_INTP_FILE        = 1
 DISABLE_INTP_FILE       = 0
 
 DOMAIN_IN_DIRECT_MODE = 0
-DOMAIN_IN_MSI_MODE = 1
\ No newline at end of file
+DOMAIN_IN_MSI_MODE = 1
+
+DOMAIN_IN_M_MODE = 0
+DOMAIN_IN_S_MODE = 1
\ No newline at end of file
@@ -1,433 +1,472 @@
 # from os import setpgid
 # from readline import set_pre_input_hook
+import functools
+import os
+import json
+import random
+import time
 import cocotb
-from cocotb.triggers import RisingEdge, FallingEdge, Timer
-import math
+from cocotb.triggers import FallingEdge, Timer, ClockCycles
+from cocotb.utils import get_sim_time
 import warnings
-from user_define import *
 from aia_define import *
 from aia_regmap import *
-import aplic_axi
+from aplic_axi import RegIntfMaster
+from aia_backend import DutBackend
+from aia_driver import AiaDriver
+from aia_flow import aia_integration, check_user_test, configure_interrupts, fire_and_check, TOPI_UPDATE_CYCLES
+from aia_flow import imsic_idc_phase, domaincfg_phase, source_target_phase, delivery_phase, claim_phase
+from aplic_model import AplicModel, AplicScoreboard, delegation_path, depth
+from aplic_model import DOMAINCFG_OFF, CLRIPNUM_OFF, SETIENUM_OFF, CLRIENUM_OFF, IDC_IDELIVERY, IDC_CLAIMI
 from imsic_csr_channel import *
+from imsic_model import ImsicModel
+from imsic_monitor import XtopeiMonitor
+from aia_clock import reset_dut, reset_fixture, pulse_reset
+from scenario_gen import Scenario, ScenarioGenerator, run_seed
+from wave_window import WaveWindow
+from perf_record import perf_recorded
+from checks import Checker
+from checkpoint import Checkpoint
+from session import SessionReport, check_expected, load_session
+from latency_probe import LatencyProbe, SOURCE_MODES, SOURCE_LEVELS, summarize
+from storm import StormConfig, InterruptStorm
 
 ONE_CYCLE = 2
-RED = "\033[31m"
-GREEN = "\033[32m"
-YELLOW = "\033[33m"
-BLUE = "\033[34m"
-RESET = "\033[0m"
-NR_TESTS_INTP = len(TARGET_INTP)
-TARGET_INTP_EN = [1] * NR_TESTS_INTP
-NR_FILES_IMSIC = 2 + IMSIC_NR_VS_FILES
-
-
-def clog2(x):
-    if x <= 0:
-        raise ValueError("Input must be a positive integer")
-    return math.floor(math.log2(x))
-
-def set_or_reg(reg, hexa, reg_width, reg_num):
-    reg     = reg | (hexa << reg_width*reg_num)
-    return reg
-
-def organize_xtopei(array, nr_imsics = 0, nr_intp_files = 0, length=5):
-    index = 0
-    organized_data = []
-    final_result = []
-
-    if (nr_imsics == 0 or nr_intp_files == 0):
-        raise("NR_IMSIC or NR_INTP_FILES lower than 1")
-    
-    for i in range(nr_imsics):
-        for j in range(nr_intp_files):
-            subrange = array[index:index + length]
-            index = index + length + 1
-            organized_data.append(subrange)
-        organized_data.reverse()
-        final_result.append(organized_data)
-        organized_data = []
-
-    final_result.reverse()
-    return final_result
-
-def get_expected_topi (target_hart, target_level):
-    prev_prio = 255
-    topi = 0
-    cur_highest_intp = -1
-
-    for i in range(NR_TESTS_INTP):
-        if ((TARGET_HART[i] == target_hart) and (TARGET_LEVEL[i] == target_level)):
-            if (TARGET_PRIO[i] < prev_prio):
-                if (TARGET_INTP_EN[i] == 1):
-                    prev_prio = TARGET_PRIO[i]
-                    cur_highest_intp = TARGET_INTP[i]
-
-    if (cur_highest_intp != -1):
-        topi = (cur_highest_intp << 16) | prev_prio 
-
-    return topi
-
-def claim_interrupt (target_hart, target_level):
-    topi = get_expected_topi(target_hart, target_level)
-    topi_iid = topi >> 16
-    if (topi != 0):
-        for i in range(NR_TESTS_INTP):
-            if (TARGET_HART[i] == target_hart and 
-                TARGET_LEVEL[i] == target_level and 
-                TARGET_INTP[i] == topi_iid):
-                TARGET_INTP_EN[i] = 0
-
-def check_user_test():    
-    for i in range(NR_TESTS_INTP):
-        if (TARGET_INTP[i] < 0 or TARGET_INTP[i] >= APLIC_NR_SRC):
-            raise ValueError(f'{RED}Wrong value for TARGET_INTP[{i}]: {TARGET_INTP[i]}. It must be in the range [0, UserNrSources-1]. The later is the number of sources implemented by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
-        if (AIA_MODE == DOMAIN_IN_MSI_MODE):
-            if (TARGET_HART[i] < 0 or TARGET_HART[i] > IMSIC_NR_HARTS):
-                raise ValueError(f'{RED}Wrong value for TARGET_HART[{i}]: {TARGET_HART[i]}. It must be in the range [0, UserNrHartsImsic-1]. The later is the number of IMSICs implemented by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
-        elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
-            if (TARGET_HART[i] < 0 or TARGET_HART[i] > APLIC_NR_HARTS):
-                raise ValueError(f'{RED}Wrong value for TARGET_HART[{i}]: {TARGET_HART[i]}. It must be in the range [0, UserNrSources-1]. The later is the number of IDCs implemented by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
-        if ((TARGET_LEVEL[i] != M_MODE) and (TARGET_LEVEL[i] != S_MODE)):
-            raise ValueError(f'{RED}Wrong value for TARGET_LEVEL[{i}]: {TARGET_LEVEL[i]}. It must be M_MODE or S_MODE.{RESET}')
-        if (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
-            if (TARGET_PRIO[i] < 0 or TARGET_PRIO[i] > APLIC_MIN_PRIO):
-                raise ValueError(f'{RED}Wrong value for TARGET_PRIO[{i}]: {TARGET_PRIO[i]}. It must be in the range [0, UserMinPrio-1]. The later is the min. priority that an interrupt can have (in aia spec. means the max. number), and can be configured in aia_pkg.sv.{RESET}')
-            elif (TARGET_PRIO[i] == 0):
-                TARGET_PRIO[i] = 1
-                warnings.warn( f'{YELLOW}TARGET_PRIO[{i}] was configured as 0. Hardware will force it to 1. Changing TARGET_PRIO[{i}] expected value from 0 to 1...{RESET}', UserWarning )
-        else:
-            warnings.warn( f'{YELLOW}Ignoring TARGET_PRIO because AIA is functioning in MSI Mode{RESET}', UserWarning )
-        if (AIA_MODE == DOMAIN_IN_MSI_MODE):
-            if (TARGET_GUEST[i] < 0 or TARGET_GUEST[i] > IMSIC_NR_VS_FILES):
-                raise ValueError(f'{RED}Wrong value for TARGET_GUEST[{i}]: {TARGET_GUEST[i]}. It must be in the range [0, UserNrVSIntpFiles-1]. The later is the number of VS files implemented per hart by the AIA IP, and can be configured in aia_pkg.sv.{RESET}')
-            if ((TARGET_GUEST[i] == 1) and (TARGET_LEVEL[i] != S_MODE)):
-                raise ValueError(f'{RED}Wrong value for TARGET_GUEST[{i}]. It only make sense to set the guest to 1 if the TARFET_LEVEL is S_MODE{RESET}')
-        else:
-            warnings.warn( f'{YELLOW}Ignoring TARGET_GUEST because AIA is functioning in DIRECT Mode{RESET}', UserWarning )
+# Cycles the xtopei monitor tolerates a difference after each announced MSI
+# or new CSR access: the MSIs of an APLIC access are only known once the
+# access completed, and the flow drives the CSR port from Timer callbacks
+# that can fall on a clock edge. stop() logs the cycles it absorbed
+MSI_GRACE_CYCLES = 2
+
+def start_waves(dut, test):
+    """Arm the AIA_WAVES=trigger window of test, None when tracing is not triggered."""
+    waves = WaveWindow.from_env(dut, test)
+    return waves.start() if waves is not None else None
+
+def checked_backend(dut, checks, waves=None):
+    """A DutBackend whose APLIC reads are checked against an AplicModel.
+
+    In MSI mode xtopei is also checked every cycle (imsic_monitor.py), the
+    MSIs forwarded by the APLIC model feed the interrupt file model. Returns
+    (backend, aplic_model, monitor), monitor None in DIRECT mode.
+    """
+    backend = DutBackend(dut)
+    aplic_model = AplicModel()
+    scoreboard = AplicScoreboard(aplic_model, checker=checks)
+    backend.bus.listeners.append(scoreboard)
+    backend.source_listeners.append(aplic_model.drive_sources)
+    if waves is not None:
+        scoreboard.on_mismatch.append(lambda addr, exp, act: waves.trigger(f"read of {hex(addr)} returned {hex(act)}, expected {hex(exp)}"))
+    monitor = None
+    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+        imsic_model = ImsicModel(IMSIC_NR_HARTS, IMSIC_NR_SRC, IMSIC_NR_VS_FILES, RISCV_XLEN)
+        # every MSI the APLIC model forwards lands in it, the port has to catch up by stop()
+        expected = ImsicModel(IMSIC_NR_HARTS, IMSIC_NR_SRC, IMSIC_NR_VS_FILES, RISCV_XLEN)
+        monitor = XtopeiMonitor(dut, imsic_model, checks, forwarded=aplic_model.forwarded, grace=MSI_GRACE_CYCLES,
+                                expected=expected).start()
+        if waves is not None:
+            monitor.on_mismatch.append(lambda cycle, exp, act: waves.trigger(f"xtopei {hex(act)}, expected {hex(exp)}"))
+    return backend, aplic_model, monitor
+
+async def rtl_integration(dut, scenario, checks, waves=None):
+    """aia_integration on the RTL, checked by the models of checked_backend()."""
+    backend, _, monitor = checked_backend(dut, checks, waves)
+    await aia_integration(backend, scenario, checks)
+    if monitor is not None:
+        monitor.stop()
+
+def aia_phase(*phases):
+    """Fixture: clock and reset, then run the phases the test needs before its own.
+
+    The test runs on a driver over checked_backend() with its own Checker,
+    on the user_define.py scenario; each phase of aia_flow.py expects the
+    ones before it, so the test lists them.
+    """
+    def fixture(test):
+        @functools.wraps(test)
+        @reset_fixture
+        async def wrapper(dut):
+            waves = start_waves(dut, test.__name__)
+            checks = Checker(dut, test.__name__)
+            backend, _, monitor = checked_backend(dut, checks, waves)
+            driver = AiaDriver(backend)
+            scenario = Scenario.from_user_define()
+            check_user_test(scenario)
+            for phase in phases:
+                await phase(driver, scenario, checks)
+            await test(driver, scenario, checks)
+            if monitor is not None:
+                monitor.stop()
+            if waves is not None:
+                waves.close()
+            checks.finish()
+        return wrapper
+    return fixture
 
-async def aia_integration(dut):
-    number_of_necessary_claims = 0
+@cocotb.test()
+@perf_recorded
+@aia_phase()
+async def imsic_idc_test(driver, scenario, checks):
+    """The interrupt files (MSI mode) or IDCs (DIRECT mode) of the targets can be enabled."""
+    await imsic_idc_phase(driver, scenario, checks)
 
-    # Check if the variables set by user are inside the ranges defined in aia_pkg
-    check_user_test()
+@cocotb.test()
+@perf_recorded
+@aia_phase(imsic_idc_phase)
+async def domaincfg_test(driver, scenario, checks):
+    """domaincfg of the M and S domains is writable, DM follows the delivery mode."""
+    await domaincfg_phase(driver, scenario, checks)
 
-    # Iterate over the hart and level to find matching pairs
-    if (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
-        for i in range(len(TARGET_HART)):
-            for j in range(i + 1, len(TARGET_HART)):
-                if TARGET_HART[i] == TARGET_HART[j] and TARGET_LEVEL[i] == TARGET_LEVEL[j]:
-                    number_of_necessary_claims += 1
-    EIE_OFF = []
-    for i in range(NR_TESTS_INTP):
-        eie_off_subrange = (TARGET_INTP[i]//RISCV_XLEN)*2 
-        EIE_OFF.append(eie_off_subrange)
+@cocotb.test()
+@perf_recorded
+@aia_phase(imsic_idc_phase, domaincfg_phase)
+async def source_target_test(driver, scenario, checks):
+    """sourcecfg follows the delegation of each target source, targets and enables are written."""
+    await source_target_phase(driver, scenario, checks)
 
-    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
-        print(f"{YELLOW}Strating IMSICs configurations...{RESET}")
-        # Enable interrupt delivering in IMSICs
-        for i in range(NR_TESTS_INTP):
-            imsic_write_reg(dut, TARGET_HART[i], EDELIVERY, ENABLE_INTP_FILE, TARGET_LEVEL[i], TARGET_GUEST[i])
-            await Timer(ONE_CYCLE, units="ns")
-
-        # Enable target interrupts in IMSICs interrupt files 
-        for i in range(NR_TESTS_INTP):
-            imsic_write_reg(dut, TARGET_HART[i], EIE0+EIE_OFF[i], 1<<(TARGET_INTP[i]%RISCV_XLEN), TARGET_LEVEL[i], TARGET_GUEST[i])
-            await Timer(ONE_CYCLE, units="ns")
-        #are missing assertations here
-    elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
-        print(f"{YELLOW}Strating IDCs configurations...{RESET}")
-        # Enable IDCs
-        for i in range(NR_TESTS_INTP):
-            if (TARGET_LEVEL[i] == M_MODE):        
-                aplic_axi.axi_write_reg(dut, IDELIVERY_M_BASE + (0x20*(TARGET_HART[i]-1)), (1 << 0))
-            elif (TARGET_LEVEL[i] == S_MODE):
-                aplic_axi.axi_write_reg(dut, IDELIVERY_S_BASE + (0x20*(TARGET_HART[i]-1)), (1 << 0))
-            await Timer(4, units="ns")  
-        #are missing assertations here
-
-    print(f"{YELLOW}Strating APLIC domains configurations...{RESET}")
-
-    print(f"{YELLOW}    domaincfg sanity...{RESET}")
-    domaincfg_expected_val = (0x80 << 24) | (1 << 8)
+@cocotb.test()
+@perf_recorded
+@aia_phase(configure_interrupts)
+async def delivery_test(driver, scenario, checks):
+    """The triggered interrupts reach xtopei (MSI mode) or topi and the CPU lines (DIRECT mode)."""
+    await delivery_phase(driver, scenario, checks)
+
+@cocotb.test()
+@perf_recorded
+@aia_phase(configure_interrupts, delivery_phase)
+async def claim_test(driver, scenario, checks):
+    """Claiming the delivered interrupts leaves every file or hart empty."""
+    await claim_phase(driver, scenario, checks)
+
+@cocotb.test(skip=int(os.environ.get("AIA_SCENARIOS", "0")) == 0)
+@perf_recorded
+async def random_scenarios_test(dut):
+    """Run AIA_SCENARIOS constrained-random scenarios (seed from AIA_SEED)."""
+
+    generator = ScenarioGenerator()
+    dut._log.info(f"random scenarios: AIA_SEED={generator.seed}")
+
+    await reset_dut(dut)
+    waves = start_waves(dut, "random_scenarios_test")
+    checks = Checker(dut, "random_scenarios_test")
+    for n, scenario in enumerate(generator.scenarios(int(os.environ["AIA_SCENARIOS"]))):
+        dut._log.info(f"scenario {n}: {scenario}")
+        await rtl_integration(dut, scenario, checks, waves)
+        await pulse_reset(dut)
+    if waves is not None:
+        waves.close()
+    checks.finish()
+
+@cocotb.test(skip="AIA_SESSION" not in os.environ)
+@perf_recorded
+async def session_test(dut):
+    """Run every scenario of the AIA_SESSION file in this simulator, ni_rst pulsed between them."""
+
+    entries = load_session(os.environ["AIA_SESSION"])
+    # reject a bad scenario before any of the session is simulated
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for entry in entries:
+            if entry.runs_on(AIA_MODE):
+                check_user_test(entry.scenario)
+
+    await reset_dut(dut)
+    waves = start_waves(dut, "session_test")
+    checks = Checker(dut, "session_test")
+    # every scenario must start from the flop values right after reset
+    reset_state = Checkpoint.capture(dut)
+    report = SessionReport()
+    for entry in entries:
+        if not entry.runs_on(AIA_MODE):
+            report.add(entry)
+            continue
+        checks.check(f"{entry.name} starts from reset", "", " ".join(reset_state.verify()))
+        scenario_checks = Checker(dut, f"session_test {entry.name}")
+        sim_start, wall_start = get_sim_time(units="ns"), time.perf_counter()
+        await rtl_integration(dut, entry.scenario, scenario_checks, waves)
+        check_expected(scenario_checks, entry.expected)
+        report.add(entry, scenario_checks, get_sim_time(units="ns") - sim_start, time.perf_counter() - wall_start)
+        scenario_checks.keep()
+        if scenario_checks.nr_failures:
+            dut._log.error(f"{scenario_checks.summary()}, first failure {scenario_checks.failures[0][0]}")
+        await pulse_reset(dut)
+    if waves is not None:
+        waves.close()
+
+    summary = report.summary()
+    dut._log.info(f"session: {summary['scenarios']} scenarios, {summary['failed']} failed, {summary['skipped']} skipped "
+                  f"for the other delivery mode, {summary['scenarios_per_hour']:.0f} scenarios/hour")
+    report.write_json(os.environ.get("AIA_SESSION_OUT", "session.json"))
+    checks.check("failed session scenarios", 0, summary["failed"])
+    checks.finish()
+
+@cocotb.test(skip=int(os.environ.get("AIA_CHECKPOINT", "0")) == 0)
+@perf_recorded
+async def checkpoint_campaign_test(dut):
+    """Configure one scenario, then fire AIA_CHECKPOINT random subsets of it from a checkpoint."""
+
+    generator = ScenarioGenerator(max_intp=int(os.environ.get("AIA_CHECKPOINT_INTP", "8")))
+    rng = random.Random(generator.seed)
+    scenario = generator.generate()
+    dut._log.info(f"checkpoint campaign: AIA_SEED={generator.seed}, configured {scenario}")
+
+    await reset_dut(dut)
+    checks = Checker(dut, "checkpoint_campaign_test")
+    backend, aplic_model, monitor = checked_backend(dut, checks)
+    driver = AiaDriver(backend)
+
+    start = get_sim_time(units="ns")
+    await configure_interrupts(driver, scenario, checks)
+    # quiescent point: CSR port released, bus and sources idle
+    imsic_stop_write(dut)
+    await ClockCycles(dut.i_clk, TOPI_UPDATE_CYCLES)
+    setup_ns = get_sim_time(units="ns") - start
+    # the driver is restored with its shadows, the backend it drives is kept
+    models = [aplic_model, driver] + ([monitor.model, monitor.expected] if monitor is not None else [])
+    checkpoint = Checkpoint.capture(dut, *models, shared=(REGMAP, aplic_model.domains, backend))
+    dut._log.info(f"checkpoint: {len(checkpoint)} flops after {setup_ns} ns of setup")
+
+    for n in range(int(os.environ["AIA_CHECKPOINT"])):
+        await pulse_reset(dut)
+        checkpoint.restore()
+        if monitor is not None:
+            monitor.forwarded = aplic_model.forwarded
+        await FallingEdge(dut.i_clk)
+        checks.check(f"stimulus {n} restored flops", "", " ".join(checkpoint.verify()))
+
+        stimulus = scenario.subset(sorted(rng.sample(range(len(scenario)), rng.randint(1, len(scenario)))))
+        dut._log.debug(f"stimulus {n}: {stimulus}")
+        await fire_and_check(driver, stimulus, checks)
+
+    if monitor is not None:
+        monitor.stop()
+    dut._log.info(f"checkpoint campaign: {setup_ns} ns of setup simulated once instead of "
+                  f"{int(os.environ['AIA_CHECKPOINT'])} times")
+    checks.finish()
+
+async def latency_sweep(dut, bus, probe, runs, source=1):
+    """Measure every gateway source mode against every hart and file/domain.
+
+    One source is reconfigured for each (source mode, target) pair and
+    triggered runs times; after each arrival the line is released and the
+    interrupt claimed so the next run starts from an idle target.
+    """
     domaincfg_val = (1 << 8)
     if (AIA_MODE == DOMAIN_IN_MSI_MODE):
-        domaincfg_expected_val |= (1 << 2)
         domaincfg_val |= (1 << 2)
-    
-    # Enable M domain
-    aplic_axi.axi_write_reg(dut, DOMAINCFG_M_BASE, domaincfg_val)
-    await Timer(ONE_CYCLE*2, units="ns")
-    aplic_axi.axi_stop(dut)
-    await Timer(ONE_CYCLE*3, units="ns")
-    aplic_axi.axi_read_reg(dut, DOMAINCFG_M_BASE)
-    await Timer(ONE_CYCLE*2, units="ns")
-
-    try:
-        assert dut.reg_intf_resp_d32_rdata.value == domaincfg_expected_val, "M domaincfg does not match expected value"
-        print(f"{GREEN}PASSED: domaincfg[M] = {hex(domaincfg_expected_val)}{RESET}")
-    except AssertionError as e:
-        print(f"{RED}AssertionError: {e}{RESET}")
-
-    # Enable S domain
-    aplic_axi.axi_write_reg(dut, DOMAINCFG_S_BASE, domaincfg_val)
-    await Timer(ONE_CYCLE, units="ns")
-    aplic_axi.axi_stop(dut)
-    await Timer(ONE_CYCLE*3, units="ns")
-    aplic_axi.axi_read_reg(dut, DOMAINCFG_M_BASE)
-    await Timer(ONE_CYCLE*2, units="ns")
-
-    try:
-        assert dut.reg_intf_resp_d32_rdata.value == domaincfg_expected_val, "S domaincfg does not match expected value"
-        print(f"{GREEN}PASSED: domaincfg[S] = {hex(domaincfg_expected_val)}{RESET}")
-    except AssertionError as e:
-        print(f"{RED}AssertionError: {e}{RESET}")
-
-    print(f"{YELLOW}    sourcecfg sanity...{RESET}")
-    # configure the sourcecfg registers in APLIC for the target interrupts
-    sourcecfg_m_expected_val = []
-    sourcecfg_s_expected_val = []
-    for i in range(NR_TESTS_INTP):
-        if (TARGET_LEVEL[i] == S_MODE):
-            aplic_axi.axi_write_reg(dut, SOURCECFG_M_BASE+(SOURCECFG_OFF * (TARGET_INTP[i]-1)), (DELEGATE_SRC | 0x0))
-            sourcecfg_m_expected_val.append((DELEGATE_SRC | 0x0))
-            await Timer(ONE_CYCLE, units="ns")
-            aplic_axi.axi_stop(dut)
-            await Timer(ONE_CYCLE*3, units="ns")
-            aplic_axi.axi_write_reg(dut, SOURCECFG_S_BASE+(SOURCECFG_OFF * (TARGET_INTP[i]-1)), 4)
-            sourcecfg_s_expected_val.append(4)
-        else:
-            aplic_axi.axi_write_reg(dut, SOURCECFG_M_BASE+(SOURCECFG_OFF * (TARGET_INTP[i]-1)), 4)
-            sourcecfg_m_expected_val.append(4)
-            sourcecfg_s_expected_val.append(0)
-        await Timer(ONE_CYCLE, units="ns")
-        aplic_axi.axi_stop(dut)
-        await Timer(ONE_CYCLE*3, units="ns")
-
-    # Read the sourcecfg to validate the logic of rebuilding sourcecfg register
-    for i in range(NR_TESTS_INTP):
-        aplic_axi.axi_read_reg(dut, SOURCECFG_M_BASE+(SOURCECFG_OFF * (TARGET_INTP[i]-1)))
-        await Timer(ONE_CYCLE*4, units="ns")
-        cur_axi_read_val = dut.reg_intf_resp_d32_rdata.value 
-        aplic_axi.axi_stop(dut)
-        await Timer(ONE_CYCLE*4, units="ns")
-        
-        try:
-            assert cur_axi_read_val == sourcecfg_m_expected_val[i], "sourcecfg in M does not match the expected value"
-            print(f"{GREEN}PASSED: sourcecfg[M][{TARGET_INTP[i]}] = {hex(sourcecfg_m_expected_val[i])}{RESET}")
-        except AssertionError as e:
-            print(f"{RED}AssertionError: {e}{RESET}")
-
-        aplic_axi.axi_read_reg(dut, SOURCECFG_S_BASE+(SOURCECFG_OFF * (TARGET_INTP[i]-1)))
-        await Timer(ONE_CYCLE*4, units="ns")
-        cur_axi_read_val = dut.reg_intf_resp_d32_rdata.value 
-        aplic_axi.axi_stop(dut)
-        await Timer(ONE_CYCLE*4, units="ns")
-
-        try:
-            assert cur_axi_read_val == sourcecfg_s_expected_val[i], "sourcecfg in S does not match the expected value"
-            print(f"{GREEN}PASSED: sourcecfg[S][{TARGET_INTP[i]}] = {hex(sourcecfg_s_expected_val[i])}{RESET}")
-        except AssertionError as e:
-            print(f"{RED}AssertionError: {e}{RESET}")
-
-    # configure the target registers in APLIC for the target interrupts
-    for i in range(NR_TESTS_INTP):
-        if (AIA_MODE == DOMAIN_IN_MSI_MODE):
-            if(TARGET_LEVEL[i] == M_MODE):
-                aplic_axi.axi_write_reg(dut, TARGET_M_BASE+(TARGET_OFF * (TARGET_INTP[i]-1)), ((TARGET_HART[i]-1) << 18) | (TARGET_INTP[i] << 0))
+    await bus.write_burst([(DOMAINCFG_M_BASE, domaincfg_val), (DOMAINCFG_S_BASE, domaincfg_val)])
+
+    targets = []
+    if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+        for hart in range(1, IMSIC_NR_HARTS+1):
+            targets.append((hart, M_MODE, 0))
+            for guest in range(IMSIC_NR_VS_FILES+1):
+                targets.append((hart, S_MODE, guest))
+        # Enable delivery and the source eiid in every interrupt file
+        for hart, level, guest in targets:
+            for addr, data in ((EDELIVERY, ENABLE_INTP_FILE), (EIE0+(source//RISCV_XLEN)*2, 1 << (source%RISCV_XLEN))):
+                imsic_write_reg(dut, hart, addr, data, level, guest)
+                await Timer(ONE_CYCLE, units="ns")
+        imsic_stop_write(dut)
+    else:
+        for hart in range(1, APLIC_NR_HARTS+1):
+            targets += [(hart, M_MODE, 0), (hart, S_MODE, 0)]
+        await bus.write_burst([((IDELIVERY_M_BASE if level == M_MODE else IDELIVERY_S_BASE) + 0x20*(hart-1), 1)
+                               for hart, level, _ in targets])
+
+    for sm in SOURCE_MODES:
+        for hart, level, guest in targets:
+            m_domain = (level == M_MODE)
+            sourcecfg = SOURCECFG_OFF * (source-1)
+            target_off = TARGET_OFF * (source-1)
+            if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+                target_val = ((hart-1) << 18) | (guest << 12) | source
+                path = ("xtopei", hart-1, 0 if m_domain else guest+1)
             else:
-                aplic_axi.axi_write_reg(dut, TARGET_S_BASE+(TARGET_OFF * (TARGET_INTP[i]-1)), ((TARGET_HART[i]-1) << 18) | (TARGET_GUEST[i] << 12) | (TARGET_INTP[i] << 0))
-        elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
-            if(TARGET_LEVEL[i] == M_MODE):
-                aplic_axi.axi_write_reg(dut, TARGET_M_BASE+(TARGET_OFF * (TARGET_INTP[i]-1)), ((TARGET_HART[i]-1) << 18) | (TARGET_PRIO[i] << 0))
+                target_val = ((hart-1) << 18) | 1
+                path = ("eintp_cpu", 0 if m_domain else 1, hart-1)
+
+            # Park the line at its inactive level with the source disabled,
+            # so reconfiguring it cannot leave a stale pending bit behind
+            await bus.write_burst([(CLRIENUM_M_BASE, source), (CLRIENUM_S_BASE, source)])
+            await FallingEdge(dut.i_clk)
+            probe.drive(source, SOURCE_LEVELS[sm][0])
+            if m_domain:
+                config = [(SOURCECFG_M_BASE+sourcecfg, sm), (TARGET_M_BASE+target_off, target_val),
+                          (CLRIPNUM_M_BASE, source), (SETIENUM_M_BASE, source)]
             else:
-                aplic_axi.axi_write_reg(dut, TARGET_S_BASE+(TARGET_OFF * (TARGET_INTP[i]-1)), ((TARGET_HART[i]-1) << 18) | (TARGET_PRIO[i] << 0))
-
-        await Timer(ONE_CYCLE, units="ns")
-        aplic_axi.axi_stop(dut)
-        await Timer(ONE_CYCLE*3, units="ns")
-    # are missing target asserts
-
-    # enable target interrupts in their respective domain
-    for i in range(NR_TESTS_INTP):
-        if(TARGET_LEVEL[i] == M_MODE):
-            aplic_axi.axi_write_reg(dut, SETIENUM_M_BASE, TARGET_INTP[i])
+                config = [(SOURCECFG_M_BASE+sourcecfg, DELEGATE_SRC), (SOURCECFG_S_BASE+sourcecfg, sm),
+                          (TARGET_S_BASE+target_off, target_val), (CLRIPNUM_S_BASE, source), (SETIENUM_S_BASE, source)]
+            await bus.write_burst(config)
+            await ClockCycles(dut.i_clk, 4)
+
+            for _ in range(runs):
+                await probe.measure(path, sm, source)
+                await FallingEdge(dut.i_clk)
+                probe.drive(source, SOURCE_LEVELS[sm][0])
+                if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+                    imsic_write_xtopei(dut, hart, level, guest)
+                    await ClockCycles(dut.i_clk, 3)
+                    imsic_stop_write(dut)
+                else:
+                    await bus.read((CLAIMI_M_BASE if m_domain else CLAIMI_S_BASE) + 0x20*(hart-1))
+                await ClockCycles(dut.i_clk, TOPI_UPDATE_CYCLES + 2)
+
+def delegate_writes(domains, src, d, sm):
+    """Writes delegating src from the root down to domain d, with source mode sm there."""
+    writes = [(domains[p].sourcecfg(src), DELEGATE_SRC | ci) for p, ci in delegation_path(domains, d)]
+    return writes + [(domains[d].sourcecfg(src), sm)]
+
+def reclaim_writes(domains, src, d):
+    """Writes taking src back from domain d up to the root, deepest parent first."""
+    return [(domains[p].sourcecfg(src), INACTIVE) for p, _ in reversed(delegation_path(domains, d))]
+
+@cocotb.test(skip=int(os.environ.get("AIA_DELEGATION", "0")) == 0)
+@perf_recorded
+@reset_fixture
+async def delegation_test(dut):
+    """AIA_DELEGATION random sourcecfg writes over the whole domain tree (seed from AIA_SEED).
+
+    Every write comes from a random domain: delegations to a random child,
+    source modes, reclaims by the parent and writes the owner rules must
+    ignore. After each write the source's sourcecfg is read back in every
+    domain and compared with the model, and all of them at the end.
+    """
+    seed = run_seed()
+    rng = random.Random(seed)
+    dut._log.info(f"delegation: AIA_SEED={seed}")
+    bus = RegIntfMaster(dut, regmap=REGMAP)
+    model = AplicModel()
+    checks = Checker(dut, "delegation_test")
+    bus.listeners.append(AplicScoreboard(model, checker=checks))
+    domains = model.domains
+    sms = [INACTIVE, DETACHED, EDGE1, EDGE0, LEVEL1, LEVEL0]
+
+    for _ in range(int(os.environ["AIA_DELEGATION"])):
+        src = rng.randrange(1, APLIC_NR_SRC)
+        d = rng.randrange(len(domains))
+        if domains[d].childs and rng.random() < 0.5:
+            data = DELEGATE_SRC | rng.randrange(len(domains[d].childs))
         else:
-            aplic_axi.axi_write_reg(dut, SETIENUM_S_BASE, TARGET_INTP[i])
-        await Timer(ONE_CYCLE, units="ns")
-        aplic_axi.axi_stop(dut)
-        await Timer(ONE_CYCLE*3, units="ns")
-
-    # We now start triggering the interrupts
-    if(TARGET_LEVEL[0] == M_MODE):
-        aplic_axi.axi_write_reg(dut, SETIPNUM_M_BASE, TARGET_INTP[0])
-    else:
-        aplic_axi.axi_write_reg(dut, SETIPNUM_S_BASE, TARGET_INTP[0])
-    await Timer(ONE_CYCLE, units="ns")
-    aplic_axi.axi_stop(dut)
-    await Timer(ONE_CYCLE*3, units="ns")
-    # Write to domain (or other register really) to reset the write lines
-    # This is a bug in the tests and not the hw
-    # We intend to fix this in the future :) 
-    aplic_axi.axi_write_reg(dut, DOMAINCFG_M_BASE, (1 << 8) | (1 << 2))
-    await Timer(ONE_CYCLE, units="ns")
-    aplic_axi.axi_stop(dut)
-    await Timer(ONE_CYCLE*3, units="ns")
-    
-    for i in range(1, NR_TESTS_INTP):
-        source                = 0
-        source                = set_or_reg(source, 1, 1, TARGET_INTP[i])
-        dut.i_sources.value   = source
-        await Timer(4, units="ns")
-        # reset source lines
-        source                = 0
-        dut.i_sources.value   = source
-        await Timer(10, units="ns")
-
+            data = rng.choice(sms + [DELEGATE_SRC])
+        await bus.write(domains[d].sourcecfg(src), data)
+        await bus.read_burst([domain.sourcecfg(src) for domain in domains])
+
+    await bus.read_burst([domain.sourcecfg(src) for domain in domains for src in range(1, APLIC_NR_SRC)])
+    owners = [sum(1 for src in range(1, APLIC_NR_SRC) if model.owner[src] == d) for d in range(len(domains))]
+    dut._log.info(f"delegation: sources owned per domain {owners}")
+    checks.finish()
+
+async def depth_latency_sweep(dut, bus, probe, runs, source=1, hart=1):
+    """Latency of one EDGE1 source delegated to every domain of the tree.
+
+    The source is delegated from the root down to each domain in turn,
+    targeted at hart and triggered runs times. Samples are grouped by
+    depth:domain, so the report shows how latency grows with the number of
+    delegation levels.
+    """
+    domains = AplicModel().domains
+    if (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+        # the probe reads o_eintp_cpu[d] for every domain of the table, root included
+        assert len(dut.o_eintp_cpu) == len(domains) == APLIC_NR_SYS_DOMAINS, \
+            f"o_eintp_cpu has {len(dut.o_eintp_cpu)} domain lines, the domain table {len(domains)}"
+    domaincfg_val = (1 << 8)
     if (AIA_MODE == DOMAIN_IN_MSI_MODE):
-        print(f"{YELLOW}    xtopei sanity...{RESET}")
-        xtopei_array = organize_xtopei(dut.xtopei.value, IMSIC_NR_HARTS, NR_FILES_IMSIC, clog2(IMSIC_NR_SRC-1))
-
-        for i in range(NR_TESTS_INTP):
-            try:
-                if (TARGET_LEVEL[i] == M_MODE):
-                    assert xtopei_array[TARGET_HART[i]-1][0] == TARGET_INTP[i], "Read xtopei does not match the expected value"
-                    print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][M] = {TARGET_INTP[i]}{RESET}")
-                else:
-                    assert xtopei_array[TARGET_HART[i]-1][TARGET_GUEST[i]+1] == TARGET_INTP[i]
-                    if (TARGET_GUEST[i] == 0):
-                        print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][S] = {TARGET_INTP[i]}{RESET}")
-                    else:
-                        print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][VS][{TARGET_GUEST[i]-1}] = {TARGET_INTP[i]}{RESET}")
-
-            except AssertionError as e:
-                print(f"{RED}AssertionError: {e}{RESET}")
-
-        print(f"{YELLOW}    Strat interrupts claiming...{RESET}")
-        print(f"{YELLOW}    xtopei sanity...{RESET}")
-        # Clear the pending interrupt
-        for i in range(NR_TESTS_INTP):
-            imsic_write_xtopei(dut, TARGET_HART[i], TARGET_LEVEL[i], TARGET_GUEST[i])
-            await Timer(ONE_CYCLE*3, units="ns")
-            imsic_stop_write(dut)
-            await Timer(ONE_CYCLE, units="ns")
-
-        xtopei_array = organize_xtopei(dut.xtopei.value, IMSIC_NR_HARTS, NR_FILES_IMSIC, clog2(IMSIC_NR_SRC-1))
-
-        for i in range(NR_TESTS_INTP):
-            try:
-                if (TARGET_LEVEL[i] == M_MODE):
-                    assert xtopei_array[TARGET_HART[i]-1][0] == 0, "Read xtopei does not match the expected value"
-                    print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][M] = 0{RESET}")
-                else:
-                    assert xtopei_array[TARGET_HART[i]-1][TARGET_GUEST[i]+1] == 0
-                    if (TARGET_GUEST[i] == 0):
-                        print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][S] = 0{RESET}")
-                    else:
-                        print(f"{GREEN}PASSED: xtopei[{TARGET_HART[i]-1}][VS][{TARGET_GUEST[i]-1}] = 0{RESET}")
-
-            except AssertionError as e:
-                print(f"{RED}AssertionError: {e}{RESET}")
-
-    # are missing assertations for cpu line
-    elif (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
-        print(f"{YELLOW}    topi and CPU line sanity...{RESET}")
-        # target = dut.o_eintp_cpu.value
-
-        # this part is trying to evaluate the cpu line and the topi value
-        # Since an interrupt can be configured for the same hart and same domain level
-        # we repeat this test "number_of_necessary_claims" times (for all harts and domains, for sanity porpuses)
-        # What "number_of_necessary_claims" means? 
-        # At the function start we search for how many matching pairs (TARGET_HART and TARGET_LEVEL) across the various
-        # interrupt indexes. This is, if determine how many interrupts have the same target hart and same level.
-        # Why not just clami that interrupt specifically and evaluate only that hart and level?
-        # We could, but we dont... Sanity check porpuse.
-        w = 0
-        while w <= number_of_necessary_claims:
-            
-            print(f"{YELLOW}    starting round {w} of {number_of_necessary_claims}...{RESET}")
-
-            for i in range(APLIC_NR_HARTS):
-                for j in range(APLIC_NR_DOMAINS):
-                    if (j == 0):
-                        TOPI_BASE = CLAIMI_M_BASE
-                        MODE = M_MODE
-                    else:
-                        TOPI_BASE = CLAIMI_S_BASE
-                        MODE = S_MODE
-
-                    target = dut.o_eintp_cpu.value
-                    aplic_axi.axi_read_reg(dut, TOPI_BASE + (0x20 * i))
-                    await Timer(ONE_CYCLE, units="ns")
-                    cur_axi_read_val = dut.reg_intf_resp_d32_rdata.value 
-                    expected_topi_val = get_expected_topi(i+1, MODE)
-                    if (expected_topi_val != 0):
-                        expected_cpu_line_val = 1
-                    else:
-                        expected_cpu_line_val = 0
-                    claim_interrupt(i+1, MODE)
-                    aplic_axi.axi_stop(dut)
-                    await Timer(ONE_CYCLE*4, units="ns")
-
-                    try:
-                        assert expected_cpu_line_val == target[APLIC_NR_DOMAINS-j-1][APLIC_NR_HARTS-i-1], f"cpu_line[{j}][{i}] does not match the expected value"
-                        print(f"{GREEN}PASSED: cpu_line[{j}][{i}] = {expected_cpu_line_val}{RESET}")
-                        assert cur_axi_read_val == expected_topi_val, f"topi[{j}][{i}] does not match the expected value"
-                        print(f"{GREEN}PASSED: topi[{j}][{i}] = {hex(expected_topi_val)}{RESET}")
-                    except AssertionError as e:
-                        print(f"{RED}AssertionError: {e}{RESET}")
-                    
-            w += 1
-
-        print(f"{YELLOW}    topi and CPU line sanity after claiming every interrupt...{RESET}")
-        # for each hart in each domain, check if all interrupts were claimed
-        for i in range(APLIC_NR_HARTS):
-            for j in range(APLIC_NR_DOMAINS):
-                if (j == 0):
-                    TOPI_BASE = TOPI_M_BASE
-                    MODE = M_MODE
-                else:
-                    TOPI_BASE = TOPI_S_BASE
-                    MODE = S_MODE
-
-                aplic_axi.axi_read_reg(dut, TOPI_BASE + (0x20 * i))
-                await Timer(ONE_CYCLE*4, units="ns")
-                cur_axi_read_val = dut.reg_intf_resp_d32_rdata.value 
-                expected_topi_val = get_expected_topi(i+1, MODE)
-                aplic_axi.axi_stop(dut)
-                await Timer(ONE_CYCLE*4, units="ns")
-
-                try:
-                    assert cur_axi_read_val == expected_topi_val, f"topi[{j}][{i}] does not match the expected value"
-                    print(f"{GREEN}PASSED: topi[{j}][{i}] = {hex(expected_topi_val)}{RESET}")
-                except AssertionError as e:
-                    print(f"{RED}AssertionError: {e}{RESET}")
-
-async def generate_clock(dut):
-    """Generate clock pulses."""
-
-    for cycle in range(100000):
-        dut.i_clk.value = 0
-        await Timer(1, units="ns")
-        dut.i_clk.value = 1
-        await Timer(1, units="ns")
+        domaincfg_val |= (1 << 2)
+        for level in (M_MODE, S_MODE):
+            for addr, data in ((EDELIVERY, ENABLE_INTP_FILE), (EIE0+(source//RISCV_XLEN)*2, 1 << (source%RISCV_XLEN))):
+                imsic_write_reg(dut, hart, addr, data, level, 0)
+                await Timer(ONE_CYCLE, units="ns")
+        imsic_stop_write(dut)
+    setup = [(domain.reg(DOMAINCFG_OFF), domaincfg_val) for domain in domains]
+    if (AIA_MODE == DOMAIN_IN_DIRECT_MODE):
+        setup += [(domain.idc(hart-1, IDC_IDELIVERY), 1) for domain in domains]
+    await bus.write_burst(setup)
 
-@cocotb.test()
-async def regctl_unit_test(dut):
-    """Try accessing the design."""
-
-    dut.ni_rst.value = 1
-    # run the clock "in the background"
-    await cocotb.start(generate_clock(dut))  
-    # wait a bit
-    await Timer(2, units="ns")  
-    # wait for falling edge/"negedge"
-    await FallingEdge(dut.i_clk)
-
-    # Reset the dut
-    dut.ni_rst.value = 0
-    await Timer(1, units="ns")
-    dut.ni_rst.value = 1
-    await Timer(1, units="ns")
-    
-    await cocotb.start(aia_integration(dut))
-    await Timer(10000, units="ns")
\ No newline at end of file
+    for d, domain in enumerate(domains):
+        if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+            target_val = ((hart-1) << 18) | source
+            path = ("xtopei", hart-1, 0 if domain.level == M_MODE else 1)
+        else:
+            target_val = ((hart-1) << 18) | 1
+            path = ("eintp_cpu", d, hart-1)
+        name = f"depth{depth(domains, d)}:domain{d}"
+
+        await FallingEdge(dut.i_clk)
+        probe.drive(source, 0)
+        await bus.write_burst(delegate_writes(domains, source, d, EDGE1) +
+                              [(domain.target(source), target_val),
+                               (domain.reg(CLRIPNUM_OFF), source), (domain.reg(SETIENUM_OFF), source)])
+        await ClockCycles(dut.i_clk, 4)
+
+        for _ in range(runs):
+            await probe.measure(path, EDGE1, source, name=name)
+            await FallingEdge(dut.i_clk)
+            probe.drive(source, 0)
+            if (AIA_MODE == DOMAIN_IN_MSI_MODE):
+                imsic_write_xtopei(dut, hart, domain.level, 0)
+                await ClockCycles(dut.i_clk, 3)
+                imsic_stop_write(dut)
+            else:
+                await bus.read(domain.idc(hart-1, IDC_CLAIMI))
+            await ClockCycles(dut.i_clk, TOPI_UPDATE_CYCLES + 2)
+
+        await bus.write_burst([(domain.reg(CLRIENUM_OFF), source)] + reclaim_writes(domains, source, d))
+
+@cocotb.test(skip=int(os.environ.get("AIA_LATENCY", "0")) == 0)
+@perf_recorded
+@reset_fixture
+async def latency_test(dut):
+    """Source to xtopei/eintp_cpu latency, AIA_LATENCY runs per path."""
+
+    bus = RegIntfMaster(dut, regmap=REGMAP)
+    probe = LatencyProbe(dut).start()
+
+    await latency_sweep(dut, bus, probe, int(os.environ["AIA_LATENCY"]))
+
+    probe.stop()
+    probe.print_report()
+    probe.write_json(os.environ.get("AIA_LATENCY_OUT", "latency.json"))
+    assert not probe.timeouts, f"{sum(probe.timeouts.values())} interrupts never arrived"
+
+@cocotb.test(skip=("AIA_STORM" not in os.environ) or (AIA_MODE != DOMAIN_IN_MSI_MODE))
+@perf_recorded
+@reset_fixture
+async def storm_test(dut):
+    """APLIC to IMSIC throughput under an AIA_STORM=subset|rate|poisson storm."""
+
+    bus = RegIntfMaster(dut, regmap=REGMAP)
+    storm = InterruptStorm(dut, StormConfig.from_env())
+
+    await storm.setup_imsics()
+    await bus.write_burst(storm.setup_writes())
+    report = await storm.run()
+
+    dut._log.info(f"storm {report['pattern']}: {report['fired']} fired, {report['delivered']} delivered "
+                  f"({report['delivered_per_kcycle']:.1f}/kcycle), {report['lost']} lost, max backlog {report['max_backlog']}")
+    for band in ("low_sources", "high_sources"):
+        dut._log.info(f"    {band}: {report[band]}")
+    with open(os.environ.get("AIA_STORM_OUT", "storm.json"), "w") as f:
+        json.dump(report, f, indent=2)
+
+@cocotb.test(skip=int(os.environ.get("AIA_LATENCY", "0")) == 0)
+@perf_recorded
+@reset_fixture
+async def depth_latency_test(dut):
+    """Source to delivery latency per delegation depth, AIA_LATENCY runs per domain."""
+
+    bus = RegIntfMaster(dut, regmap=REGMAP)
+    probe = LatencyProbe(dut).start()
+
+    await depth_latency_sweep(dut, bus, probe, int(os.environ["AIA_LATENCY"]))
+
+    probe.stop()
+    report = probe.report()
+    per_depth = {}
+    for (_, _, name), values in probe.samples.items():
+        per_depth.setdefault(name.split(":")[0], []).extend(values)
+    report["depths"] = {k: summarize(v) for k, v in sorted(per_depth.items())}
+    probe.print_report(report)
+    with open(os.environ.get("AIA_LATENCY_DEPTH_OUT", "latency_depth.json"), "w") as f:
+        json.dump(report, f, indent=2)
+    assert not probe.timeouts, f"{sum(probe.timeouts.values())} interrupts never arrived"
@@ -0,0 +1,565 @@
+from bisect import insort
+
+try:
+    import numpy as np
+except ImportError:
+    # only take_msis() uses it, and falls back to _forward()
+    np = None
+
+from aia_define import AIA_MODE, APLIC_NR_SRC, APLIC_NR_HARTS, APLIC_DOMAINS_CFG
+from aia_regmap import *
+from regdesc import PARAMS, RegMap, IDC_OFF, IDC_SIZE
+
+# Register offsets inside a domain and field positions (aplic_pkg.sv)
+DOMAINCFG_OFF           = PARAMS["DOMAINCFG_OFF"]
+SOURCECFG_OFF_BASE      = PARAMS["SOURCECFG_OFF"]
+SETIPNUM_OFF            = PARAMS["SETIPNUM_OFF"]
+CLRIPNUM_OFF            = PARAMS["CLRIPNUM_OFF"]
+SETIENUM_OFF            = PARAMS["SETIENUM_OFF"]
+CLRIENUM_OFF            = PARAMS["CLRIENUM_OFF"]
+TARGET_OFF_BASE         = PARAMS["TARGET_OFF"]
+IDC_IDELIVERY           = PARAMS["IDC_IDELIVERY"]
+IDC_IFORCE              = PARAMS["IDC_IFORCE"]
+IDC_ITHRESHOLD          = PARAMS["IDC_ITHRESHOLD"]
+IDC_TOPI                = PARAMS["IDC_TOPI"]
+IDC_CLAIMI              = PARAMS["IDC_CLAIMI"]
+
+DOMAINCFG_RO80          = PARAMS["DOMAINCFG_RO80_VAL"] << PARAMS["DOMAINCFG_RO80_OFF"]
+DOMAINCFG_IE_OFF        = PARAMS["DOMAINCFG_IE_OFF"]
+DOMAINCFG_DM_OFF        = PARAMS["DOMAINCFG_DM_OFF"]
+TARGET_HI_OFF           = PARAMS["TARGET_HI_OFF"]
+TARGET_HI_MASK          = (1 << PARAMS["TARGET_HI_LEN"]) - 1
+TARGET_GI_OFF           = PARAMS["TARGET_GI_OFF"]
+TARGET_GI_MASK          = (1 << PARAMS["TARGET_GI_LEN"]) - 1
+TARGET_EIID_MASK        = (1 << PARAMS["TARGET_EIID_LEN"]) - 1
+TARGET_IPRIO_MASK       = (1 << PARAMS["TARGET_IPRIO_LEN"]) - 1
+CLAIMI_IID_OFF          = PARAMS["CLAIMI_IID_OFF"]
+
+VALID_SM = (INACTIVE, DETACHED, EDGE1, EDGE0, LEVEL1, LEVEL0)
+
+class AplicDomain:
+    def __init__(self, id, parent, childs, level, addr):
+        self.id = id
+        # -1 for the root domain
+        self.parent = parent
+        # domain index reached by each sourcecfg child index
+        self.childs = childs
+        self.level = level
+        self.addr = addr
+
+    def reg(self, off):
+        """Address of the register at off in this domain."""
+        return self.addr + off
+
+    def sourcecfg(self, src):
+        return self.addr + SOURCECFG_OFF_BASE + 4 * (src - 1)
+
+    def target(self, src):
+        return self.addr + TARGET_OFF_BASE + 4 * (src - 1)
+
+    def idc(self, hart, reg):
+        return self.addr + IDC_OFF + IDC_SIZE * hart + reg
+
+def domains_from_cfg(cfg):
+    """AplicDomain list from aia_define.APLIC_DOMAINS_CFG (indexed by domain index)."""
+    return [AplicDomain(d["id"], d["ParentID"], d["ChildsIdx"][:d["NrChilds"]],
+                        M_MODE if d["LevelMode"] == DOMAIN_IN_M_MODE else S_MODE, d["Addr"]) for d in cfg]
+
+def delegation_path(domains, d):
+    """[(domain, child index)] the root walks to delegate a source to domain d."""
+    path = []
+    while domains[d].parent >= 0:
+        parent = domains[d].parent
+        path.append((parent, domains[parent].childs.index(d)))
+        d = parent
+    return path[::-1]
+
+def depth(domains, d):
+    return len(delegation_path(domains, d))
+
+DEFAULT_DOMAINS = domains_from_cfg(APLIC_DOMAINS_CFG)
+
+def _lowest(bits):
+    return (bits & -bits).bit_length() - 1
+
+class AplicModel:
+    """Reference model of the APLIC register file.
+
+    Per-source state (pending, enable, active, ownership, target hart,
+    priority bucket) is kept as integer bitsets indexed by source number, so
+    every register access costs a handful of big-int operations no matter
+    how many sources or harts are configured. Writes take effect immediately,
+    the model is the settled view of the DUT: topi/claimi only match once the
+    notifier pipeline caught up (TOPI_UPDATE_CYCLES after the last write).
+    An access only recomputes the topi of the (domain, hart) pairs of the
+    sources it changed.
+
+    In MSI mode every pending, enabled and active source of a domain with IE
+    set is forwarded right away, highest source first like the notifier loop,
+    and recorded in forwarded as (source, hart, file, eiid).
+    """
+
+    def __init__(self, nr_sources=APLIC_NR_SRC, nr_harts=APLIC_NR_HARTS, delivery_mode=AIA_MODE, domains=None):
+        self.nr_sources = nr_sources
+        self.nr_harts = nr_harts
+        self.nr_reg = (nr_sources - 1) // 32
+        self.delivery_mode = delivery_mode
+        self.domains = DEFAULT_DOMAINS if domains is None else domains
+        bases = [domain.addr for domain in self.domains]
+        if (bases, nr_sources, nr_harts) == (REGMAP.domain_bases, REGMAP.nr_sources, REGMAP.nr_harts):
+            # the bench configuration, its decode tables are only built once
+            self.regmap = REGMAP
+        else:
+            self.regmap = RegMap(bases, nr_sources, nr_harts)
+        self.reset()
+
+    def reset(self):
+        nr_domains = len(self.domains)
+        self.all_sources = ((1 << self.nr_sources) - 1) & ~1
+        # Sources owned by each domain (intp_domain), all start in the root
+        self.owned = [0] * nr_domains
+        self.owned[0] = self.all_sources
+        self.owner = [0] * self.nr_sources
+        self.sm = [INACTIVE] * self.nr_sources
+        self.target = [0] * self.nr_sources
+        self.active = 0
+        self.pending = 0
+        self.enabled = 0
+        # Source mode classes, used by the gateway rules
+        self.edge = 0
+        self.level = 0
+        self.inverted = 0
+        self.rectified = 0
+        # Sources targeting each hart and each priority (DIRECT mode)
+        self.by_hart = [0] * self.nr_harts
+        self.by_prio = {}
+        # NumPy copies of target and owner for take_msis(), None when stale
+        self._targets = None
+        # the by_prio keys in ascending order, the notifier scans them in order
+        self.prios = []
+        self.domaincfg_ie = [0] * nr_domains
+        self.domaincfg_dm = [0] * nr_domains
+        self.idelivery = [[0] * self.nr_harts for _ in range(nr_domains)]
+        self.iforce = [[0] * self.nr_harts for _ in range(nr_domains)]
+        self.ithreshold = [[0] * self.nr_harts for _ in range(nr_domains)]
+        self.topi_q = [[0] * self.nr_harts for _ in range(nr_domains)]
+        self.forwarded = []
+
+    # ---------------------------------------------------------------
+    # Address decode
+    # ---------------------------------------------------------------
+    def decode(self, addr):
+        """Return the regdesc RegRef (reg, domain, index) of addr, None if unmapped."""
+        return self.regmap.decode(addr)
+
+    # ---------------------------------------------------------------
+    # Helpers
+    # ---------------------------------------------------------------
+    def _set_bit(self, name, src, val):
+        bit = 1 << src
+        setattr(self, name, (getattr(self, name) | bit) if val else (getattr(self, name) & ~bit))
+
+    def _word(self, bits, reg):
+        return (bits >> (32 * reg)) & 0xFFFFFFFF
+
+    def _is_msi(self):
+        return self.delivery_mode == DOMAIN_IN_MSI_MODE
+
+    def _set_pending(self, bits):
+        # LEVEL sources only pend from the wire (DM0 follows the level,
+        # DM1 needs a new edge), DETACHED and EDGE honour register pends
+        self.pending |= bits & self.active & ~self.level
+
+    def _set_source_mode(self, src, sm):
+        self.sm[src] = sm
+        self._set_bit("active", src, sm != INACTIVE)
+        self._set_bit("edge", src, sm in (EDGE1, EDGE0))
+        self._set_bit("level", src, sm in (LEVEL1, LEVEL0))
+        self._set_bit("inverted", src, sm in (EDGE0, LEVEL0))
+        if sm == INACTIVE:
+            # setie/pending are masked with active
+            self._set_bit("pending", src, 0)
+            self._set_bit("enabled", src, 0)
+
+    def _set_target(self, src, value):
+        old = self.target[src]
+        old_hi = (old >> TARGET_HI_OFF) & TARGET_HI_MASK
+        if old_hi < self.nr_harts:
+            self.by_hart[old_hi] &= ~(1 << src)
+        old_prio = old & TARGET_IPRIO_MASK
+        if old_prio in self.by_prio:
+            self.by_prio[old_prio] &= ~(1 << src)
+
+        self.target[src] = value
+        self._targets = None
+        hi = (value >> TARGET_HI_OFF) & TARGET_HI_MASK
+        if hi < self.nr_harts:
+            self.by_hart[hi] |= (1 << src)
+        if not self._is_msi():
+            prio = value & TARGET_IPRIO_MASK
+            if prio not in self.by_prio:
+                self.by_prio[prio] = 0
+                insort(self.prios, prio)
+            self.by_prio[prio] |= (1 << src)
+
+    def _child_index(self, domain, child):
+        for ci, idx in enumerate(self.domains[domain].childs):
+            if idx == child:
+                return ci
+        return 0
+
+    # ---------------------------------------------------------------
+    # DIRECT delivery: notifier and IDC
+    # ---------------------------------------------------------------
+    def candidate(self, domain, hart):
+        """Interrupt the notifier selects for (domain, hart) as claimi_t, 0 if none.
+
+        Lowest priority number wins, ties go to the lowest source id, and the
+        candidate is dropped when it does not beat a non-zero ithreshold.
+        """
+        cand = self.pending & self.enabled & self.owned[domain] & self.by_hart[hart]
+        if cand == 0:
+            return 0
+        for prio in self.prios:
+            bits = cand & self.by_prio[prio]
+            if bits:
+                thr = self.ithreshold[domain][hart]
+                if thr == 0 or prio < thr:
+                    return (_lowest(bits) << CLAIMI_IID_OFF) | prio
+                return 0
+        return 0
+
+    def _pairs(self, sources):
+        """(domain, hart) pairs whose candidate depends on the sources bitset."""
+        pairs = set()
+        for d, owned in enumerate(self.owned):
+            mine = owned & sources
+            if mine:
+                pairs.update((d, h) for h, bits in enumerate(self.by_hart) if bits & mine)
+        return pairs
+
+    def _settle(self, changed=0, pairs=(), claimed=()):
+        """Propagate a state change: MSI forwarding or DIRECT topi update.
+
+        changed holds the sources whose pending, enable, owner or target
+        moved; only their (domain, hart) pairs, pairs and claimed are
+        recomputed, every other candidate is unchanged.
+        """
+        if self._is_msi():
+            self._forward()
+            return
+        for d, h in self._pairs(changed).union(pairs, claimed):
+            topi = self.candidate(d, h)
+            # topi_q only moves to 0 in the cycles that follow a claim
+            if topi != 0 or (d, h) in claimed:
+                self.topi_q[d][h] = topi
+
+    def topi(self, domain, hart):
+        return self.topi_q[domain][hart]
+
+    def eintp_cpu(self, domain, hart):
+        """Expected o_eintp_cpu[domain][hart]."""
+        return int(bool(self.domaincfg_ie[domain] and self.idelivery[domain][hart] and
+                        (self.candidate(domain, hart) != 0 or self.iforce[domain][hart])))
+
+    def _claim(self, domain, hart):
+        topi = self.topi_q[domain][hart]
+        pending = self.pending
+        if topi == 0:
+            self.iforce[domain][hart] = 0
+        else:
+            src = topi >> CLAIMI_IID_OFF
+            # A level source in a DM0 domain follows its level and stays pending
+            if not ((self.level >> src) & 1) or self.domaincfg_dm[self.owner[src]]:
+                self._set_bit("pending", src, 0)
+        self._settle(pending ^ self.pending, claimed=((domain, hart),))
+        return topi
+
+    def claim_all(self, domain, hart):
+        """Claim every interrupt of (domain, hart) at once, return their claimi values in order (DIRECT mode).
+
+        The values a loop of claimi reads returns until topi drops to 0,
+        from one walk over the priority bitsets and one settle. A level
+        source of a DM0 domain stays pending, it is claimed once here where
+        the loop would claim it forever.
+        """
+        cand = self.pending & self.enabled & self.owned[domain] & self.by_hart[hart]
+        thr = self.ithreshold[domain][hart]
+        claimed = []
+        cleared = 0
+        for prio in self.prios:
+            if not cand:
+                break
+            if thr != 0 and prio >= thr:
+                break
+            bits = cand & self.by_prio[prio]
+            cand &= ~bits
+            cleared |= bits
+            while bits:
+                low = bits & -bits
+                claimed.append(((low.bit_length() - 1) << CLAIMI_IID_OFF) | prio)
+                bits ^= low
+        if not claimed:
+            return claimed
+        stays = self.level if not self.domaincfg_dm[domain] else 0
+        pending = self.pending
+        self.pending &= ~(cleared & ~stays)
+        self._settle(pending ^ self.pending, claimed=((domain, hart),))
+        return claimed
+
+    # ---------------------------------------------------------------
+    # MSI delivery
+    # ---------------------------------------------------------------
+    def _forward(self):
+        ie_domains = 0
+        for d, owned in enumerate(self.owned):
+            if self.domaincfg_ie[d]:
+                ie_domains |= owned
+        cand = self.pending & self.enabled & self.active & ie_domains
+        while cand:
+            src = cand.bit_length() - 1
+            cand &= ~(1 << src)
+            target = self.target[src]
+            hart = (target >> TARGET_HI_OFF) & TARGET_HI_MASK
+            file = 0 if self.owner[src] == 0 else 1 + ((target >> TARGET_GI_OFF) & TARGET_GI_MASK)
+            self.forwarded.append((src, hart, file, target & TARGET_EIID_MASK))
+            self.pending &= ~(1 << src)
+
+    # ---------------------------------------------------------------
+    # Wired sources
+    # ---------------------------------------------------------------
+    def drive_sources(self, value):
+        """Apply a new i_sources value through the gateway rules."""
+        pending = self.pending
+        self._gateway(value)
+        self._settle(pending ^ self.pending)
+
+    def pulse_sources(self, value):
+        """Raise then lower the sources of value.
+
+        In MSI mode the MSIs are left for take_msis(): every domain is DM1,
+        so forwarding between the two edges or after both makes no
+        difference. In DIRECT mode it is drive_sources(value),
+        drive_sources(0), the interrupts are left for claim_all().
+        """
+        if not self._is_msi():
+            self.drive_sources(value)
+            self.drive_sources(0)
+            return
+        self._gateway(value)
+        self._gateway(0)
+
+    def take_msis(self):
+        """Forward every pending, enabled source at once: (source, hart, file, eiid) arrays.
+
+        Same MSIs as _forward(), in the same order (highest source first),
+        without a Python step per source when NumPy is there.
+        """
+        if np is None:
+            self._forward()
+            msis = list(zip(*self.forwarded)) or [(), (), (), ()]
+            del self.forwarded[:]
+            return tuple(list(column) for column in msis)
+        ie_domains = 0
+        for d, owned in enumerate(self.owned):
+            if self.domaincfg_ie[d]:
+                ie_domains |= owned
+        cand = self.pending & self.enabled & self.active & ie_domains
+        self.pending &= ~cand
+        raw = np.frombuffer(cand.to_bytes((self.nr_sources + 7) // 8, "little"), dtype=np.uint8)
+        src = np.flatnonzero(np.unpackbits(raw, bitorder="little"))[::-1]
+        if self._targets is None:
+            self._targets = np.array(self.target, dtype=np.int64)
+            self._owners = np.array(self.owner, dtype=np.int64)
+        target = self._targets[src]
+        hart = (target >> TARGET_HI_OFF) & TARGET_HI_MASK
+        file = np.where(self._owners[src] == 0, 0, 1 + ((target >> TARGET_GI_OFF) & TARGET_GI_MASK))
+        return src, hart, file, target & TARGET_EIID_MASK
+
+    def _gateway(self, value):
+        rectified = ((value ^ self.inverted) & (self.edge | self.level)) & self.all_sources
+        new = rectified & ~self.rectified
+        level_dm0 = 0
+        level_dm1 = 0
+        for d, owned in enumerate(self.owned):
+            if self.domaincfg_dm[d]:
+                level_dm1 |= owned & self.level
+            else:
+                level_dm0 |= owned & self.level
+        self.pending |= new & (self.edge | level_dm1)
+        self.pending = (self.pending & ~level_dm0) | (rectified & level_dm0)
+        self.rectified = rectified
+
+    # ---------------------------------------------------------------
+    # Bus accesses
+    # ---------------------------------------------------------------
+    def write(self, addr, data):
+        ref = self.decode(addr)
+        if ref is None:
+            return
+        name, d, i = ref.reg.name, ref.domain, ref.index
+        # setip/in_clrip/setie/clrie word i, masked with the domain's sources
+        word = ((data & 0xFFFFFFFF) << (32 * i)) & self.owned[d] if i is not None else 0
+        pending, enabled = self.pending, self.enabled
+        changed = 0
+        pairs = ()
+        if name in ("sourcecfg", "target"):
+            # the source may leave its (domain, hart) pair, recompute that one too
+            changed = 1 << i
+            if not self._is_msi():
+                pairs = self._pairs(changed)
+        elif name == "ithreshold":
+            pairs = ((d, i),)
+
+        if name == "domaincfg":
+            self.domaincfg_ie[d] = (data >> DOMAINCFG_IE_OFF) & 1
+            self.domaincfg_dm[d] = self.delivery_mode
+        elif name == "sourcecfg":
+            self._write_sourcecfg(d, i, data)
+        elif name == "setip":
+            self._set_pending(word)
+        elif name == "setipnum":
+            if 0 < data < self.nr_sources:
+                self._set_pending(1 << data)
+        elif name == "in_clrip":
+            self.pending &= ~word
+        elif name == "clripnum":
+            if 0 < data < self.nr_sources:
+                self._set_bit("pending", data, 0)
+        elif name == "setie":
+            self.enabled |= word & self.active
+        elif name == "setienum":
+            if 0 < data < self.nr_sources:
+                self.enabled |= (1 << data) & self.active
+        elif name == "clrie":
+            self.enabled &= ~word
+        elif name == "clrienum":
+            if 0 < data < self.nr_sources:
+                self._set_bit("enabled", data, 0)
+        elif name == "target":
+            self._write_target(d, i, data)
+        elif not self._is_msi():
+            if name == "idelivery":
+                self.idelivery[d][i] = data & 1
+            elif name == "iforce":
+                self.iforce[d][i] = data & 1
+            elif name == "ithreshold":
+                self.ithreshold[d][i] = data & 0xFF
+
+        self._settle(changed | (pending ^ self.pending) | (enabled ^ self.enabled), pairs)
+
+    def _write_sourcecfg(self, d, src, data):
+        if self.owner[src] == d:
+            if (data >> 10) & 1:
+                if self.domains[d].childs:
+                    # Delegate, the stored sourcecfg is left untouched
+                    ci = data & 0x3FF
+                    child = self.domains[d].childs[ci] if ci < len(self.domains[d].childs) else 0
+                    self.owned[d] &= ~(1 << src)
+                    self.owned[child] |= (1 << src)
+                    self.owner[src] = child
+                    self._targets = None
+                else:
+                    # D=1 on a leaf domain clears the register
+                    self._set_source_mode(src, INACTIVE)
+            else:
+                sm = data & 0x7
+                self._set_source_mode(src, sm if sm in VALID_SM else INACTIVE)
+        elif self.domains[self.owner[src]].parent == d:
+            # The parent takes the source back, sourcecfg restarts at zero
+            self.owned[self.owner[src]] &= ~(1 << src)
+            self.owned[d] |= (1 << src)
+            self.owner[src] = d
+            self._targets = None
+            self._set_source_mode(src, INACTIVE)
+
+    def _write_target(self, d, src, data):
+        if self.owner[src] != d or not ((self.active >> src) & 1):
+            return
+        value = data & (TARGET_HI_MASK << TARGET_HI_OFF)
+        if self._is_msi():
+            value |= data & ((TARGET_GI_MASK << TARGET_GI_OFF) | TARGET_EIID_MASK)
+        else:
+            prio = data & TARGET_IPRIO_MASK
+            value |= prio if prio != 0 else 1
+        self._set_target(src, value)
+
+    def peek(self, addr):
+        """Expected read data for addr without side effects, None if not modelled."""
+        ref = self.decode(addr)
+        if ref is None:
+            return None
+        name, d, i = ref.reg.name, ref.domain, ref.index
+
+        if name == "domaincfg":
+            return DOMAINCFG_RO80 | (self.domaincfg_ie[d] << DOMAINCFG_IE_OFF) | (self.domaincfg_dm[d] << DOMAINCFG_DM_OFF)
+        if name == "sourcecfg":
+            if self.owner[i] == d:
+                return self.sm[i]
+            if self.domains[self.owner[i]].parent == d:
+                return DELEGATE_SRC | self._child_index(d, self.owner[i])
+            return 0
+        if name == "setip":
+            return self._word(self.pending & self.owned[d], i)
+        if name == "setie":
+            return self._word(self.enabled & self.owned[d], i)
+        if name in ("setipnum", "clripnum", "setienum", "clrienum", "clrie"):
+            return 0
+        if name == "target":
+            return self.target[i] if self.owner[i] == d else 0
+        if not self._is_msi():
+            if name == "idelivery":
+                return self.idelivery[d][i]
+            if name == "iforce":
+                return self.iforce[d][i]
+            if name == "ithreshold":
+                return self.ithreshold[d][i]
+            if name in ("topi", "claimi"):
+                return self.topi_q[d][i]
+        # in_clrip, msiaddrcfg, setipnum_le/be and genmsi are not modelled
+        return None
+
+    def read(self, addr):
+        """Expected read data for addr, applying the claimi side effect."""
+        expected = self.peek(addr)
+        ref = self.decode(addr)
+        if ref is not None and ref.reg.name == "claimi" and not self._is_msi():
+            self._claim(ref.domain, ref.index)
+        return expected
+
+class AplicScoreboard:
+    """Mirror every RegIntfMaster access into an AplicModel and compare reads.
+
+    Register it with bus.listeners.append(scoreboard). Mismatches are kept as
+    (addr, expected, actual) in mismatches, logged as errors and passed to
+    every callback in on_mismatch (e.g. WaveWindow.trigger). With a Checker
+    every compared read is also recorded there as a check.
+    """
+
+    def __init__(self, model, log=None, checker=None):
+        self.model = model
+        self.log = log
+        self.checker = checker
+        self.checks = 0
+        self.mismatches = []
+        self.on_mismatch = []
+
+    def __call__(self, addr, write, data, rdata):
+        if write:
+            self.model.write(addr, data)
+            return
+
+        expected = self.model.read(addr)
+        if expected is None:
+            return
+        self.checks += 1
+        if self.checker is not None:
+            self.checker.check(self.model.regmap.name(addr), expected, rdata)
+        if expected != rdata:
+            self.mismatches.append((addr, expected, rdata))
+            if self.log is not None:
+                regmap = self.model.regmap
+                self.log.error(f"scoreboard: read of {regmap.name(addr)} returned {regmap.format(addr, rdata)}, "
+                               f"model expects {regmap.format(addr, expected)}")
+            for callback in self.on_mismatch:
+                callback(addr, expected, rdata)
@@ -0,0 +1,51 @@
+"""
+Wall-clock benchmark of the integration bench with the two clock drivers.
+
+    python - i_clk toggled by a cocotb coroutine (one Python wake-up per edge)
+    native - i_clk toggled by tb_clock.sv inside the simulator
+
+Each variant is built once (not timed) and then simulated --runs times.
+Usage: python3 bench_clock.py [--runs N]
+"""
+import argparse
+import statistics
+import subprocess
+import time
+import xml.etree.ElementTree as ET
+
+CLOCKS = ["python", "native"]
+
+def run_bench(clock):
+    start = time.perf_counter()
+    subprocess.run(["make", "-f", "run.mk", f"CLOCK={clock}", "runme"], check=True,
+                   stdout=subprocess.DEVNULL)
+    wall = time.perf_counter() - start
+
+    sim_time_ns = 0.0
+    for testcase in ET.parse("results.xml").iter("testcase"):
+        sim_time_ns += float(testcase.get("sim_time_ns", 0))
+
+    return wall, sim_time_ns
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="number of timed simulations per clock driver")
+    args = parser.parse_args()
+
+    results = {}
+    for clock in CLOCKS:
+        # First run builds the simulator, keep it out of the measurements
+        run_bench(clock)
+        walls = []
+        for _ in range(args.runs):
+            wall, sim_time_ns = run_bench(clock)
+            walls.append(wall)
+        results[clock] = (statistics.median(walls), min(walls), sim_time_ns)
+
+    print(f"{'clock':<8} {'median [s]':>12} {'min [s]':>10} {'sim time [ns]':>14} {'ns/s':>12}")
+    for clock, (median, best, sim_time_ns) in results.items():
+        print(f"{clock:<8} {median:>12.3f} {best:>10.3f} {sim_time_ns:>14.0f} {sim_time_ns/median:>12.0f}")
+    print(f"speedup (python/native): {results['python'][0]/results['native'][0]:.2f}x")
+
+if __name__ == "__main__":
+    main()
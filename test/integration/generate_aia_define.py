@@ -1,204 +1,177 @@
-import re
+"""
+Generate aia_define.py/aia_define.mk from aia_pkg.sv.
+
+Every localparam of the package is evaluated in one pass, in file order, so
+parameters derived from others (UserAplicMode = DOMAIN_IN_MSI_MODE,
+UserNrHarts*2, $clog2(...)) resolve like in the RTL. Constant expressions
+are evaluated by ../common/sv_params.py.
+
+aplic_domain_pkg.sv (imported by aia_pkg.sv) is evaluated first and
+aplic_pkg.sv last, for the root domain: APLIC_DOMAINS_CFG in aia_define.py
+is the whole domain table indexed by domain index, root first, like
+AplicCfg.DomainsCfg in the RTL.
+
+Both outputs are written to temporary files and renamed into place, and both
+carry the sha256 of the packages and of the generator: when none changed the
+files are left untouched (and keep their mtime), use --force to regenerate.
+"""
+import argparse
+import hashlib
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "common"))
+import sv_params
+from sv_params import RTL_PACKAGE, parse_package
+
+DOMAIN_PKG = os.path.join(RTL_PACKAGE, "aplic_domain_pkg.sv")
+APLIC_PKG = os.path.join(RTL_PACKAGE, "aplic_pkg.sv")
 
 class CAiaDefines:
-    def __init__(self, 
-                 domain_direct_value,
-                 domain_msi_value,
-                 user_aplic_mode,
-                 aplic_nr_sources,
-                 aplic_nr_harts,
-                 aplic_nr_domains,
-                 aplic_min_prio,
-                 riscv_xlen,
-                 imsic_nr_sources,
-                 imsic_nr_harts,
-                 imsic_nr_vs_files,
-                 aia_type,
-                 aia_distributed,
-                 aia_embedded):
-        self.domain_direct_value = domain_direct_value
-        self.domain_msi_value = domain_msi_value
-        self.user_aplic_mode = user_aplic_mode
-        self.aplic_nr_sources = aplic_nr_sources
-        self.aplic_nr_harts = aplic_nr_harts
-        self.aplic_nr_domains = aplic_nr_domains
-        self.aplic_min_prio = aplic_min_prio
-        self.riscv_xlen = riscv_xlen
-        self.imsic_nr_sources = imsic_nr_sources
-        self.imsic_nr_harts = imsic_nr_harts
-        self.imsic_nr_vs_files = imsic_nr_vs_files
-        self.aia_type = aia_type
-        self.aia_distributed = aia_distributed
-        self.aia_embedded = aia_embedded
-
-def parse_aplic_mode(file_content):
-
-    # Define the regex patterns for the User variables and the DOMAIN modes
-    aplic_nr_sources_pattern = re.compile(r'\s*localparam\s+UserNrSources\s+=\s+(\w+);')
-    aplic_nr_harts_pattern = re.compile(r'\s*localparam\s+UserNrHarts\s+=\s+(\w+);')
-    aplic_nr_domains_pattern = re.compile(r'\s*localparam\s+UserNrDomains\s+=\s+(\w+);')
-    aplic_min_prio_pattern = re.compile(r'\s*localparam\s+UserMinPrio\s+=\s+(\w+);')
-    aplic_mode_pattern = re.compile(r'\s*localparam\s+UserAplicMode\s+=\s+(\w+);')
-    domain_direct_pattern = re.compile(r'\s*localparam\s+DOMAIN_IN_DIRECT_MODE\s+=\s+(\d+);')
-    domain_msi_pattern = re.compile(r'\s*localparam\s+DOMAIN_IN_MSI_MODE\s+=\s+(\d+);')
-    
-    riscv_xlen_pattern = re.compile(r'\s*localparam\s+UserXLEN\s+=\s+(\w+);')
-    imsic_nr_sources_pattern = re.compile(r'\s*localparam\s+UserNrSourcesImsic\s+=\s+(\w+);')
-    imsic_nr_harts_pattern = re.compile(r'\s*localparam\s+UserNrHartsImsic\s+=\s+(\w+);')
-    imsic_nr_vs_files_pattern = re.compile(r'\s*localparam\s+UserNrVSIntpFiles\s+=\s+(\w+);')
-
-    aia_type_pattern = re.compile(r'\s*localparam\s+UserAiaType\s+=\s+(\w+);')
-    aia_distributed_pattern = re.compile(r'\s*localparam\s+AIA_DISTRIBUTED\s+=\s+(\d+);')
-    aia_embedded_pattern = re.compile(r'\s*localparam\s+AIA_EMBEDDED\s+=\s+(\d+);')
-
-    # Initialize variables
-    domain_direct_value = None
-    domain_msi_value = None
-    user_aplic_mode = None
-    aplic_nr_sources = None
-    aplic_nr_harts = None
-    aplic_nr_domains = None
-    aplic_min_prio = None
-    riscv_xlen = None
-    imsic_nr_sources = None
-    imsic_nr_harts = None
-    imsic_nr_vs_files = None
-    aia_type = None
-    aia_distributed = None
-    aia_embedded = None
-
-    # Search the file content for the patterns
-    for line in file_content:
-        if domain_direct_value is None:
-            match = domain_direct_pattern.match(line)
-            if match:
-                domain_direct_value = int(match.group(1))
-        if domain_msi_value is None:
-            match = domain_msi_pattern.match(line)
-            if match:
-                domain_msi_value = int(match.group(1))
-        if user_aplic_mode is None:
-            match = aplic_mode_pattern.match(line)
-            if match:
-                user_aplic_mode = match.group(1)
-        if aplic_nr_sources is None:
-            match = aplic_nr_sources_pattern.match(line)
-            if match:
-                aplic_nr_sources = match.group(1)
-        if aplic_nr_harts is None:
-            match = aplic_nr_harts_pattern.match(line)
-            if match:
-                aplic_nr_harts = match.group(1)
-        if aplic_nr_domains is None:
-            match = aplic_nr_domains_pattern.match(line)
-            if match:
-                aplic_nr_domains = match.group(1)
-        if aplic_min_prio is None:
-            match = aplic_min_prio_pattern.match(line)
-            if match:
-                aplic_min_prio = match.group(1)
-        if riscv_xlen is None:
-            match = riscv_xlen_pattern.match(line)
-            if match:
-                riscv_xlen = match.group(1)
-        if imsic_nr_sources is None:
-            match = imsic_nr_sources_pattern.match(line)
-            if match:
-                imsic_nr_sources = match.group(1)
-        if imsic_nr_harts is None:
-            match = imsic_nr_harts_pattern.match(line)
-            if match:
-                imsic_nr_harts = match.group(1)
-        if imsic_nr_vs_files is None:
-            match = imsic_nr_vs_files_pattern.match(line)
-            if match:
-                imsic_nr_vs_files = match.group(1)
-        if aia_type is None:
-            match = aia_type_pattern.match(line)
-            if match:
-                aia_type = match.group(1)
-        if aia_distributed is None:
-            match = aia_distributed_pattern.match(line)
-            if match:
-                aia_distributed = match.group(1)
-        if aia_embedded is None:
-            match = aia_embedded_pattern.match(line)
-            if match:
-                aia_embedded = match.group(1)
-
-    return CAiaDefines(domain_direct_value,
-                       domain_msi_value,
-                       user_aplic_mode,
-                       aplic_nr_sources,
-                       aplic_nr_harts,
-                       aplic_nr_domains,
-                       aplic_min_prio,
-                       riscv_xlen,
-                       imsic_nr_sources,
-                       imsic_nr_harts,
-                       imsic_nr_vs_files,
-                       aia_type,
-                       aia_distributed,
-                       aia_embedded)
+    def __init__(self, params):
+        self.params = params
+        self.domain_direct_value = params["DOMAIN_IN_DIRECT_MODE"]
+        self.domain_msi_value = params["DOMAIN_IN_MSI_MODE"]
+        self.user_aplic_mode = params["UserAplicMode"]
+        self.aplic_nr_sources = params["UserNrSources"]
+        self.aplic_nr_harts = params["UserNrHarts"]
+        self.aplic_nr_domains = params["UserNrDomains"]
+        self.aplic_min_prio = params["UserMinPrio"]
+        self.riscv_xlen = params["UserXLEN"]
+        self.imsic_nr_sources = params["UserNrSourcesImsic"]
+        self.imsic_nr_harts = params["UserNrHartsImsic"]
+        self.imsic_nr_vs_files = params["UserNrVSIntpFiles"]
+        self.aia_type = params["UserAiaType"]
+        self.aia_distributed = params["AIA_DISTRIBUTED"]
+        self.aia_embedded = params["AIA_EMBEDDED"]
+        self.domains_cfg = domain_table(params)
+
+REQUIRED = ["DOMAIN_IN_DIRECT_MODE", "DOMAIN_IN_MSI_MODE", "UserAplicMode", "UserNrSources", "UserNrHarts",
+            "UserNrDomains", "UserMinPrio", "UserXLEN", "UserNrSourcesImsic", "UserNrHartsImsic",
+            "UserNrVSIntpFiles", "UserAiaType", "AIA_DISTRIBUTED", "AIA_EMBEDDED"]
+
+def domain_table(params):
+    """Root domain plus UserDomainsCfg, indexed by domain index.
+
+    An unpacked '{a, b} fills the highest index first, so both the domain
+    list and every ChildsIdx list are reversed; '{default: x} is expanded to
+    NrChildsMax entries.
+    """
+    table = []
+    for cfg in [params["AplicRootDomain"]] + list(reversed(params.get("UserDomainsCfg", []))):
+        childs = cfg["ChildsIdx"]
+        if isinstance(childs, dict):
+            childs = [childs.get("default", 0)] * params.get("NrChildsMax", 2)
+        else:
+            childs = list(reversed(childs))
+        table.append(dict(cfg, ChildsIdx=childs))
+    return table
+
+def parse_aplic_mode(file_content, domain_pkg_content="", aplic_pkg_content=""):
+    params = parse_package(file_content, parse_package(domain_pkg_content))
+    # aplic_pkg.sv imports aia_pkg, only the root domain is taken from it
+    aplic_params = parse_package(aplic_pkg_content, params)
+    if "AplicRootDomain" in aplic_params:
+        params["AplicRootDomain"] = aplic_params["AplicRootDomain"]
+    missing = [name for name in REQUIRED + ["AplicRootDomain"] if name not in params]
+    if missing:
+        raise ValueError(f"could not evaluate {', '.join(missing)}")
+    return CAiaDefines(params)
 
 def determine_irqc_type (aia_type, aia_distributed, aia_embedded):
-    if aia_type == 'AIA_DISTRIBUTED':
+    if aia_type == aia_distributed:
         return aia_distributed
-    elif aia_type == 'AIA_EMBEDDED':
+    elif aia_type == aia_embedded:
         return aia_embedded
     else:
         raise ValueError("Unknown UserAiaType value")
 
 def determine_irqc_mode(user_aplic_mode, domain_direct_value, domain_msi_value):
-    if user_aplic_mode == 'DOMAIN_IN_DIRECT_MODE':
+    if user_aplic_mode == domain_direct_value:
         return domain_direct_value
-    elif user_aplic_mode == 'DOMAIN_IN_MSI_MODE':
+    elif user_aplic_mode == domain_msi_value:
         return domain_msi_value
     else:
         raise ValueError("Unknown UserAplicMode value")
 
-def write_to_file (file_name, macro, write_mode, varible):
-    with open(file_name, write_mode) as f:
-        f.write(f"{macro} = {varible}\n")
-
-
-def main():
-    # Read the content of the file
-    with open("../../rtl/package/aia_pkg.sv", 'r') as f:
-        file_content = f.readlines()
-
-    # Parse the UserAplicMode and domain values
-    aia_variables = parse_aplic_mode(file_content)
-
-    # Determine the IRQC_MODE based on UserAplicMode
+def render(aia_variables, stamp):
+    """Return the (aia_define.py, aia_define.mk) contents."""
     irqc_mode = determine_irqc_mode(aia_variables.user_aplic_mode, aia_variables.domain_direct_value, aia_variables.domain_msi_value)
-    
     irqc_type = determine_irqc_type(aia_variables.aia_type, aia_variables.aia_distributed, aia_variables.aia_embedded)
+    mode = "direct" if irqc_mode == aia_variables.domain_direct_value else "msi"
+    type = "distributed" if irqc_type == aia_variables.aia_distributed else "embedded"
+
+    define_py = [
+        f"# {stamp}",
+        f"AIA_MODE = {irqc_mode}",
+        f"APLIC_NR_SRC = {aia_variables.aplic_nr_sources}",
+        f"APLIC_NR_HARTS = {aia_variables.aplic_nr_harts}",
+        f"APLIC_NR_DOMAINS = {aia_variables.aplic_nr_domains}",
+        f"APLIC_MIN_PRIO = {aia_variables.aplic_min_prio}",
+        f"RISCV_XLEN = {aia_variables.riscv_xlen}",
+        f"IMSIC_NR_SRC = {aia_variables.imsic_nr_sources}",
+        f"IMSIC_NR_HARTS = {aia_variables.imsic_nr_harts}",
+        f"IMSIC_NR_VS_FILES = {aia_variables.imsic_nr_vs_files}",
+        # AplicCfg.DomainsCfg, indexed by domain index
+        f"APLIC_DOMAINS_CFG = {aia_variables.domains_cfg!r}",
+    ]
+    define_mk = [
+        f"# {stamp}",
+        f"AIA_MODE = {mode}",
+        f"AIA_TYPE = {type}",
+    ]
+    return "\n".join(define_py) + "\n", "\n".join(define_mk) + "\n"
+
+def source_stamp(*texts):
+    scripts = []
+    for path in (__file__, sv_params.__file__):
+        with open(path, "rb") as f:
+            scripts.append(f.read())
+    digest = hashlib.sha256(b"\0".join([t.encode() for t in texts] + scripts)).hexdigest()
+    return f"generated by generate_aia_define.py, sha256 {digest}"
+
+def up_to_date(paths, stamp):
+    for path in paths:
+        try:
+            with open(path) as f:
+                if f.readline().rstrip("\n") != f"# {stamp}":
+                    return False
+        except OSError:
+            return False
+    return True
+
+def write_atomic(path, content):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(content)
+    os.replace(tmp, path)
 
-    # Write the IRQC_TYPE to aia_define.py
-    write_to_file ('aia_define.py', "AIA_MODE", 'w', irqc_mode)
-
-    if (irqc_mode == aia_variables.domain_direct_value):
-        mode = "direct"
-    elif (irqc_mode == aia_variables.domain_msi_value):
-        mode = "msi"
-    write_to_file ('aia_define.mk', "AIA_MODE", 'w', mode)
-    
-    if (irqc_type == aia_variables.aia_distributed):
-        type = "distributed"
-    elif (irqc_type == aia_variables.aia_embedded):
-        type = "embedded"
-    write_to_file ('aia_define.mk', "AIA_TYPE", 'a', type)
-
-    write_to_file ('aia_define.py', "APLIC_NR_SRC", 'a', aia_variables.aplic_nr_sources)
-    write_to_file ('aia_define.py', "APLIC_NR_HARTS", 'a', aia_variables.aplic_nr_harts)
-    write_to_file ('aia_define.py', "APLIC_NR_DOMAINS", 'a', aia_variables.aplic_nr_domains)
-    write_to_file ('aia_define.py', "APLIC_MIN_PRIO", 'a', aia_variables.aplic_min_prio)
-    write_to_file ('aia_define.py', "RISCV_XLEN", 'a', aia_variables.riscv_xlen)
-    write_to_file ('aia_define.py', "IMSIC_NR_SRC", 'a', aia_variables.imsic_nr_sources)
-    write_to_file ('aia_define.py', "IMSIC_NR_HARTS", 'a', aia_variables.imsic_nr_harts)
-    write_to_file ('aia_define.py', "IMSIC_NR_VS_FILES", 'a', aia_variables.imsic_nr_vs_files)
+def main():
+    parser = argparse.ArgumentParser(description="Generate aia_define.py/aia_define.mk from aia_pkg.sv")
+    parser.add_argument("--pkg", default="../../rtl/package/aia_pkg.sv", help="AIA package to parse")
+    parser.add_argument("--out-dir", default=".", help="where aia_define.py and aia_define.mk are written")
+    parser.add_argument("--domain-pkg", default=DOMAIN_PKG, help="aplic_domain_pkg.sv imported by the AIA package")
+    parser.add_argument("--aplic-pkg", default=APLIC_PKG, help="aplic_pkg.sv with the root domain")
+    parser.add_argument("--force", action="store_true", help="regenerate even if the package did not change")
+    args = parser.parse_args()
+
+    define_py = os.path.join(args.out_dir, 'aia_define.py')
+    define_mk = os.path.join(args.out_dir, 'aia_define.mk')
+
+    texts = []
+    for path in (args.pkg, args.domain_pkg, args.aplic_pkg):
+        with open(path, 'r') as f:
+            texts.append(f.read())
+
+    stamp = source_stamp(*texts)
+    if not args.force and up_to_date([define_py, define_mk], stamp):
+        print(f"{define_py} and {define_mk} are up to date with {args.pkg}")
+        return
+
+    py_content, mk_content = render(parse_aplic_mode(*texts), stamp)
+    # the .py goes last: a run interrupted in between leaves a stale stamp behind
+    write_atomic(define_mk, mk_content)
+    write_atomic(define_py, py_content)
 
 if __name__ == "__main__":
     main()
-
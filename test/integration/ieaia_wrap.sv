@@ -8,7 +8,9 @@ import aplic_pkg::*;
     parameter imsic_cfg_t          ImsicCfg                = DefaultImsicCfg,
     parameter protocol_cfg_t       ProtocolCfg             = DefaultImsicProtocolCfg
 ) (
+    `ifndef TB_CLOCK
     input   logic                                       i_clk                       ,
+    `endif
     input   logic                                       ni_rst                      ,
     input   logic [AplicCfg.NrSources-1:0]              i_sources                   ,
     /** Register config: AXI interface From/To system bus */
@@ -33,12 +35,38 @@ import aplic_pkg::*;
     input  imsic_data_t                                 i_imsic_data                ,
     input  logic                                        i_imsic_we                  ,
     input  logic                                        i_imsic_claim               ,
+    /** Per-hart CSR ports, one independent agent per hart (imsic_csr_agent.py),
+        used for the harts that are not selected through the shared port above */
+    input  logic                                        i_hart_csr_en       [ImsicCfg.NrHarts-1:0],
+    input  logic [1:0]                                  i_hart_priv_lvl     [ImsicCfg.NrHarts-1:0],
+    input  imsic_vgein_t                                i_hart_vgein        [ImsicCfg.NrHarts-1:0],
+    input  logic [31:0]                                 i_hart_imsic_addr   [ImsicCfg.NrHarts-1:0],
+    input  imsic_data_t                                 i_hart_imsic_data   [ImsicCfg.NrHarts-1:0],
+    input  logic                                        i_hart_imsic_we     [ImsicCfg.NrHarts-1:0],
+    input  logic                                        i_hart_imsic_claim  [ImsicCfg.NrHarts-1:0],
+    output imsic_data_t                                 o_hart_imsic_data   [ImsicCfg.NrHarts-1:0],
     output imsic_ipnum_t [ImsicCfg.NrHarts-1:0]         xtopei
     `elsif DIRECT_MODE
     output  logic [AplicCfg.NrHarts-1:0]   o_eintp_cpu  [AplicCfg.NrDomains-1:0]
     `endif
 );
 
+    `ifdef TB_CLOCK
+    /** Clock generated inside the simulator (CLOCK=native) */
+    logic                                       i_clk;
+
+    tb_clock i_tb_clock (
+        .o_clk                  ( i_clk                 )
+    );
+    `endif
+
+    `ifdef TB_WAVE_WINDOW
+    /** Trace window armed from the test (AIA_WAVES=trigger) */
+    tb_wave_window i_tb_wave_window (
+        .i_clk                  ( i_clk                 )
+    );
+    `endif
+
     /** APLIC configuration channel */
     reg_intf::reg_intf_req_a32_d32              i_aplic_confg_req;
     reg_intf::reg_intf_resp_d32                 o_aplic_confg_resp;
@@ -67,12 +95,20 @@ import aplic_pkg::*;
                 in_imsic_csr[i].imsic_we = i_imsic_we;
                 in_imsic_csr[i].imsic_claim = i_imsic_claim;
                 in_imsic_csr[i].priv_lvl = i_priv_lvl;
+            end else if (i_hart_csr_en[i] == 1'b1) begin
+                in_imsic_csr[i].vgein = i_hart_vgein[i];
+                in_imsic_csr[i].imsic_addr = i_hart_imsic_addr[i];
+                in_imsic_csr[i].imsic_data = i_hart_imsic_data[i];
+                in_imsic_csr[i].imsic_we = i_hart_imsic_we[i];
+                in_imsic_csr[i].imsic_claim = i_hart_imsic_claim[i];
+                in_imsic_csr[i].priv_lvl = i_hart_priv_lvl[i];
             end
         end
     end
 
     for (genvar i = 0; i < ImsicCfg.NrHarts; i++) begin
         assign xtopei[i] = out_imsic_csr[i].xtopei;
+        assign o_hart_imsic_data[i] = out_imsic_csr[i].imsic_data;
     end
 
     /** IMSIC island MSI channel */
@@ -0,0 +1,160 @@
+"""
+Per-hart IMSIC CSR agents.
+
+imsic_csr_channel.py drives the one shared CSR port of the wrapper, so only
+one hart can be accessed per cycle. Each ImsicCsrAgent owns the per-hart
+ports of its hart (i_hart_* in ieaia_wrap.sv), so one coroutine per hart can
+read, write and claim in the same cycle as the others. Every access drives
+the port on a falling edge and holds it for exactly one rising edge, so a
+hart can claim on consecutive cycles.
+"""
+import cocotb
+from cocotb.triggers import RisingEdge, FallingEdge, ClockCycles
+from cocotb.utils import get_sim_time
+
+from aia_define import *
+from aia_regmap import M_MODE
+from bus_fields import clog2, unpack_grid
+from imsic_csr_channel import imsic_release
+
+NR_FILES_IMSIC = 2 + IMSIC_NR_VS_FILES
+
+def file_index(priv_lvl, vgein):
+    """xtopei file of a (priv_lvl, vgein) access: 0 M, 1 S, 1+vgein VS."""
+    return 0 if priv_lvl == M_MODE else 1 + vgein
+
+class ImsicCsrAgent:
+    def __init__(self, dut, hart):
+        # harts are 1-based, as in imsic_csr_channel
+        self.dut = dut
+        self.hart = hart
+        idx = hart - 1
+        self.en = dut.i_hart_csr_en[idx]
+        self.priv_lvl = dut.i_hart_priv_lvl[idx]
+        self.vgein = dut.i_hart_vgein[idx]
+        self.addr = dut.i_hart_imsic_addr[idx]
+        self.data = dut.i_hart_imsic_data[idx]
+        self.we = dut.i_hart_imsic_we[idx]
+        self.claim_sig = dut.i_hart_imsic_claim[idx]
+        self.rdata = dut.o_hart_imsic_data[idx]
+        self.claims = 0
+        # claims driven while xtopei kept the claimed id: not serviced
+        self.unanswered = 0
+        self.accesses = 0
+        self._released_at = None
+
+    def xtopei(self, priv_lvl=M_MODE, vgein=0):
+        files = unpack_grid(self.dut.xtopei.value, clog2(IMSIC_NR_SRC), IMSIC_NR_HARTS, NR_FILES_IMSIC)
+        return int(files[self.hart - 1][file_index(priv_lvl, vgein)])
+
+    async def _falling_edge(self):
+        # back-to-back accesses start on the falling edge the previous one ended on
+        if get_sim_time() != self._released_at:
+            await FallingEdge(self.dut.i_clk)
+
+    async def _access(self, addr=0, data=0, we=0, claim=0, priv_lvl=M_MODE, vgein=0):
+        self.priv_lvl.value = priv_lvl
+        self.vgein.value = vgein
+        self.addr.value = addr
+        self.data.value = data
+        self.we.value = we
+        self.claim_sig.value = claim
+        self.en.value = 1
+        await RisingEdge(self.dut.i_clk)
+        rdata = int(self.rdata.value)
+        self.accesses += 1
+        await FallingEdge(self.dut.i_clk)
+        self.we.value = 0
+        self.claim_sig.value = 0
+        self.en.value = 0
+        self._released_at = get_sim_time()
+        return rdata
+
+    async def write(self, addr, data, priv_lvl=M_MODE, vgein=0):
+        await self._falling_edge()
+        await self._access(addr, data, we=1, priv_lvl=priv_lvl, vgein=vgein)
+
+    async def read(self, addr, priv_lvl=M_MODE, vgein=0):
+        await self._falling_edge()
+        return await self._access(addr, priv_lvl=priv_lvl, vgein=vgein)
+
+    async def claim(self, priv_lvl=M_MODE, vgein=0):
+        """Claim the top interrupt of a file, return its id (0 if none or not serviced)."""
+        await self._falling_edge()
+        top = self.xtopei(priv_lvl, vgein)
+        if top == 0:
+            self._released_at = None
+            return 0
+        await self._access(claim=1, priv_lvl=priv_lvl, vgein=vgein)
+        # a serviced claim clears top on the edge that sampled it
+        if self.xtopei(priv_lvl, vgein) == top:
+            self.unanswered += 1
+            return 0
+        self.claims += 1
+        return top
+
+class ClaimStreams:
+    """One claiming coroutine per hart, for throughput and contention.
+
+    Every hart claims its file whenever xtopei is non-zero, waiting service
+    cycles after each claim. on_claim(hart, id, cycle) is called for every
+    claim the IMSIC serviced (xtopei moved off the claimed id); the cycles in which more than one hart claimed are counted as
+    contention.
+    """
+
+    def __init__(self, dut, harts=None, priv_lvl=M_MODE, vgein=0, service=0, on_claim=None):
+        self.dut = dut
+        harts = harts or range(1, IMSIC_NR_HARTS + 1)
+        self.agents = [ImsicCsrAgent(dut, hart) for hart in harts]
+        self.priv_lvl = priv_lvl
+        self.vgein = vgein
+        self.service = service
+        self.on_claim = on_claim
+        self.cycle = 0
+        # cycle -> number of harts that claimed in it
+        self.claims_per_cycle = {}
+        self._tasks = []
+
+    async def _count_cycles(self):
+        while True:
+            await RisingEdge(self.dut.i_clk)
+            self.cycle += 1
+
+    async def _stream(self, agent):
+        while True:
+            top = await agent.claim(self.priv_lvl, self.vgein)
+            if top == 0:
+                continue
+            # the claim edge is the one after the agent drove the port
+            cycle = self.cycle
+            self.claims_per_cycle[cycle] = self.claims_per_cycle.get(cycle, 0) + 1
+            if self.on_claim is not None:
+                self.on_claim(agent.hart, top, cycle)
+            if self.service:
+                await ClockCycles(self.dut.i_clk, self.service)
+
+    def start(self):
+        # a hart still selected on the shared port ignores its own port
+        imsic_release(self.dut)
+        self._tasks = [cocotb.start_soon(self._count_cycles())]
+        self._tasks += [cocotb.start_soon(self._stream(agent)) for agent in self.agents]
+        return self
+
+    def stop(self):
+        for task in self._tasks:
+            task.kill()
+        self._tasks = []
+        for agent in self.agents:
+            agent.en.value = 0
+            agent.claim_sig.value = 0
+
+    def report(self):
+        claims = sum(agent.claims for agent in self.agents)
+        return {
+            "claims": claims,
+            "per_hart": {agent.hart: agent.claims for agent in self.agents},
+            "unanswered": sum(agent.unanswered for agent in self.agents),
+            "claims_per_kcycle": 1000 * claims / max(1, self.cycle),
+            "concurrent_cycles": sum(1 for n in self.claims_per_cycle.values() if n > 1),
+            "max_concurrent": max(self.claims_per_cycle.values(), default=0),
+        }
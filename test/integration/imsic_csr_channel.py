@@ -10,7 +10,19 @@ def imsic_write_reg(dut, imsic=1, addr=0, data=0, priv_lvl=M_MODE, vgein=0):
     dut.i_imsic_we.value = 1
 
 def imsic_stop_write(dut):
+    """End a write or a claim, a held claim would keep claiming every cycle."""
     dut.i_imsic_we.value = 0
+    dut.i_imsic_claim.value = 0
+
+def imsic_release(dut):
+    """End any access and deselect every hart of the shared port.
+
+    The wrapper only honours the per-hart ports (i_hart_csr_en) of the harts
+    i_select_imsic does not select, call it before handing the harts over to
+    ImsicCsrAgent.
+    """
+    imsic_stop_write(dut)
+    dut.i_select_imsic.value = 0
 
 def imsic_write_xtopei(dut, imsic = 1, priv_lvl=M_MODE, vgein=0):
     dut.i_select_imsic.value = (1 << (imsic-1))
@@ -0,0 +1,145 @@
+"""
+Source-to-delivery latency probe.
+
+The probe drives i_sources itself, stamps the cycle every stimulus is
+applied and watches the delivery outputs every cycle until the matching
+interrupt shows up:
+
+    MSI mode     xtopei[hart][file] == source (file 0 M, 1 S, 2+ VS)
+    DIRECT mode  o_eintp_cpu[domain][hart] == 1
+
+The latency is the number of rising edges from the stimulus to the first
+edge at which the output shows the interrupt. Samples are grouped by
+(delivery mode, gateway source mode, path) and summarized as
+count/min/median/p99/max cycles.
+"""
+import json
+from collections import defaultdict
+
+import cocotb
+from cocotb.triggers import RisingEdge, FallingEdge, ReadOnly, ClockCycles, Event, First
+
+from aia_define import *
+from aia_regmap import EDGE1, EDGE0, LEVEL1, LEVEL0, DOMAIN_IN_MSI_MODE, APLIC_NR_SYS_DOMAINS
+from bus_fields import clog2, unpack_grid
+
+SOURCE_MODES = {EDGE1: "EDGE1", EDGE0: "EDGE0", LEVEL1: "LEVEL1", LEVEL0: "LEVEL0"}
+# (inactive, active) value of the source line for each gateway source mode
+SOURCE_LEVELS = {EDGE1: (0, 1), EDGE0: (1, 0), LEVEL1: (0, 1), LEVEL0: (1, 0)}
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(0, -(-len(sorted_values) * p // 100) - 1)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(values):
+    values = sorted(values)
+    if not values:
+        return {"count": 0, "min": None, "median": None, "p99": None, "max": None}
+    return {"count": len(values), "min": values[0], "median": percentile(values, 50),
+            "p99": percentile(values, 99), "max": values[-1]}
+
+class LatencyProbe:
+    def __init__(self, dut, mode=AIA_MODE):
+        self.dut = dut
+        self.delivery = "msi" if mode == DOMAIN_IN_MSI_MODE else "direct"
+        self.cycle = 0
+        self.sources = 0
+        # path -> [stimulus cycle, source, event]
+        self.pending = {}
+        # (delivery, sm, path) -> latencies in cycles
+        self.samples = defaultdict(list)
+        self.timeouts = defaultdict(int)
+        self._task = None
+
+    def start(self):
+        self._task = cocotb.start_soon(self._monitor())
+        return self
+
+    def stop(self):
+        if self._task is not None:
+            self._task.kill()
+            self._task = None
+
+    def drive(self, source, value):
+        """Set one source line, keeping the others (call after a falling edge)."""
+        if value:
+            self.sources |= (1 << source)
+        else:
+            self.sources &= ~(1 << source)
+        self.dut.i_sources.value = self.sources
+
+    def _arrived(self, path, source, xtopei):
+        kind, a, b = path
+        if kind == "xtopei":
+            return xtopei[a][b] == source
+        # o_eintp_cpu is indexed MSB first on both dimensions
+        return self.dut.o_eintp_cpu.value[APLIC_NR_SYS_DOMAINS-a-1][APLIC_NR_HARTS-b-1] == 1
+
+    async def _monitor(self):
+        while True:
+            await RisingEdge(self.dut.i_clk)
+            self.cycle += 1
+            if not self.pending:
+                continue
+            await ReadOnly()
+            xtopei = None
+            if self.delivery == "msi":
+                xtopei = unpack_grid(self.dut.xtopei.value, clog2(IMSIC_NR_SRC), IMSIC_NR_HARTS, 2 + IMSIC_NR_VS_FILES)
+            for path, (start, source, event) in list(self.pending.items()):
+                if self._arrived(path, source, xtopei):
+                    del self.pending[path]
+                    event.set(self.cycle - start)
+
+    async def measure(self, path, sm, source, timeout=1000, name=None):
+        """Apply the active level/edge of sm on source and wait for it on path.
+
+        path is ("xtopei", hart, file) or ("eintp_cpu", domain, hart), with
+        0-based harts. Samples are grouped under name (default: the path).
+        Returns the latency in cycles, None on timeout.
+        """
+        event = Event()
+        await FallingEdge(self.dut.i_clk)
+        self.pending[path] = [self.cycle, source, event]
+        self.drive(source, SOURCE_LEVELS[sm][1])
+
+        await First(event.wait(), ClockCycles(self.dut.i_clk, timeout))
+        key = (self.delivery, SOURCE_MODES[sm], name or self.path_name(path))
+        if not event.is_set():
+            self.pending.pop(path, None)
+            self.timeouts[key] += 1
+            self.dut._log.warning(f"latency: {key} did not arrive within {timeout} cycles")
+            return None
+        self.samples[key].append(event.data)
+        return event.data
+
+    @staticmethod
+    def path_name(path):
+        kind, a, b = path
+        return f"{kind}[{a}][{b}]"
+
+    def report(self):
+        """Summary per (delivery, sm, path) and per (delivery, sm)."""
+        per_mode = defaultdict(list)
+        for (delivery, sm, _), values in self.samples.items():
+            per_mode[(delivery, sm)].extend(values)
+        # a path that only ever timed out has no sample but stays in the report
+        paths = sorted(set(self.samples) | {key for key, count in self.timeouts.items() if count})
+        return {
+            "paths": [dict(delivery=d, sm=sm, path=p, timeouts=self.timeouts[(d, sm, p)],
+                           **summarize(self.samples.get((d, sm, p), [])))
+                      for (d, sm, p) in paths],
+            "modes": [dict(delivery=d, sm=sm, **summarize(v)) for (d, sm), v in sorted(per_mode.items())],
+        }
+
+    def print_report(self, report=None):
+        report = report or self.report()
+        print(f"{'delivery':<8} {'sm':<7} {'path':<18} {'count':>6} {'min':>5} {'median':>7} {'p99':>5} {'max':>5}")
+        for row in report["paths"] + [dict(r, path="all") for r in report["modes"]]:
+            row = {k: "-" if v is None else v for k, v in row.items()}
+            print(f"{row['delivery']:<8} {row['sm']:<7} {row['path']:<18} {row['count']:>6} "
+                  f"{row['min']:>5} {row['median']:>7} {row['p99']:>5} {row['max']:>5}")
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
@@ -0,0 +1,97 @@
+from aia_define import APLIC_MIN_PRIO
+
+# Hardware replaces a zero iprio with the default priority
+TARGET_DEF_IPRIO = 1
+
+def _lowest(bits):
+    return (bits & -bits).bit_length() - 1
+
+class PriorityIndex:
+    """Expected DIRECT-mode topi for every (hart, level) pair.
+
+    Each key owns one bucket per priority level. A bucket is a bitset of the
+    sources with that priority that are both pending and enabled, and an
+    occupancy bitset tells which buckets are non-empty. The top interrupt is
+    the lowest occupied priority and, inside it, the lowest source id, which
+    is the order the notifier uses. enable/pend/claim update one bucket, and
+    the top lookup is two lowest-set-bit operations, so the cost does not
+    depend on how many interrupts are registered.
+    """
+
+    def __init__(self, min_prio=APLIC_MIN_PRIO):
+        self.min_prio = min_prio
+        # source -> [key, prio, pending, enabled]
+        self.sources = {}
+        # key -> (buckets, occupancy)
+        self.keys = {}
+
+    def _slot(self, key):
+        if key not in self.keys:
+            self.keys[key] = [[0] * (self.min_prio + 1), 0]
+        return self.keys[key]
+
+    def _update(self, source):
+        key, prio, pending, enabled = self.sources[source]
+        slot = self._slot(key)
+        buckets = slot[0]
+        if prio >= len(buckets):
+            buckets.extend([0] * (prio + 1 - len(buckets)))
+
+        if pending and enabled:
+            buckets[prio] |= (1 << source)
+        else:
+            buckets[prio] &= ~(1 << source)
+
+        if buckets[prio]:
+            slot[1] |= (1 << prio)
+        else:
+            slot[1] &= ~(1 << prio)
+
+    def add(self, key, source, prio, pending=0, enabled=0):
+        """Register source with its target (key) and priority."""
+        if source in self.sources:
+            self.remove(source)
+        prio = prio if prio != 0 else TARGET_DEF_IPRIO
+        self.sources[source] = [key, prio, pending, enabled]
+        self._update(source)
+
+    def remove(self, source):
+        self.sources[source][2] = 0
+        self._update(source)
+        del self.sources[source]
+
+    def _set(self, source, field, val):
+        if source in self.sources:
+            self.sources[source][field] = val
+            self._update(source)
+
+    def pend(self, source, val=1):
+        self._set(source, 2, val)
+
+    def enable(self, source, val=1):
+        self._set(source, 3, val)
+
+    def top(self, key, threshold=0):
+        """Return (source, prio) of the top interrupt of key, or None."""
+        slot = self.keys.get(key)
+        if slot is None or slot[1] == 0:
+            return None
+        prio = _lowest(slot[1])
+        if threshold != 0 and prio >= threshold:
+            return None
+        return _lowest(slot[0][prio]), prio
+
+    def topi(self, key, threshold=0):
+        """Top interrupt of key encoded as topi/claimi, 0 if none."""
+        top = self.top(key, threshold)
+        if top is None:
+            return 0
+        source, prio = top
+        return (source << 16) | prio
+
+    def claim(self, key, threshold=0):
+        """Claim the top interrupt of key and return it encoded as claimi."""
+        topi = self.topi(key, threshold)
+        if topi != 0:
+            self.pend(topi >> 16, 0)
+        return topi
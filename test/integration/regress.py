@@ -0,0 +1,218 @@
+"""
+Regression over a matrix of AIA configurations.
+
+Every point of the matrix gets its own build directory under --out with an
+overriding copy of aia_pkg.sv, the aia_define.py/aia_define.mk generated from
+it and its own simulator build, so configurations never share state and can
+be built and simulated concurrently. Results are collected in
+<out>/report.json.
+
+Usage:
+    python3 regress.py --mode msi direct --nr-sources 64 256 --jobs 8
+    python3 regress.py --matrix matrix.json
+    python3 regress.py --mode direct --domain-depth 1 2 4 8 AIA_DELEGATION=2000 AIA_LATENCY=10
+
+A matrix file holds lists of values per key (the cartesian product is run),
+e.g. {"mode": ["msi", "direct"], "nr_sources": [64, 1024], "params": {"UserMinPrio": 7}}.
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+TB_FOLDER = os.path.dirname(os.path.abspath(__file__))
+AIA_PKG = os.path.join(TB_FOLDER, "..", "..", "rtl", "package", "aia_pkg.sv")
+
+MODES = {"msi": "DOMAIN_IN_MSI_MODE", "direct": "DOMAIN_IN_DIRECT_MODE"}
+TYPES = {"embedded": "AIA_EMBEDDED", "distributed": "AIA_DISTRIBUTED"}
+
+# matrix key -> aia_pkg.sv localparams it sets
+PKG_PARAMS = {
+    "nr_sources":   ["UserNrSources", "UserNrSourcesImsic"],
+    "nr_harts":     ["UserNrHarts", "UserNrHartsImsic"],
+    "nr_vs_files":  ["UserNrVSIntpFiles"],
+    "xlen":         ["UserXLEN"],
+}
+MATRIX_KEYS = ["mode", "type"] + list(PKG_PARAMS) + ["domain_depth"]
+SHORT = {"nr_sources": "src", "nr_harts": "h", "nr_vs_files": "vs", "xlen": "x"}
+# Register bases of the chained S domains of --domain-depth
+CHAIN_BASE = 0xd000000
+CHAIN_STRIDE = 0x1000000
+
+def config_name(config):
+    parts = [config.get("mode"), config.get("type")]
+    parts += [f"{SHORT[k]}{config[k]}" for k in PKG_PARAMS if config.get(k) is not None]
+    if config.get("domain_depth") is not None:
+        parts.append(f"dd{config['domain_depth']}")
+    parts += [f"{k}{v}" for k, v in sorted(config.get("params", {}).items())]
+    return "-".join(str(p) for p in parts if p is not None)
+
+def override_pkg(pkg_text, params):
+    """Replace the value of each 'localparam Name = value;' in params."""
+    for name, value in params.items():
+        pkg_text, n = re.subn(rf'(localparam\s+{name}\s*=\s*)[^;]+;', rf'\g<1>{value};', pkg_text)
+        if n == 0:
+            raise ValueError(f"localparam {name} not found in aia_pkg.sv")
+    return pkg_text
+
+def domain_chain(depth):
+    """UserDomainsCfg of a chain root -> 1 -> ... -> depth of S domains.
+
+    The root domain of aplic_pkg.sv has a single child (domain 1), every
+    other domain delegates to the next one through child index 0.
+    """
+    lines = []
+    for k in range(1, depth + 1):
+        childs = f"'{{0, {k + 1}}}" if k < depth else "'{default: '0}"
+        lines.append(f"""    localparam domain_cfg_t AplicDomainS_{k - 1} = '{{
+        id: shortint'({k}),
+        ParentID: int'({k - 1}),
+        NrChilds: shortint'({int(k < depth)}),
+        ChildsIdx: {childs},
+        LevelMode: DOMAIN_IN_S_MODE,
+        Addr: 32'h{CHAIN_BASE + (k - 1) * CHAIN_STRIDE:x}
+    }};
+""")
+    names = ",\n        ".join(f"AplicDomainS_{k - 1}" for k in range(depth, 0, -1))
+    lines.append(f"""    localparam domain_cfg_t [UserNrDomains-1:0] UserDomainsCfg = '{{
+        // Domains with Highest IDs first
+        {names}
+    }};""")
+    return "\n".join(lines)
+
+def override_domains(pkg_text, depth):
+    """Replace the domain table of aia_pkg.sv by a chain of depth S domains."""
+    pkg_text, n = re.subn(r"[ \t]*localparam\s+domain_cfg_t\b.*?UserDomainsCfg\s*=\s*'\{[^;]*\};",
+                          lambda _: domain_chain(depth), pkg_text, count=1, flags=re.DOTALL)
+    if n == 0:
+        raise ValueError("UserDomainsCfg not found in aia_pkg.sv")
+    return override_pkg(pkg_text, {"UserNrDomains": depth})
+
+def pkg_overrides(config):
+    params = {}
+    if config.get("mode") is not None:
+        params["UserAplicMode"] = MODES[config["mode"]]
+    if config.get("type") is not None:
+        params["UserAiaType"] = TYPES[config["type"]]
+    for key, names in PKG_PARAMS.items():
+        if config.get(key) is not None:
+            for name in names:
+                params[name] = config[key]
+    params.update(config.get("params", {}))
+    return params
+
+def prepare(config, build_dir, base_pkg=AIA_PKG):
+    """Create build_dir with the overriding package and its aia_define files."""
+    os.makedirs(build_dir, exist_ok=True)
+    with open(base_pkg) as f:
+        pkg_text = override_pkg(f.read(), pkg_overrides(config))
+    if config.get("domain_depth") is not None:
+        pkg_text = override_domains(pkg_text, config["domain_depth"])
+    pkg = os.path.join(build_dir, "aia_pkg.sv")
+    with open(pkg, "w") as f:
+        f.write(pkg_text)
+
+    subprocess.run([sys.executable, os.path.join(TB_FOLDER, "generate_aia_define.py"),
+                    "--pkg", pkg, "--out-dir", build_dir], check=True)
+    return pkg
+
+def parse_results(results_xml):
+    tests = failures = skipped = 0
+    sim_time_ns = 0.0
+    for testcase in ET.parse(results_xml).iter("testcase"):
+        tests += 1
+        failures += int(testcase.find("failure") is not None or testcase.find("error") is not None)
+        skipped += int(testcase.find("skipped") is not None)
+        sim_time_ns += float(testcase.get("sim_time_ns", 0))
+    return {"tests": tests, "failures": failures, "skipped": skipped, "sim_time_ns": sim_time_ns}
+
+def make_args(pkg, extra=(), target="runme"):
+    return ["make", "-f", os.path.join(TB_FOLDER, "run.mk"), f"TB_FOLDER={TB_FOLDER}",
+            f"AIA_PKG={pkg}", *extra, target]
+
+def run_config(config, out_dir, extra=()):
+    """Build and simulate one configuration (runs in a worker process)."""
+    name = config_name(config)
+    build_dir = os.path.abspath(os.path.join(out_dir, name))
+    result = {"name": name, "config": config, "build_dir": build_dir}
+    start = time.perf_counter()
+
+    try:
+        pkg = prepare(config, build_dir)
+        env = dict(os.environ, PWD=build_dir)
+        with open(os.path.join(build_dir, "run.log"), "w") as log:
+            proc = subprocess.run(make_args(pkg, extra), cwd=build_dir, env=env,
+                                  stdout=log, stderr=subprocess.STDOUT)
+        result["returncode"] = proc.returncode
+        results_xml = os.path.join(build_dir, "results.xml")
+        if os.path.exists(results_xml):
+            result.update(parse_results(results_xml))
+        result["status"] = "pass" if proc.returncode == 0 and result.get("failures", 1) == 0 else "fail"
+    except Exception as e:
+        result["status"] = "error"
+        result["error"] = str(e)
+
+    result["wall_s"] = time.perf_counter() - start
+    return result
+
+def expand_matrix(matrix):
+    keys = [k for k in MATRIX_KEYS if k in matrix]
+    values = [v if isinstance(v, list) else [v] for v in (matrix[k] for k in keys)]
+    for combo in itertools.product(*values):
+        config = dict(zip(keys, combo))
+        if "params" in matrix:
+            config["params"] = matrix["params"]
+        yield config
+
+def run_matrix(configs, out_dir, jobs, extra=()):
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_config, config, out_dir, extra): config for config in configs}
+        for future in as_completed(futures):
+            result = future.result()
+            print(f"{result['status']:<6} {result['wall_s']:>8.1f}s  {result['name']}", flush=True)
+            results.append(result)
+    return sorted(results, key=lambda r: r["name"])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--matrix", help="JSON file with the configuration matrix")
+    parser.add_argument("--mode", nargs="+", choices=list(MODES), default=["msi", "direct"])
+    parser.add_argument("--type", nargs="+", choices=list(TYPES), default=["embedded"])
+    parser.add_argument("--nr-sources", nargs="+", type=int)
+    parser.add_argument("--nr-harts", nargs="+", type=int)
+    parser.add_argument("--nr-vs-files", nargs="+", type=int)
+    parser.add_argument("--xlen", nargs="+", type=int)
+    parser.add_argument("--domain-depth", nargs="+", type=int, help="chain that many S domains below the root")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="concurrent configurations")
+    parser.add_argument("--out", default="regress", help="directory for build dirs and report.json")
+    parser.add_argument("make_vars", nargs="*", help="extra VAR=value passed to run.mk (e.g. CLOCK=python)")
+    args = parser.parse_args()
+
+    if args.matrix:
+        with open(args.matrix) as f:
+            matrix = json.load(f)
+    else:
+        matrix = {k: getattr(args, k) for k in MATRIX_KEYS if getattr(args, k) is not None}
+
+    configs = list(expand_matrix(matrix))
+    print(f"running {len(configs)} configurations with {args.jobs} jobs")
+    results = run_matrix(configs, args.out, args.jobs, args.make_vars)
+
+    os.makedirs(args.out, exist_ok=True)
+    report = os.path.join(args.out, "report.json")
+    with open(report, "w") as f:
+        json.dump({"matrix": matrix, "results": results}, f, indent=2)
+
+    failed = [r for r in results if r["status"] != "pass"]
+    print(f"{len(results) - len(failed)}/{len(results)} configurations passed, report in {report}")
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
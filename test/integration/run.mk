@@ -5,18 +5,47 @@
 
 # defaults
 SIM ?= verilator
-EXTRA_ARGS += --trace --trace-structs
+# 0 - no tracing (default)
+# fst - dump the whole run to dump.fst
+# trigger - the simulator dumps to AIA_WAVES_FILE only inside the window the
+#           test arms: after the first mismatch, then before it on the
+#           replay `make run` starts (common/tb_wave_window.sv,
+#           common/wave_window.py)
+# Not WAVES, which cocotb's own makefiles already use
+AIA_WAVES ?= 0
+export AIA_WAVES
+ifeq ($(AIA_WAVES), fst)
+EXTRA_ARGS += --trace-fst --trace-structs
+endif
+ifeq ($(AIA_WAVES), trigger)
+EXTRA_ARGS += --trace-fst --trace-structs -DTB_WAVE_WINDOW
+AIA_WAVES_FILE ?= window.fst
+PLUSARGS += +aia_waves_file=$(AIA_WAVES_FILE)
+endif
 TOPLEVEL_LANG ?= verilog
+# native - i_clk is toggled inside the simulator (tb_clock.sv, needs --timing)
+# python - i_clk is driven by a cocotb Clock
+CLOCK ?= native
+# 1 - reuse simulator builds from SIM_CACHE_DIR, keyed by a hash of the
+#     sources, package parameters and flags (see common/sim_cache.py)
+# 0 - build in sim_build_$(CLOCK)
+SIM_CACHE ?= 1
 
 include aia_define.mk
 
-include $(shell cocotb-config --makefiles)/Makefile.sim
+# Bench sources, overridden when building out of tree (regress.py)
+TB_FOLDER ?= $(CURDIR)
+AXI_FOLDER = $(TB_FOLDER)/../../vendor
+TEST_FOLDER = $(TB_FOLDER)/
+SRC_FOLDER = $(TB_FOLDER)/../../rtl
+COMMON_FOLDER = $(TB_FOLDER)/../common
+SIM_CACHE_DIR ?= $(TB_FOLDER)/sim_cache
 
-AXI_FOLDER = $(PWD)/../../vendor
-TEST_FOLDER = $(currdir) 
-SRC_FOLDER = $(PWD)/../../rtl
+# The build directory comes first so its aia_define.py wins
+export PYTHONPATH := $(CURDIR):$(TB_FOLDER):$(COMMON_FOLDER):$(PYTHONPATH)
 
 IEAIA_FOLDER = $(SRC_FOLDER)
+AIA_PKG ?= $(IEAIA_FOLDER)/package/aia_pkg.sv
 
 # AXI vendor files
 VERILOG_SOURCES = $(AXI_FOLDER)/reg_intf_pkg.sv
@@ -27,7 +56,7 @@ VERILOG_SOURCES += $(AXI_FOLDER)/ariane_axi_pkg.sv
 VERILOG_SOURCES += $(IEAIA_FOLDER)/package/aia_define_$(AIA_TYPE).svh
 VERILOG_SOURCES += $(IEAIA_FOLDER)/package/aia_define_$(AIA_MODE).svh
 VERILOG_SOURCES += $(IEAIA_FOLDER)/package/aplic_domain_pkg.sv
-VERILOG_SOURCES += $(IEAIA_FOLDER)/package/aia_pkg.sv
+VERILOG_SOURCES += $(AIA_PKG)
 VERILOG_SOURCES += $(IEAIA_FOLDER)/package/imsic_pkg.sv
 VERILOG_SOURCES += $(IEAIA_FOLDER)/package/imsic_protocol_pkg.sv
 VERILOG_SOURCES += $(IEAIA_FOLDER)/package/aplic_pkg.sv
@@ -49,11 +78,31 @@ VERILOG_SOURCES += $(IEAIA_FOLDER)/aplic_domain_top.sv
 VERILOG_SOURCES += $(IEAIA_FOLDER)/util/synchronizer.sv
 VERILOG_SOURCES += $(IEAIA_FOLDER)/aplic_top.sv
 
-VERILOG_SOURCES += $(TEST_FOLDER)./ieaia_wrap.sv
+ifeq ($(CLOCK), native)
+EXTRA_ARGS += --timing -DTB_CLOCK
+VERILOG_SOURCES += $(COMMON_FOLDER)/tb_clock.sv
+endif
+
+ifeq ($(AIA_WAVES), trigger)
+VERILOG_SOURCES += $(COMMON_FOLDER)/tb_wave_window.sv
+endif
+
+VERILOG_SOURCES += $(TEST_FOLDER)ieaia_wrap.sv
 
 # TOPLEVEL is the name of the toplevel module in your Verilog or VHDL file
 TOPLEVEL = ieaia_wrapper
 
 MODULE = aia_tb
 
+ifndef SIM_BUILD
+ifeq ($(SIM_CACHE), 1)
+SIM_BUILD := $(shell python3 $(COMMON_FOLDER)/sim_cache.py --cache-dir $(SIM_CACHE_DIR) --toplevel $(TOPLEVEL) --flags="$(EXTRA_ARGS)" $(VERILOG_SOURCES))
+else
+SIM_BUILD := sim_build_$(CLOCK)
+endif
+endif
+
+# Included last so the build rules see the final sources and SIM_BUILD
+include $(shell cocotb-config --makefiles)/Makefile.sim
+
 runme: all
\ No newline at end of file
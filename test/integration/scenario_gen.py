@@ -0,0 +1,161 @@
+"""
+Seeded constrained-random interrupt scenarios for the integration bench.
+
+A scenario is the same set of lists user_define.py holds (TARGET_INTP,
+TARGET_HART, TARGET_LEVEL, TARGET_PRIO, TARGET_GUEST), drawn inside the
+limits of aia_define.py so it always passes check_user_test. Every scenario
+carries its own seed, derived from the run seed, and can be rebuilt alone
+with ScenarioGenerator.replay(seed).
+
+Usage: python3 scenario_gen.py [--seed S] [--count N] [--max-intp M] [--out FILE]
+"""
+import argparse
+import json
+import os
+import random
+
+from aia_define import *
+from aia_regmap import M_MODE, S_MODE, DOMAIN_IN_MSI_MODE
+
+class Scenario:
+    def __init__(self, intp, hart, level, prio, guest, seed=None):
+        self.intp = intp
+        self.hart = hart
+        self.level = level
+        self.prio = prio
+        self.guest = guest
+        self.seed = seed
+
+    def __len__(self):
+        return len(self.intp)
+
+    def __repr__(self):
+        return (f"Scenario(seed={self.seed}, intp={self.intp}, hart={self.hart}, "
+                f"level={self.level}, prio={self.prio}, guest={self.guest})")
+
+    def to_dict(self):
+        return {"seed": self.seed, "intp": self.intp, "hart": self.hart,
+                "level": self.level, "prio": self.prio, "guest": self.guest}
+
+    def subset(self, indices):
+        """The interrupts at indices, a stimulus for a configuration of this scenario."""
+        return Scenario([self.intp[i] for i in indices], [self.hart[i] for i in indices],
+                        [self.level[i] for i in indices], [self.prio[i] for i in indices],
+                        [self.guest[i] for i in indices], self.seed)
+
+    @classmethod
+    def from_dict(cls, d):
+        return cls(list(d["intp"]), list(d["hart"]), list(d["level"]),
+                   list(d["prio"]), list(d["guest"]), d.get("seed"))
+
+    @classmethod
+    def from_user_define(cls):
+        """The static scenario configured in user_define.py."""
+        import user_define
+        return cls(list(user_define.TARGET_INTP), list(user_define.TARGET_HART),
+                   list(user_define.TARGET_LEVEL), list(user_define.TARGET_PRIO),
+                   list(user_define.TARGET_GUEST))
+
+def run_seed():
+    """Seed of this run: AIA_SEED if set, otherwise a fresh random one.
+
+    A drawn seed is kept in AIA_SEED, so every generator of the run and a
+    replay (wave_window.py) see the same one.
+    """
+    seed = os.environ.get("AIA_SEED")
+    if seed is not None:
+        return int(seed, 0)
+    seed = random.SystemRandom().getrandbits(32)
+    os.environ["AIA_SEED"] = str(seed)
+    return seed
+
+class ScenarioGenerator:
+    """Draw legal scenarios from the aia_define.py limits.
+
+    Constraints:
+        - sources are unique inside a scenario, in [1, NrSources-1]
+          (and below NrSourcesImsic in MSI mode, the source is the eiid)
+        - harts in [1, NrHarts] (NrHartsImsic in MSI mode)
+        - priorities in [1, MinPrio-1] (DIRECT mode)
+        - guest 0 for M level, [0, NrVSIntpFiles] for S level (MSI mode)
+    """
+
+    def __init__(self, seed=None, mode=AIA_MODE, max_intp=8):
+        self.seed = run_seed() if seed is None else seed
+        self.mode = mode
+        self.max_intp = max_intp
+        self.rng = random.Random(self.seed)
+
+        if self.mode == DOMAIN_IN_MSI_MODE:
+            self.nr_sources = min(APLIC_NR_SRC, IMSIC_NR_SRC)
+            self.nr_harts = IMSIC_NR_HARTS
+        else:
+            self.nr_sources = APLIC_NR_SRC
+            self.nr_harts = APLIC_NR_HARTS
+
+    def _files(self):
+        """Every (hart, level, guest) an interrupt can target."""
+        files = []
+        for hart in range(1, self.nr_harts + 1):
+            files.append((hart, M_MODE, 0))
+            for guest in range(IMSIC_NR_VS_FILES + 1):
+                files.append((hart, S_MODE, guest))
+        return files
+
+    def _draw(self, seed):
+        rng = random.Random(seed)
+        max_intp = min(self.max_intp, self.nr_sources - 1)
+        if self.mode == DOMAIN_IN_MSI_MODE:
+            # several interrupts may share a file, the claims then follow its priority order
+            files = self._files()
+            nr_intp = rng.randint(1, max_intp)
+            targets = [rng.choice(files) for _ in range(nr_intp)]
+        else:
+            nr_intp = rng.randint(1, max_intp)
+            targets = [(rng.randint(1, self.nr_harts), rng.choice((M_MODE, S_MODE)), 0)
+                       for _ in range(nr_intp)]
+
+        intp = rng.sample(range(1, self.nr_sources), nr_intp)
+        prio = [rng.randint(1, max(1, APLIC_MIN_PRIO - 1)) for _ in range(nr_intp)]
+
+        return Scenario(intp, [t[0] for t in targets], [t[1] for t in targets],
+                        prio, [t[2] for t in targets], seed)
+
+    def every_source(self):
+        """One interrupt on every source, each to a random interrupt file (MSI) or hart and priority (DIRECT)."""
+        intp = list(range(1, self.nr_sources))
+        if self.mode == DOMAIN_IN_MSI_MODE:
+            targets = [self.rng.choice(self._files()) for _ in intp]
+            prio = [1] * len(intp)
+        else:
+            targets = [(self.rng.randint(1, self.nr_harts), self.rng.choice((M_MODE, S_MODE)), 0) for _ in intp]
+            prio = [self.rng.randint(1, max(1, APLIC_MIN_PRIO - 1)) for _ in intp]
+        return Scenario(intp, [t[0] for t in targets], [t[1] for t in targets],
+                        prio, [t[2] for t in targets], self.seed)
+
+    def generate(self):
+        return self._draw(self.rng.getrandbits(32))
+
+    def scenarios(self, count):
+        for _ in range(count):
+            yield self.generate()
+
+    def replay(self, seed):
+        """Rebuild the scenario that was generated with seed."""
+        return self._draw(seed)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=lambda x: int(x, 0), default=None, help="run seed (default: AIA_SEED or random)")
+    parser.add_argument("--count", type=int, default=1000, help="number of scenarios")
+    parser.add_argument("--max-intp", type=int, default=8, help="max interrupts per scenario")
+    parser.add_argument("--out", default="scenarios.json", help="output file")
+    args = parser.parse_args()
+
+    gen = ScenarioGenerator(seed=args.seed, max_intp=args.max_intp)
+    with open(args.out, "w") as f:
+        json.dump({"seed": gen.seed, "scenarios": [s.to_dict() for s in gen.scenarios(args.count)]}, f)
+    print(f"seed {gen.seed}: {args.count} scenarios written to {args.out}")
+
+if __name__ == "__main__":
+    main()
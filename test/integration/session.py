@@ -0,0 +1,94 @@
+"""
+Session files: many scenarios streamed into one simulator process.
+
+A session is the JSON scenario_gen.py writes, where every scenario may also
+carry a name, the delivery mode it is meant for and expected results:
+
+    {"scenarios": [
+        {"name": "two harts", "intp": [5, 9], "hart": [1, 2], "level": [3, 1],
+         "prio": [1, 1], "guest": [0, 0],
+         "mode": "msi",
+         "expected": {"xtopei[0][M]": 5, "xtopei[1][S]": 9}},
+        ...
+    ]}
+
+The scenario's own checks come from the reference models as usual; the
+expected values are checked on top of them against the actual value of the
+check with that id. A scenario for the other delivery mode is skipped, the
+mode is fixed when the RTL is built. The bench (session_test in aia_tb.py)
+pulses ni_rst between scenarios and checks every flop is back to its reset
+value before the next one; aia_flow.py --scenarios runs the same file on the
+functional model.
+
+SessionReport keeps one result per scenario (checks, failures, simulated
+and wall time) and writes them to AIA_SESSION_OUT (default session.json).
+"""
+import json
+import time
+
+from aia_regmap import DOMAIN_IN_DIRECT_MODE, DOMAIN_IN_MSI_MODE
+from scenario_gen import Scenario
+
+MODES = {"msi": DOMAIN_IN_MSI_MODE, "direct": DOMAIN_IN_DIRECT_MODE}
+
+class SessionEntry:
+    def __init__(self, scenario, name, mode=None, expected=None):
+        self.scenario = scenario
+        self.name = name
+        self.mode = mode
+        # check id -> expected value
+        self.expected = expected or {}
+
+    def runs_on(self, mode):
+        return self.mode is None or MODES[self.mode] == mode
+
+def load_session(path):
+    """The SessionEntry of every scenario of a session file, in file order."""
+    with open(path) as f:
+        session = json.load(f)
+    entries = []
+    for n, d in enumerate(session["scenarios"]):
+        mode = d.get("mode")
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"{path}: scenario {n} has mode {mode}, expected one of {list(MODES)}")
+        entries.append(SessionEntry(Scenario.from_dict(d), d.get("name", f"scenario {n}"), mode, d.get("expected")))
+    return entries
+
+def check_expected(checks, expected):
+    """Check the session's expected values against the last check recorded with each id."""
+    actual = {record[0]: record[2] for record in checks.records}
+    for check_id, value in expected.items():
+        checks.check(f"{check_id} (session)", value, actual.get(check_id))
+
+class SessionReport:
+    def __init__(self):
+        self.results = []
+        self.start = time.perf_counter()
+
+    def add(self, entry, checks=None, sim_time_ns=None, wall_time_s=None):
+        """Result of one scenario, checks None when it was skipped."""
+        self.results.append({
+            "name": entry.name,
+            "seed": entry.scenario.seed,
+            "interrupts": len(entry.scenario),
+            "skipped": checks is None,
+            "checks": len(checks.records) if checks is not None else 0,
+            "failures": checks.nr_failures if checks is not None else 0,
+            "failed": [r[0] for r in checks.failures] if checks is not None else [],
+            "sim_time_ns": sim_time_ns,
+            "wall_time_s": wall_time_s,
+        })
+
+    @property
+    def failed(self):
+        return [r for r in self.results if r["failures"]]
+
+    def summary(self):
+        ran = [r for r in self.results if not r["skipped"]]
+        elapsed = time.perf_counter() - self.start
+        return {"scenarios": len(ran), "failed": len(self.failed), "skipped": len(self.results) - len(ran),
+                "wall_time_s": elapsed, "scenarios_per_hour": len(ran) * 3600 / max(elapsed, 1e-9)}
+
+    def write_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(), "scenarios": self.results}, f, indent=2)
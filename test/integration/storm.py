@@ -0,0 +1,234 @@
+"""
+Interrupt-storm throughput benchmark for the APLIC -> IMSIC path (MSI mode).
+
+Sources are configured EDGE1 in the M domain, each forwarded as eiid=source
+to the M file of a hart (round-robin over the harts), and fired on
+i_sources following one of the patterns:
+
+    subset   every period cycles a random subset of size burst fires
+    rate     rate interrupts per kcycle, the sources fire in turn
+    poisson  bursts with exponential inter-arrival times (mean period
+             cycles) and a random size in [1, burst]
+
+A modelled hart per interrupt file claims through imsic_write_xtopei as soon
+as its xtopei is non-zero and its previous claim was serviced (service
+cycles). With csr="shared" the harts share the single CSR port of the bench
+and xtopei needs a cycle to reflect a claim, so at most one claim is issued
+every other cycle. With csr="per_hart" every hart claims through its own
+port (imsic_csr_agent.ClaimStreams), concurrently with the others.
+
+Reported: delivered interrupts per kcycle of the storm phase (claims
+serviced while the sources fire; the drain that follows is reported
+apart), backlog (fired and not yet claimed) over time, interrupts lost
+because the source was still pending when it fired again, and the claim
+wait of the low and high-numbered sources to expose starvation.
+"""
+import os
+import random
+import statistics
+
+import cocotb
+from cocotb.triggers import RisingEdge, FallingEdge, ReadOnly
+
+from aia_define import *
+from aia_regmap import *
+from bus_fields import clog2, unpack_grid
+from imsic_csr_channel import imsic_write_xtopei, imsic_stop_write, imsic_write_reg
+from imsic_csr_agent import ClaimStreams
+
+PATTERNS = ["subset", "rate", "poisson"]
+CSR_PORTS = ["shared", "per_hart"]
+
+class StormConfig:
+    def __init__(self, pattern="poisson", cycles=20000, sources=None, rate=100, period=50,
+                 burst=16, service=4, sample_every=100, seed=0, csr="shared"):
+        if pattern not in PATTERNS:
+            raise ValueError(f"unknown storm pattern {pattern}, expected one of {PATTERNS}")
+        if csr not in CSR_PORTS:
+            raise ValueError(f"unknown CSR port {csr}, expected one of {CSR_PORTS}")
+        self.csr = csr
+        self.pattern = pattern
+        self.cycles = cycles
+        # sources are also eiids, so they must exist in the IMSICs too
+        self.sources = min(sources or APLIC_NR_SRC, APLIC_NR_SRC, IMSIC_NR_SRC) - 1
+        self.rate = rate
+        self.period = period
+        self.burst = burst
+        self.service = service
+        self.sample_every = sample_every
+        self.seed = seed
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ.get
+        return cls(pattern=env("AIA_STORM", "poisson"),
+                   cycles=int(env("AIA_STORM_CYCLES", "20000")),
+                   sources=int(env("AIA_STORM_SOURCES", "0")) or None,
+                   rate=int(env("AIA_STORM_RATE", "100")),
+                   period=int(env("AIA_STORM_PERIOD", "50")),
+                   burst=int(env("AIA_STORM_BURST", "16")),
+                   service=int(env("AIA_STORM_SERVICE", "4")),
+                   seed=int(env("AIA_SEED", "0"), 0),
+                   csr=env("AIA_STORM_CSR", "shared"))
+
+class InterruptStorm:
+    def __init__(self, dut, config):
+        self.dut = dut
+        self.cfg = config
+        self.rng = random.Random(config.seed)
+        self.sources = list(range(1, config.sources + 1))
+        self.hart_of = {s: (s - 1) % IMSIC_NR_HARTS for s in self.sources}
+        self.cycle = 0
+        self.lines = 0
+        # source -> cycle it fired while not pending, None when idle
+        self.outstanding = {}
+        self.fired = 0
+        self.lost = 0
+        # claims serviced while the storm was still firing, the rest is drain
+        self.delivered_in_storm = 0
+        self.waits = {s: [] for s in self.sources}
+        self.backlog = []
+        self.claim_streams = None
+
+    def setup_writes(self):
+        """APLIC writes that route every storm source to its hart's M file."""
+        writes = [(DOMAINCFG_M_BASE, (1 << 8) | (1 << 2))]
+        writes += [(SOURCECFG_M_BASE + SOURCECFG_OFF*(s-1), EDGE1) for s in self.sources]
+        writes += [(TARGET_M_BASE + TARGET_OFF*(s-1), (self.hart_of[s] << 18) | s) for s in self.sources]
+        writes += [(SETIENUM_M_BASE, s) for s in self.sources]
+        return writes
+
+    async def setup_imsics(self):
+        eie_words = {}
+        for s in self.sources:
+            key = (self.hart_of[s] + 1, EIE0 + (s//RISCV_XLEN)*2)
+            eie_words[key] = eie_words.get(key, 0) | (1 << (s % RISCV_XLEN))
+        for hart in range(1, IMSIC_NR_HARTS + 1):
+            imsic_write_reg(self.dut, hart, EDELIVERY, ENABLE_INTP_FILE, M_MODE)
+            await FallingEdge(self.dut.i_clk)
+        for (hart, addr), eie in eie_words.items():
+            imsic_write_reg(self.dut, hart, addr, eie, M_MODE)
+            await FallingEdge(self.dut.i_clk)
+        imsic_stop_write(self.dut)
+
+    def _arrivals(self):
+        """Sources firing this cycle."""
+        cfg = self.cfg
+        if cfg.pattern == "subset":
+            if self.cycle % cfg.period == 0:
+                return self.rng.sample(self.sources, min(cfg.burst, len(self.sources)))
+        elif cfg.pattern == "rate":
+            due = (self.cycle + 1) * cfg.rate // 1000 - self.cycle * cfg.rate // 1000
+            start = self.cycle * cfg.rate // 1000
+            return [self.sources[(start + i) % len(self.sources)] for i in range(due)]
+        elif self.cycle >= self._next_burst:
+            self._next_burst = self.cycle + max(1, round(self.rng.expovariate(1 / cfg.period)))
+            return self.rng.sample(self.sources, self.rng.randint(1, min(cfg.burst, len(self.sources))))
+        return []
+
+    async def _driver(self):
+        self._next_burst = 0
+        while self.cycle < self.cfg.cycles:
+            await FallingEdge(self.dut.i_clk)
+            # EDGE1 needs the line back low before it can fire again
+            self.lines = 0
+            for s in self._arrivals():
+                self.lines |= (1 << s)
+                self.fired += 1
+                if self.outstanding.get(s) is None:
+                    self.outstanding[s] = self.cycle
+                else:
+                    self.lost += 1
+            self.dut.i_sources.value = self.lines
+        await FallingEdge(self.dut.i_clk)
+        self.dut.i_sources.value = 0
+
+    async def _harts(self, drain):
+        width = clog2(IMSIC_NR_SRC)
+        files = 2 + IMSIC_NR_VS_FILES
+        busy_until = [0] * IMSIC_NR_HARTS
+        claiming = False
+        next_hart = 0
+        while self.cycle < self.cfg.cycles + drain:
+            await RisingEdge(self.dut.i_clk)
+            self._tick()
+            await ReadOnly()
+            xtopei = unpack_grid(self.dut.xtopei.value, width, IMSIC_NR_HARTS, files)
+
+            # round-robin over the harts with an interrupt and no claim in service
+            claim = None
+            if not claiming:
+                for n in range(IMSIC_NR_HARTS):
+                    hart = (next_hart + n) % IMSIC_NR_HARTS
+                    if xtopei[hart][0] != 0 and busy_until[hart] <= self.cycle:
+                        claim = (hart, int(xtopei[hart][0]))
+                        break
+
+            await FallingEdge(self.dut.i_clk)
+            if claiming:
+                imsic_stop_write(self.dut)
+                claiming = False
+            if claim is not None:
+                hart, source = claim
+                imsic_write_xtopei(self.dut, hart + 1, M_MODE)
+                claiming = True
+                busy_until[hart] = self.cycle + self.cfg.service
+                next_hart = hart + 1
+                self._claimed(source, self.cycle)
+        imsic_stop_write(self.dut)
+
+    def _tick(self):
+        self.cycle += 1
+        if self.cycle % self.cfg.sample_every == 0:
+            self.backlog.append((self.cycle, sum(1 for c in self.outstanding.values() if c is not None)))
+
+    def _claimed(self, source, cycle):
+        start = self.outstanding.get(source)
+        if start is not None:
+            self.waits[source].append(cycle - start)
+            self.outstanding[source] = None
+            if cycle <= self.cfg.cycles:
+                self.delivered_in_storm += 1
+
+    async def _per_hart(self, drain):
+        streams = ClaimStreams(self.dut, service=self.cfg.service,
+                               on_claim=lambda hart, source, cycle: self._claimed(source, self.cycle)).start()
+        while self.cycle < self.cfg.cycles + drain:
+            await RisingEdge(self.dut.i_clk)
+            self._tick()
+        streams.stop()
+        self.claim_streams = streams.report()
+
+    async def run(self, drain=2000):
+        """Fire the storm for cfg.cycles, then let the harts drain the backlog."""
+        driver = cocotb.start_soon(self._driver())
+        if self.cfg.csr == "per_hart":
+            await self._per_hart(drain)
+        else:
+            await self._harts(drain)
+        driver.kill()
+        return self.report()
+
+    def report(self):
+        delivered = sum(len(w) for w in self.waits.values())
+        quarter = max(1, len(self.sources) // 4)
+        def band(sources):
+            waits = [w for s in sources for w in self.waits[s]]
+            never = sum(1 for s in sources if self.outstanding.get(s) is not None)
+            return {"sources": [sources[0], sources[-1]], "delivered": len(waits),
+                    "mean_wait": statistics.mean(waits) if waits else None,
+                    "max_wait": max(waits) if waits else None, "still_pending": never}
+        return {
+            "pattern": self.cfg.pattern, "csr": self.cfg.csr, "cycles": self.cycle, "sources": len(self.sources),
+            "fired": self.fired, "delivered": delivered, "lost": self.lost,
+            # throughput of the storm phase only, the drain has no arrivals
+            "storm_cycles": min(self.cycle, self.cfg.cycles), "drain_cycles": max(0, self.cycle - self.cfg.cycles),
+            "delivered_in_storm": self.delivered_in_storm,
+            "delivered_in_drain": delivered - self.delivered_in_storm,
+            "delivered_per_kcycle": 1000 * self.delivered_in_storm / max(1, min(self.cycle, self.cfg.cycles)),
+            "max_backlog": max((b for _, b in self.backlog), default=0),
+            "backlog": self.backlog,
+            "low_sources": band(self.sources[:quarter]),
+            "high_sources": band(self.sources[-quarter:]),
+            "claim_streams": self.claim_streams,
+        }
@@ -0,0 +1,113 @@
+"""
+Scalability sweep of the integration bench over aia_pkg.sv parameters.
+
+Every grid point is prepared like a regress.py configuration (own build
+directory, overriding aia_pkg.sv and aia_define files) and then:
+
+    1. the Verilator model is built from scratch (the build cache is
+       bypassed) and the build is timed: compile_s
+    2. the bench is run on the built model: sim_wall_s, sim_cycles and
+       cycles_per_s (simulated i_clk cycles per wall-clock second)
+
+binary_bytes is the size of the simulator executable and *_peak_rss_mb the
+peak resident set size of the build and of the simulation, from wait4's
+rusage of each make process (which covers its children).
+
+Results go to <out>/sweep.json and <out>/sweep.csv, one row per grid point.
+
+Usage:
+    python3 sweep.py --nr-sources 32 64 128 256 512 1024
+    python3 sweep.py --mode msi --nr-harts 1 2 4 8 --nr-vs-files 1 3
+"""
+import argparse
+import csv
+import json
+import os
+import shutil
+import subprocess
+import time
+
+from regress import MODES, TYPES, prepare, config_name, expand_matrix, make_args, parse_results
+
+# i_clk period in ns (aia_clock.ONE_CYCLE)
+CLOCK_PERIOD_NS = 2
+COLUMNS = ["name", "mode", "type", "nr_sources", "nr_harts", "nr_vs_files", "xlen",
+           "compile_s", "compile_peak_rss_mb", "binary_bytes",
+           "sim_wall_s", "sim_cycles", "cycles_per_s", "sim_peak_rss_mb", "status"]
+
+def run_measured(args, cwd, env, log):
+    """Run args, return (wall seconds, returncode, peak RSS in MB)."""
+    start = time.perf_counter()
+    proc = subprocess.Popen(args, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+    _, status, rusage = os.wait4(proc.pid, 0)
+    wall = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss is in KB on Linux
+    return wall, proc.returncode, rusage.ru_maxrss / 1024
+
+def measure(config, out_dir, extra=()):
+    name = config_name(config)
+    build_dir = os.path.abspath(os.path.join(out_dir, name))
+    sim_build = os.path.join(build_dir, "sim_build")
+    row = dict(config, name=name, status="fail")
+
+    pkg = prepare(config, build_dir)
+    shutil.rmtree(sim_build, ignore_errors=True)
+    env = dict(os.environ, PWD=build_dir)
+    make_vars = [*extra, "SIM_CACHE=0", f"SIM_BUILD={sim_build}"]
+    binary = os.path.join(sim_build, "Vtop")
+
+    with open(os.path.join(build_dir, "build.log"), "w") as log:
+        wall, rc, rss = run_measured(make_args(pkg, make_vars, target=binary), build_dir, env, log)
+    row.update(compile_s=round(wall, 3), compile_peak_rss_mb=round(rss, 1))
+    if rc != 0 or not os.path.exists(binary):
+        return row
+    row["binary_bytes"] = os.path.getsize(binary)
+
+    with open(os.path.join(build_dir, "run.log"), "w") as log:
+        wall, rc, rss = run_measured(make_args(pkg, make_vars), build_dir, env, log)
+    results_xml = os.path.join(build_dir, "results.xml")
+    if os.path.exists(results_xml):
+        results = parse_results(results_xml)
+        row["sim_cycles"] = int(results["sim_time_ns"] // CLOCK_PERIOD_NS)
+        row["cycles_per_s"] = round(row["sim_cycles"] / wall, 1)
+        row["status"] = "pass" if rc == 0 and results["failures"] == 0 else "fail"
+    row.update(sim_wall_s=round(wall, 3), sim_peak_rss_mb=round(rss, 1))
+    return row
+
+def write_table(rows, out_dir):
+    with open(os.path.join(out_dir, "sweep.json"), "w") as f:
+        json.dump(rows, f, indent=2)
+    with open(os.path.join(out_dir, "sweep.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(rows)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", nargs="+", choices=list(MODES), default=["direct"])
+    parser.add_argument("--type", nargs="+", choices=list(TYPES), default=["embedded"])
+    parser.add_argument("--nr-sources", nargs="+", type=int, default=[32, 64, 128, 256, 512, 1024])
+    parser.add_argument("--nr-harts", nargs="+", type=int)
+    parser.add_argument("--nr-vs-files", nargs="+", type=int)
+    parser.add_argument("--xlen", nargs="+", type=int)
+    parser.add_argument("--out", default="sweep", help="directory for build dirs and the result table")
+    parser.add_argument("make_vars", nargs="*", help="extra VAR=value passed to run.mk")
+    args = parser.parse_args()
+
+    matrix = {k: getattr(args, k) for k in ["mode", "type", "nr_sources", "nr_harts", "nr_vs_files", "xlen"]
+              if getattr(args, k) is not None}
+    os.makedirs(args.out, exist_ok=True)
+
+    # points run one after the other, concurrent builds would skew the timings
+    rows = []
+    for config in expand_matrix(matrix):
+        row = measure(config, args.out, args.make_vars)
+        print(f"{row['status']:<5} {row['name']:<40} compile {row.get('compile_s', 0):>8.1f}s "
+              f"{row.get('cycles_per_s', 0):>12.0f} cycles/s {row.get('binary_bytes', 0) / 2**20:>7.1f} MB "
+              f"rss {row.get('sim_peak_rss_mb', 0):>7.1f} MB", flush=True)
+        rows.append(row)
+        write_table(rows, args.out)
+
+if __name__ == "__main__":
+    main()